@@ -0,0 +1,79 @@
+"""
+web_config.json 的统一读取入口。
+
+同一路径的配置按 (路径, mtime) 缓存，automation.py / exportfile.py / cli.py 共用，
+下载等热路径不再每次重新读盘解析。
+
+不设进程级的“当前配置”：WebAutomation / Collector 在任务作用域内以 runlog.bind(config=...)
+绑定自己的配置，工作线程随 runlog 上下文一起接过去，同一进程中的多个实例互不影响。
+"""
+import fnmatch
+import json
+import os
+import threading
+
+import runlog
+
+DEFAULT_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "web_config.json"
+)
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def load_config(path=None):
+    """
+    读取并缓存配置文件；文件修改后自动重新加载。文件不存在时抛 FileNotFoundError。
+    """
+    path = os.path.abspath(path or DEFAULT_CONFIG_PATH)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Config file not found: {path}")
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    with _lock:
+        _cache[path] = (mtime, config)
+    return config
+
+
+def active():
+    """
+    当前配置：优先当前作用域 bind 的配置，否则为默认 web_config.json，读取失败时返回空字典。
+    """
+    config = runlog.current_context().get("config")
+    if config is not None:
+        return config
+    try:
+        return load_config()
+    except Exception:
+        return {}
+
+
+def per_job(value, job=None):
+    """
+    按作业取配置值：value 为字典时按导入文件名匹配 {模式: 值}（"*" 为默认），否则原样返回。
+    job 默认为当前作用域绑定的作业名。
+    """
+    if not isinstance(value, dict):
+        return value
+    if job is None:
+        job = runlog.current_context().get("job")
+    for pattern, chosen in value.items():
+        if pattern != "*" and job and fnmatch.fnmatch(job, pattern):
+            return chosen
+    return value.get("*")
+
+
+def get_export_download_path(config=None):
+    """
+    export_download_path，若缺失则使用 ./downloads，并确保目录存在。
+    """
+    config = active() if config is None else config
+    path = config.get("export_download_path") or os.path.join(os.getcwd(), "downloads")
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -1,47 +1,74 @@
 import os
-import json
+import logging
 import time
 from urllib.parse import urlparse
-from playwright.sync_api import sync_playwright, TimeoutError
 
-from exportfile import export_file
+import app_config
+import har_session
+import launch_profiles
+import metrics
+import profiling
+import rate_limit
+import report_catalog
+import retry_policy
+import runlog
+from retry_policy import AUTH_EXPIRED, MEMBERSHIP_EXPIRED, TaskFailure
+
+# Playwright / exportfile 在真正需要浏览器时才导入，保证 CLI 启动足够快
+
+_log = runlog.get_logger("automation")
 
 
 class WebAutomation:
-    def __init__(self, config_path_or_dict=None, logger=None):
+    def __init__(self, config_path_or_dict=None, logger=None, account=None):
         self.logger = logger
+        self.account = account
         if not config_path_or_dict:
-            config_path_or_dict = r"web_config.json"
+            config_path_or_dict = app_config.DEFAULT_CONFIG_PATH
         if isinstance(config_path_or_dict, str):
             self.config = self.load_config(config_path_or_dict)
         else:
             self.config = config_path_or_dict
 
         self.headless = self.config.get("headless", False)
+        self.launch_profile_name, self.launch_profile = launch_profiles.resolve(
+            self.config
+        )
+        runlog.setup_from_config(self.config)
+        # 重试、限流、分析与选择器设置在任务作用域内经 app_config.active() 读取本实例的配置
+        self.har_mode, self.har_path = har_session.resolve(self.config, self.account)
+        metrics.serve_from_config(self.config)
 
-    def log(self, message):
+    def log(self, message, level=logging.INFO):
+        _log.log(level, message, extra={"account": self.account})
         if self.logger:
             self.logger(message)
-        else:
-            print(message)
 
     def load_config(self, path):
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"Config file not found: {path}")
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return app_config.load_config(path)
+
+    def _scope(self, job):
+        """
+        任务作用域：账号、任务名与本实例的配置、HAR 模式，经 runlog 上下文传给下层模块与工作线程。
+        """
+        return runlog.bind(
+            account=self.account or runlog.DEFAULT_ACCOUNT,
+            job=job,
+            config=self.config,
+            har_mode=self.har_mode,
+        )
 
     def get_latest_file(self, folder):
         if not os.path.exists(folder):
             return None
-        files = [
-            os.path.join(folder, f)
-            for f in os.listdir(folder)
-            if os.path.isfile(os.path.join(folder, f))
-        ]
+        # scandir 的 DirEntry 自带 stat 缓存（Windows 上无需再次系统调用）
+        with os.scandir(folder) as entries:
+            files = [
+                (entry.stat().st_ctime, entry.path) for entry in entries if entry.is_file()
+            ]
         if not files:
             return None
-        return max(files, key=os.path.getctime)
+        return max(files)[1]
 
     def _parse_cookie_string(self, cookie_string):
         """Parses a raw cookie string into a list of dictionaries."""
@@ -94,49 +121,151 @@ class WebAutomation:
         1. Login (using cookies)
         2. Import file
         3. Export/Download result
+        Failures are classified and retried by retry_policy; once exports
+        have been submitted the task is not re-run (that would export twice).
         Returns:
             str: Path to the downloaded file.
         """
+        job = os.path.basename(import_file) if import_file else None
+        account = self.account or runlog.DEFAULT_ACCOUNT
+        with self._scope(job):
+            return self._counted(
+                "import",
+                lambda: retry_policy.run(
+                    self._guarded(lambda: self._run_task(import_file, cookie_string)),
+                    account=account,
+                    label="导入导出任务",
+                ),
+            )
+
+    def submit_task(self, import_file, cookie_string, cookie_path, store=None):
+        """
+        Submit phase only: upload, wait for matchState, fire the exports,
+        record the job in the job store and close the browser. The reports
+        are downloaded later by collector.Collector (cookie_path is read again
+        at that point). When the new report IDs cannot be identified the job
+        is finished in the browser right away.
+        Returns:
+            dict: The recorded job.
+        """
+        import collector
+
+        store = store or collector.store_from_config(self.config)
+        job = os.path.basename(import_file) if import_file else None
+        account = self.account or runlog.DEFAULT_ACCOUNT
+        with self._scope(job):
+            return self._counted(
+                "submit",
+                lambda: retry_policy.run(
+                    self._guarded(
+                        lambda: self._submit_task(import_file, cookie_string, cookie_path, store)
+                    ),
+                    account=account,
+                    label="提交任务",
+                ),
+            )
+
+    def _submit_task(self, import_file, cookie_string, cookie_path, store):
+        from playwright.sync_api import sync_playwright
+        import collector
+        from exportfile import collect_exports, submit_exports
+
+        self._check_cookie_offline(cookie_string)
+        with sync_playwright() as p:
+            browser = self._launch_browser(p)
+            try:
+                context = self._new_context(browser)
+                self._load_cookies(context, cookie_string)
+                page = context.new_page()
+                self._login(page)
+                self._upload_import_file(page, import_file)
+                self.exports_submitted = True
+                submission = submit_exports(
+                    page, concurrent=self.config.get("concurrent_exports", True)
+                )
+                if submission.report_ids == []:
+                    raise Exception("本次导出没有新建任何报告")
+                if submission.report_ids is None:
+                    self.log("无法识别本次报告 ID，在浏览器中直接完成。")
+                    dest_dir = collect_exports(
+                        page,
+                        submission,
+                        direct=self.config.get("direct_download", True),
+                        download_workers=self.config.get("download_workers", 4),
+                    )
+                    if not dest_dir:
+                        raise Exception("export_file failed")
+                    return {"status": collector.DOWNLOADED, "dest_dir": dest_dir}
+            finally:
+                self._close_browser(browser)
+        job = store.add(collector.new_job(self.account, import_file, cookie_path, submission))
+        self.log(f"已提交作业 {job['id']}：{len(job['report_ids'])} 个报告，浏览器已关闭。")
+        return job
+
+    def _guarded(self, func):
+        """导出一旦提交，除登录 / 会员 / 次数类失败外都不再重跑（否则会重复导出）。"""
+
+        def _attempt():
+            self.exports_submitted = False
+            try:
+                return func()
+            except Exception as e:
+                kind = retry_policy.classify(e)
+                if self.exports_submitted and not retry_policy.engine.policies[kind]["trips"]:
+                    raise TaskFailure(
+                        retry_policy.UNKNOWN, f"导出已提交后失败，不重跑任务: {e}"
+                    ) from e
+                raise
+
+        return _attempt
+
+    def _counted(self, task, func):
+        metrics.TASKS_STARTED.inc(task=task)
+        try:
+            result = func()
+        except Exception as e:
+            metrics.TASKS_FAILED.inc(task=task, failure_class=retry_policy.classify(e))
+            raise
+        metrics.TASKS_SUCCEEDED.inc(task=task)
+        return result
+
+    def _check_cookie_offline(self, cookie_string):
+        """cookie 已过期时不必启动浏览器（HAR 回放不访问真实站点，不检查）。"""
+        if not isinstance(cookie_string, str) or self.har_mode == har_session.REPLAY:
+            return
+        from cookie_check import inspect_cookie
+
+        result = inspect_cookie(cookie_string)
+        expires_at = result.get("expires_at")
+        if expires_at is not None and expires_at <= time.time():
+            raise TaskFailure(AUTH_EXPIRED, "; ".join(result["problems"]))
+
+    def _run_task(self, import_file, cookie_string):
+        from playwright.sync_api import sync_playwright
+
         downloaded_file_path = None
         self.import_file = import_file
+        self._check_cookie_offline(cookie_string)
 
         with sync_playwright() as p:
             # Launch browser
-            browser = p.chromium.launch(
-                channel="chrome",
-                headless=self.headless,
-                ignore_default_args=["--headless"],
-            )
-            context = browser.new_context()
+            browser = self._launch_browser(p)
+            context = self._new_context(browser)
 
             # 1. Load Cookies (cookie_string is required; no config fallback)
             if not cookie_string:
-                browser.close()
+                self._close_browser(browser)
                 raise ValueError("cookie_string is required for this run (no login_cookies fallback).")
-            cookies_config = cookie_string
-            cookies_to_add = []
-
-            if isinstance(cookies_config, str):
-                cookies_to_add = self._parse_cookie_string(cookies_config)
-            elif isinstance(cookies_config, list):
-                cookies_to_add = cookies_config
-
-            if cookies_to_add:
-                try:
-                    context.add_cookies(cookies_to_add)
-                    self.log(f"Loaded {len(cookies_to_add)} cookies.")
-                except Exception as e:
-                    self.log(f"Error adding cookies: {e}")
-            else:
-                self.log("Warning: No login_cookies found or parsed from config.")
+            self._load_cookies(context, cookie_string)
 
             page = context.new_page()
 
             # 2. Import Process
             try:
-                downloaded_file_path = self._process_import(page)
+                with profiling.phase("run_task", context):
+                    downloaded_file_path = self._process_import(page)
             except Exception as e:
-                self.log(f"Error during import process: {e}")
+                self.log(f"Error during import process: {e}", logging.ERROR)
                 # Depending on requirements, we might want to stop here
                 # but user asked to proceed to step 3?
                 # "After the above steps are completed... jump to specified page"
@@ -146,7 +275,7 @@ class WebAutomation:
                 # However, step 3 says "select latest data", which might be independent.
                 # For now, I'll log and continue if possible, or raise.
                 # Let's assume we stop on critical failure.
-                browser.close()
+                self._close_browser(browser)
                 raise e
 
             # 3. Download Process
@@ -157,10 +286,120 @@ class WebAutomation:
             #     browser.close()
             #     raise e
 
-            browser.close()
+            self._close_browser(browser)
 
         return downloaded_file_path
 
+    def run_download(self, cookie_string, since, report_ids=None):
+        """
+        Download-only run: skip the upload, select the reports created after
+        `since` ("%Y-%m-%d %H:%M:%S") on the report page and batch download them.
+        With report_ids only those reports are selected. Reports the local
+        catalog already has on disk are not selected again.
+        Returns:
+            str | list: Path to the downloaded file, or the list of files the
+            catalog recorded for these reports when nothing new is left.
+        """
+        account = self.account or runlog.DEFAULT_ACCOUNT
+        with self._scope("download-only"):
+            return self._counted(
+                "download",
+                lambda: retry_policy.run(
+                    lambda: self._run_download(cookie_string, since, report_ids),
+                    account=account,
+                    label="下载任务",
+                ),
+            )
+
+    def _run_download(self, cookie_string, since, report_ids=None):
+        from playwright.sync_api import sync_playwright
+        from exportfile import REPORT_URL, batch_download, select_report
+
+        self._check_cookie_offline(cookie_string)
+        with sync_playwright() as p:
+            browser = self._launch_browser(p)
+            try:
+                context = self._new_context(browser)
+                self._load_cookies(context, cookie_string)
+                page = context.new_page()
+                self.check_login(
+                    page, trigger=lambda: rate_limit.goto(page, "https://www.tianyancha.com/")
+                )
+                selected = []
+                if not select_report(
+                    page,
+                    since,
+                    report_url=REPORT_URL,
+                    report_ids=report_ids,
+                    skip_downloaded=True,
+                    selected=selected,
+                ):
+                    raise Exception("select_report failed")
+                if not selected:
+                    # 全部已下载过：返回报告目录中记录的文件
+                    catalog = report_catalog.for_account()
+                    paths = catalog.location(report_ids or ()) if catalog else []
+                    self.log(f"没有需要下载的新报告，已下载文件: {paths}")
+                    return paths
+                return batch_download(page, selected)
+            finally:
+                self._close_browser(browser)
+
+    def run_pipeline(self, import_files, cookie_string, depth=None):
+        """
+        Upload several import files on this account back to back: while the
+        reports of earlier files are generating (and downloading) in the
+        background, the browser already submits the next file.
+        Returns:
+            dict: {import_file: saved folder, or the exception it failed with}
+        """
+        from pipeline import AccountPipeline
+
+        with self._scope("pipeline"):
+            self._check_cookie_offline(cookie_string)
+            return AccountPipeline(self, cookie_string, depth=depth).run(import_files)
+
+    def _launch_browser(self, p):
+        self.log(f"Launching browser with profile: {self.launch_profile_name}")
+        return launch_profiles.launch(p, self.launch_profile)
+
+    def _new_context(self, browser):
+        context = browser.new_context(
+            **launch_profiles.context_options(self.launch_profile),
+            **har_session.context_options(self.config, self.account),
+        )
+        metrics.OPEN_CONTEXTS.inc()
+        # 只有这里新建的 context 计数，关闭（含随浏览器一起关闭）时减一
+        context.once("close", lambda _: metrics.OPEN_CONTEXTS.dec())
+        har_session.attach(context, self.config, self.account)
+        if self.har_mode != har_session.REPLAY:
+            rate_limit.limiter.attach(context, self.account)
+        return context
+
+    def _close_browser(self, browser):
+        # 先关闭 context，录制中的 HAR 在 context 关闭时写盘
+        for context in browser.contexts:
+            try:
+                context.close()
+            except Exception as e:
+                self.log(f"Error closing context: {e}")
+        browser.close()
+
+    def _load_cookies(self, context, cookie_string):
+        cookies_to_add = []
+        if isinstance(cookie_string, str):
+            cookies_to_add = self._parse_cookie_string(cookie_string)
+        elif isinstance(cookie_string, list):
+            cookies_to_add = cookie_string
+
+        if cookies_to_add:
+            try:
+                context.add_cookies(cookies_to_add)
+                self.log(f"Loaded {len(cookies_to_add)} cookies.")
+            except Exception as e:
+                self.log(f"Error adding cookies: {e}")
+        else:
+            self.log("Warning: No login_cookies found or parsed from config.")
 
     def check_login(self, page, trigger=None):
         """
@@ -168,23 +407,26 @@ class WebAutomation:
         Succeeds when the response JSON has state == "ok",
         otherwise logs failure and raises.
         """
+        from playwright.sync_api import TimeoutError
+
         self.log("检查登录状态接口： next/web/getUserInfo...")
         predicate = lambda r: "next/web/getUserInfo" in r.url
 
         try:
-            with page.expect_response(predicate, timeout=10000) as resp_info:
-                if trigger:
-                    trigger()
-            response = resp_info.value
+            with metrics.LOGIN_CHECK_SECONDS.time():
+                with page.expect_response(predicate, timeout=10000) as resp_info:
+                    if trigger:
+                        trigger()
+                response = resp_info.value
         except TimeoutError:
             self.log("用户登陆失败！请重新设置token")
             raise
 
         try:
             data = response.json()
-        except Exception:
+        except Exception as e:
             self.log("用户登陆失败！请重新设置token")
-            raise
+            raise TaskFailure(AUTH_EXPIRED, f"getUserInfo 响应无法解析: {e}") from e
 
         if data.get("state") == "ok":
             # 判断是否为 SVIP
@@ -201,15 +443,17 @@ class WebAutomation:
             if is_svip is False or is_svip_str == "false":
                 msg = "用户不是Svip,操作失败"
                 self.log(msg)
-                raise Exception(msg)
+                raise TaskFailure(MEMBERSHIP_EXPIRED, msg)
 
             self.log("登录成功")
             return True
-        raise Exception("登录失败: state is not ok")
+        raise TaskFailure(AUTH_EXPIRED, "登录失败: state is not ok")
     def check_vip(self, page, trigger=None):
         """
         Listen for batch/search/import response and ensure state == 'ok'.
         """
+        from playwright.sync_api import TimeoutError
+
         self.log("检查会员接口： batch/search/import ...")
         predicate = lambda r: "batch/search/import" in r.url
 
@@ -233,32 +477,39 @@ class WebAutomation:
             return True
 
         self.log("账号会员过期，请重试")
-        raise Exception("会员检查失败: state is not ok")
-    def _process_import(self, page):
-        self.check_login(
-            page,
-            trigger=lambda: (
-                page.goto("https://www.tianyancha.com/"),
-                page.wait_for_timeout(1500),
-            ),
-        )
-        time.sleep(0.5)
+        raise TaskFailure(MEMBERSHIP_EXPIRED, "会员检查失败: state is not ok")
+    def _login(self, page):
+        with profiling.phase("login", page.context):
+            self.check_login(
+                page,
+                trigger=lambda: (
+                    rate_limit.goto(page, "https://www.tianyancha.com/"),
+                    har_session.pause(page, 1500),
+                ),
+            )
+            har_session.sleep(0.5)
+
+    def _upload_import_file(self, page, import_file):
+        with profiling.phase("upload", page.context):
+            self._upload(page, import_file)
+
+    def _upload(self, page, import_file):
         import_page_url = self.config.get("import_page_url")
         if not import_page_url:
             raise ValueError("Config missing 'import_page_url'")
         
         self.log(f"Navigating to import page: {import_page_url}")
-        page.goto(import_page_url)
+        rate_limit.goto(page, import_page_url)
         # # Prepare file to upload
         # import_folder = self.config.get("import_folder")
         # if not import_folder:
         #     raise ValueError("Config missing 'import_folder'")
 
         # file_to_upload = self.get_latest_file(import_folder)
-        if not self.import_file:
-            raise FileNotFoundError(f"No import file specified: {self.import_file}")
+        if not import_file:
+            raise FileNotFoundError(f"No import file specified: {import_file}")
 
-        self.log(f"Selected file for import: {self.import_file}")
+        self.log(f"Selected file for import: {import_file}")
 
         # Upload file via input element (supports hidden inputs)
         import_input_selector = self.config.get("import_input_selector")
@@ -271,9 +522,22 @@ class WebAutomation:
             )
 
         self.log(f"Uploading file to input: {import_input_selector}")
-        page.set_input_files(import_input_selector, self.import_file)
-        time.sleep(2)
-        downloaded_file_path = export_file(page)
+        page.set_input_files(import_input_selector, import_file)
+        har_session.sleep(2)
+
+    def _process_import(self, page):
+        from playwright.sync_api import TimeoutError
+        from exportfile import export_file
+
+        self._login(page)
+        self._upload_import_file(page, self.import_file)
+        self.exports_submitted = True
+        downloaded_file_path = export_file(
+            page,
+            concurrent=self.config.get("concurrent_exports", True),
+            direct=self.config.get("direct_download", True),
+            download_workers=self.config.get("download_workers", 4),
+        )
         if not downloaded_file_path:
             raise Exception("export_file failed")
         return downloaded_file_path
@@ -368,12 +632,14 @@ class WebAutomation:
         #     page.wait_for_timeout(2000)
 
     def _process_download(self, page):
+        from playwright.sync_api import TimeoutError
+
         download_page_url = self.config.get("redirect_route")
         if not download_page_url:
             raise ValueError("Config missing 'download_page_url'")
 
         self.log(f"Navigating to download page: {download_page_url}")
-        page.goto(download_page_url)
+        rate_limit.goto(page, download_page_url)
 
         # 1. Wait for the first row to appear
         self.log("Waiting for data table rows...")
@@ -417,7 +683,7 @@ class WebAutomation:
             time.sleep(2)
             if i > 0 and i % 5 == 0:
                 self.log("Refreshing page to check status...")
-                page.reload()
+                rate_limit.reload(page)
                 page.wait_for_selector(first_row_selector, timeout=30000)
 
         # 3. Click the download button (middle element in last column)
@@ -432,12 +698,7 @@ class WebAutomation:
         download = download_info.value
 
         # Determine save path
-        export_download_path = self.config.get("export_download_path")
-        if not export_download_path:
-            export_download_path = os.path.join(os.getcwd(), "downloads")
-
-        if not os.path.exists(export_download_path):
-            os.makedirs(export_download_path)
+        export_download_path = app_config.get_export_download_path(self.config)
 
         save_path = os.path.join(export_download_path, download.suggested_filename)
         download.save_as(save_path)
@@ -447,15 +708,6 @@ class WebAutomation:
 
 
 if __name__ == "__main__":
-    # Test execution
-    # Ensure config.json has the required fields
-    config_path = "../dist/config.json"  # Adjust path as needed
-    if os.path.exists(config_path):
-        automation = WebAutomation(config_path)
-        try:
-            result = automation.run_task()
-            print(f"Task completed. Result: {result}")
-        except Exception as e:
-            print(f"Task failed: {e}")
-    else:
-        print("Config file not found for testing.")
+    from cli import main
+
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+"""
+每个账号、每个导出维度允许的单批最大条数。
+
+来源：
+- 弹窗中的提示文字（如“单次最多导出 10000 条”），打开自定义范围时读取；
+- 服务端拒绝超量批次时的提示（如“单次导出不能超过5000条”），随后按新上限重排剩余范围；
+- 实际被接受过的最大批次。
+
+分批时优先用已探明的上限，否则取维度默认值与已接受过的最大批次中较大者。
+结果保存在 JSON 文件中（配置 "batch_limit_store"，默认 batch_limits.json），
+格式为 {账号: {维度: {"limit": 条数, "source": 来源, "accepted": 条数, "updated": 时间}}}。
+"""
+import json
+import os
+import re
+import threading
+import time
+
+import app_config
+import fileutil
+import runlog
+
+log = runlog.get_logger("export")
+
+DEFAULT_STORE = "batch_limits.json"
+
+_LIMIT_PATTERNS = (
+    re.compile(r"最多(?:可|只能|允许)?导出\s*([\d,]+)\s*条"),
+    re.compile(r"(?:不能|不可|不得)(?:超过|大于)\s*([\d,]+)\s*条"),
+    # 单独的“上限 N 条”也可能是导出次数 / 额度，必须说明是单次、单批
+    re.compile(r"(?:单次|每次|单批|每批)[^，。；,;]{0,8}上限(?:为|是)?\s*([\d,]+)\s*条"),
+)
+# 导出次数、额度类提示中的词：分句中出现时不当作单批上限
+_QUOTA_WORDS = ("今日", "今天", "每日", "每天", "本月", "每月", "次数", "额度", "剩余")
+# 只按中文标点分句，英文逗号可能是数字的千分位
+_CLAUSE_SEPARATORS = re.compile(r"[，。；！\n]")
+
+
+def limit_from_text(text):
+    """从提示文字中解析单批上限，解析不到返回 None。"""
+    for clause in _CLAUSE_SEPARATORS.split(text or ""):
+        if any(word in clause for word in _QUOTA_WORDS):
+            continue
+        for pattern in _LIMIT_PATTERNS:
+            match = pattern.search(clause)
+            if match:
+                try:
+                    return int(match.group(1).replace(",", ""))
+                except ValueError:
+                    continue
+    return None
+
+
+class BatchLimitStore:
+    """
+    内存中保留一份，文件被其他进程改过（mtime / 大小变化）时重新读入；
+    每次修改都在文件锁（batch_limits.json.lock）内重新读入、修改、写回，多个进程不会互相覆盖。
+    """
+
+    def __init__(self, path=DEFAULT_STORE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self.entries = {}
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"批次上限文件无法读取，重新建立: {e}")
+        self._stamp = stamp
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._stamp = (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, account, dimension):
+        with self._lock:
+            self._refresh()
+            return dict(self.entries.get(account, {}).get(dimension, {}))
+
+    def batch_size(self, account, dimension, default):
+        """分批使用的单批条数。"""
+        entry = self.get(account, dimension)
+        if entry.get("limit"):
+            return entry["limit"]
+        return max(default, entry.get("accepted") or 0)
+
+    def _update(self, account, dimension, **fields):
+        with self._lock, fileutil.locked(self.path):
+            self._refresh()
+            entry = self.entries.setdefault(account, {}).setdefault(dimension, {})
+            if all(entry.get(k) == v for k, v in fields.items()):
+                return
+            entry.update(fields, updated=time.strftime("%Y-%m-%d %H:%M:%S"))
+            self._save()
+
+    def record_limit(self, account, dimension, limit, source):
+        """记录探明的上限（弹窗提示或服务端拒绝）。"""
+        previous = self.get(account, dimension).get("limit")
+        if previous != limit:
+            log.info(f"{dimension} 单批上限 {previous or '未知'} -> {limit}（来源: {source}）")
+        self._update(account, dimension, limit=limit, source=source)
+
+    def record_accepted(self, account, dimension, size):
+        """记录被服务端接受的批次条数（只保留最大值）。"""
+        if size > (self.get(account, dimension).get("accepted") or 0):
+            self._update(account, dimension, accepted=size)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def store(config=None):
+    """当前配置对应的 BatchLimitStore（按路径复用）。"""
+    config = app_config.active() if config is None else config
+    path = os.path.abspath(config.get("batch_limit_store") or DEFAULT_STORE)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = BatchLimitStore(path)
+        return _stores[path]
+
+
+def _account():
+    return runlog.current_context().get("account") or runlog.DEFAULT_ACCOUNT
+
+
+def batch_size(dim):
+    return store().batch_size(_account(), dim.key, dim.batch_limit)
+
+
+def record_limit(dim, limit, source):
+    store().record_limit(_account(), dim.key, limit, source)
+
+
+def record_accepted(dim, size):
+    store().record_accepted(_account(), dim.key, size)
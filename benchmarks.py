@@ -0,0 +1,256 @@
+"""
+基准测试，由 `python cli.py bench <name>` 调用。
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _timed_subprocess(cmd, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(
+            cmd, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def bench_startup(args):
+    """CLI 冷启动耗时：--help 与 validate-cookies（均不应加载 Playwright）。"""
+    cli = os.path.join(HERE, "cli.py")
+    cases = [
+        ("cli --help", [sys.executable, cli, "--help"]),
+        ("cli validate-cookies", [sys.executable, cli, "validate-cookies"]),
+        ("python -c pass", [sys.executable, "-c", "pass"]),
+    ]
+    for label, cmd in cases:
+        samples = _timed_subprocess(cmd, args.repeat)
+        print(
+            f"{label:<24} median {statistics.median(samples):7.1f} ms   "
+            f"min {min(samples):7.1f} ms"
+        )
+    return 0
+
+
+# 本地替身站点：页面加载后请求 myReport/list（list-mock.json）并渲染报告表格
+_STANDIN_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>stand-in report</title>
+<style>body{font-family:sans-serif} td{padding:4px;border-bottom:1px solid #ddd}</style>
+</head><body>
+<table><thead><tr><th><svg width="12" height="12"></svg></th><th>名称</th><th>状态</th></tr></thead>
+<tbody></tbody></table>
+<script>
+fetch('/cloud-web/myReport/list?pageNum=1&pageSize=10').then(r => r.json()).then(data => {
+  const body = document.querySelector('tbody');
+  for (let i = 0; i < 20; i++) {
+    for (const item of data.data.items) {
+      const tr = document.createElement('tr');
+      tr.innerHTML = '<td><div><div><svg width="12" height="12"></svg></div></div></td>'
+        + '<td>' + item.reportNameDetail + '</td><td>' + item.reportStatus + '</td>';
+      body.appendChild(tr);
+    }
+  }
+});
+</script></body></html>
+"""
+
+
+def _serve_standin():
+    with open(os.path.join(HERE, "list-mock.json"), "rb") as f:
+        list_body = f.read()
+    html_body = _STANDIN_HTML.encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if "myReport/list" in self.path:
+                body, ctype = list_body, "application/json"
+            else:
+                body, ctype = html_body, "text/html; charset=utf-8"
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/usercenter/report"
+
+
+def bench_launch(args):
+    """
+    各启动配置档：启动耗时、打开替身报告页至表格渲染完成的耗时、浏览器进程 RSS。
+    """
+    from playwright.sync_api import sync_playwright
+
+    import launch_profiles
+    import procstat
+
+    server, url = _serve_standin()
+    names = args.profile or sorted(launch_profiles.PROFILES)
+    print(f"替身站点: {url}")
+    print(f"{'profile':<22}{'launch ms':>12}{'page ms':>12}{'RSS MB':>10}")
+    try:
+        with sync_playwright() as p:
+            for name in names:
+                _, profile = launch_profiles.resolve({"launch_profile": name})
+                launch_ms, page_ms, rss_mb = [], [], []
+                try:
+                    for _ in range(args.repeat):
+                        started = time.perf_counter()
+                        browser = launch_profiles.launch(p, profile)
+                        launched = time.perf_counter()
+                        context = browser.new_context(
+                            **launch_profiles.context_options(profile)
+                        )
+                        page = context.new_page()
+                        page.goto(url)
+                        page.wait_for_selector("tbody tr")
+                        ready = time.perf_counter()
+                        rss_mb.append(procstat.browser_rss() / (1024 * 1024))
+                        browser.close()
+                        launch_ms.append((launched - started) * 1000)
+                        page_ms.append((ready - launched) * 1000)
+                except Exception as e:
+                    print(f"{name:<22}不可用: {str(e).splitlines()[0]}")
+                    continue
+                print(
+                    f"{name:<22}{statistics.median(launch_ms):12.1f}"
+                    f"{statistics.median(page_ms):12.1f}{statistics.median(rss_mb):10.1f}"
+                )
+    finally:
+        server.shutdown()
+    return 0
+
+
+def _synthetic_report_list(count, page_size):
+    """用 list-mock.json 的条目循环生成 count 个报告（payDate 倒序、id 唯一），返回 fetch(page_num)。"""
+    with open(os.path.join(HERE, "list-mock.json"), "r", encoding="utf-8") as f:
+        templates = json.load(f)["data"]["items"]
+    newest = templates[0]["payDate"]
+    items = []
+    for i in range(count):
+        item = dict(templates[i % len(templates)])
+        item["id"] = f"SYN{i:08d}"
+        item["payDate"] = newest - i * 60000
+        item["reportStatus"] = 1 if i < page_size // 2 else 2
+        items.append(item)
+
+    def fetch(page_num):
+        offset = (page_num - 1) * page_size
+        return {
+            "state": "ok",
+            "data": {
+                "total": count,
+                "pageNum": page_num,
+                "pageSize": page_size,
+                "items": items[offset : offset + page_size],
+            },
+        }
+
+    return fetch, newest
+
+
+def bench_boundary(args):
+    """
+    在 10 ~ 10,000 个报告的合成列表上对比查找 start_str 边界页的逐页与二分做法，
+    以及按时间等待本次报告时端到端读出边界页之前全部报告的两种做法：
+    二分后补读其余页，与从第 1 页每轮并发读 4 页顺序读到边界页（newer_entries）。
+    请求页数、耗时（每次请求模拟 --latency 毫秒）与内存峰值；
+    新报告数取一半（最坏情况）与 30 个（一次导入的典型规模）两种。
+    """
+    import tracemalloc
+    from concurrent.futures import ThreadPoolExecutor
+
+    from report_boundary import compact, find_boundary, find_boundary_linear, newer_entries
+
+    latency = args.latency / 1000
+    pool = ThreadPoolExecutor(max_workers=4)
+    print(f"每页请求模拟延迟 {args.latency} ms，并发读取 4 个线程")
+    columns = ("linear", "binary", "binary+fill", "batched walk")
+    print(
+        f"{'reports':>8}{'new':>6}{'boundary':>9}"
+        + "".join(f"  {name + ' pages':>18}{'ms':>8}{'KB':>7}" for name in columns)
+    )
+    for count in (10, 100, 1000, 10000):
+        fetch, newest = _synthetic_report_list(count, page_size=10)
+        requests = []
+
+        def slow_fetch(page_num):
+            requests.append(page_num)
+            if latency:
+                time.sleep(latency)
+            return fetch(page_num)
+
+        def fetch_many(page_nums):
+            return dict(zip(page_nums, pool.map(slow_fetch, page_nums)))
+
+        def binary_fill(start_ms):
+            # 原端到端做法：二分找边界，再并发补读边界页之前没读过的页
+            boundary = find_boundary(slow_fetch, start_ms)
+            missing = [p for p in range(1, boundary.last_page + 1) if p not in boundary.pages]
+            pages = {p: compact(d["data"]["items"]) for p, d in fetch_many(missing).items()}
+            return boundary, pages
+
+        for newer in sorted({count // 2, min(30, count // 2)}, reverse=True):
+            start_ms = newest - newer * 60000 - 30000
+            finders = (
+                lambda: find_boundary_linear(slow_fetch, start_ms, max_pages=count),
+                lambda: find_boundary(slow_fetch, start_ms),
+                lambda: binary_fill(start_ms)[0],
+                lambda: newer_entries(slow_fetch, start_ms, fetch_many=fetch_many)[0],
+            )
+            row = []
+            for finder in finders:
+                samples = []
+                for _ in range(args.repeat):
+                    del requests[:]
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    result = finder()
+                    elapsed = (time.perf_counter() - started) * 1000
+                    peak = tracemalloc.get_traced_memory()[1] / 1024
+                    tracemalloc.stop()
+                    samples.append((elapsed, peak))
+                row.append(
+                    (
+                        result,
+                        len(requests),
+                        statistics.median(s[0] for s in samples),
+                        statistics.median(s[1] for s in samples),
+                    )
+                )
+            assert len({(r[0].last_page, r[0].newer) for r in row}) == 1
+            print(
+                f"{count:>8}{newer:>6}{row[0][0].last_page:>9}"
+                + "".join(f"  {pages:>18}{ms:8.1f}{kb:7.1f}" for _, pages, ms, kb in row)
+            )
+    pool.shutdown()
+    return 0
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "launch": bench_launch,
+    "boundary": bench_boundary,
+}
+
+
+def run(name, args):
+    func = BENCHMARKS.get(name)
+    if func is None:
+        print(f"未知基准: {name}，可选: {', '.join(sorted(BENCHMARKS))}")
+        return 2
+    return func(args)
@@ -0,0 +1,258 @@
+"""
+同一批企业两次导出结果之间的增量变更。
+
+1. snapshot：把一次运行的结果（下载目录、单个 .zip/.xlsx/.csv）逐行读入 SQLite 快照，
+   每行按 (维度, 键) 存一条，附行哈希；
+2. iter_changes：两个快照按 (维度, 键) 排序后归并比较，只在哈希不同的行上逐列比较；
+3. write_changes：变更写成 JSON Lines（.gz 结尾时压缩），每行一条：
+
+    {"op": "added",   "dimension": "shareholder", "key": ["91110000...", "张三"], "values": {...}}
+    {"op": "removed", "dimension": "investment",  "key": [...], "values": {...}}
+    {"op": "changed", "dimension": "basic", "key": [...], "columns": {"注册资本": ["100万", "200万"]}}
+
+键：基本信息为企业（统一社会信用代码，没有时取企业名称）；其他维度为企业 + 明细列（股东名称、
+被投资企业名称等）。web_config.json 的 "change_keys" 可按维度指定键列，例如
+{"shareholder": ["统一社会信用代码", "股东名称"]}；"change_ignore_columns" 列出不参与比较的列。
+同键的多行按内容区分，行的先后顺序变化不产生变更；同键只有一行变化时记为 changed，
+否则记为删除与新增。快照与归并都是逐行（逐键）进行，内存占用与结果行数无关。
+
+    python cli.py diff exports/20260101_090000 exports/20260201_090000 -o changes.jsonl.gz
+"""
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+from collections import Counter
+
+import app_config
+import result_reader
+import runlog
+
+log = runlog.get_logger("results")
+
+COMPANY_COLUMNS = ("统一社会信用代码", "企业名称", "公司名称")
+DETAIL_COLUMNS = {
+    "shareholder": ("股东名称", "股东", "发起人"),
+    "investment": ("被投资企业名称", "被投资企业", "投资企业名称"),
+}
+IGNORED_COLUMNS = ("序号",)
+SNAPSHOT_SUFFIX = ".snapshot.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (dimension, key, hash)
+)
+"""
+_SEP = "\x1f"
+# 快照格式版本（PRAGMA user_version），不同时重新生成
+SNAPSHOT_VERSION = 2
+
+
+def _dumps(values):
+    return json.dumps(values, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class KeyPolicy:
+    """按维度从一行中取出比较用的键与参与比较的列。"""
+
+    def __init__(self, config=None):
+        config = app_config.active() if config is None else config
+        self.keys = dict(config.get("change_keys") or {})
+        self.ignored = set(config.get("change_ignore_columns") or IGNORED_COLUMNS)
+
+    def normalise(self, values):
+        return {k: v for k, v in values.items() if k not in self.ignored}
+
+    def key(self, dimension, values, digest):
+        """键的各部分；找不到企业列时以行哈希为键（只会表现为新增 / 删除）。"""
+        columns = self.keys.get(dimension)
+        if columns:
+            return [str(values.get(column)) for column in columns]
+        company = next((values[c] for c in COMPANY_COLUMNS if values.get(c) is not None), None)
+        if company is None:
+            return [digest]
+        if dimension == "basic":
+            return [str(company)]
+        detail = next(
+            (values[c] for c in DETAIL_COLUMNS.get(dimension, ()) if values.get(c) is not None),
+            None,
+        )
+        # 不知道明细列的维度，同一企业的行只能按内容区分
+        return [str(company), str(detail) if detail is not None else digest]
+
+
+def snapshot(records, path, config=None):
+    """把 CompanyRecord 序列写入新的快照文件，返回行数。"""
+    policy = KeyPolicy(config)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    count = duplicates = 0
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(_SCHEMA)
+        conn.execute(f"PRAGMA user_version={SNAPSHOT_VERSION}")
+        with conn:
+            for record in records:
+                values = policy.normalise(record.values)
+                data = _dumps(values)
+                digest = hashlib.sha1(data.encode("utf-8")).hexdigest()
+                key = _SEP.join(policy.key(record.dimension, values, digest))
+                # 同键多行按内容各存一条，完全相同的行只记一次
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO rows VALUES (?, ?, ?, ?)",
+                    (record.dimension, key, digest, data),
+                )
+                if cursor.rowcount:
+                    count += 1
+                else:
+                    duplicates += 1
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    if duplicates:
+        log.info(f"快照 {path} 中跳过完全重复的行 {duplicates} 条。")
+    return count
+
+
+def _snapshot_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _source_mtime(source):
+    """目录取其中结果文件的最新修改时间（生成快照本身会改变目录的 mtime）。"""
+    if not os.path.isdir(source):
+        return os.path.getmtime(source)
+    return max(
+        (
+            entry.stat().st_mtime
+            for entry in os.scandir(source)
+            if entry.is_file()
+            and entry.name.lower().endswith((".zip",) + result_reader.TABLE_SUFFIXES)
+        ),
+        default=0,
+    )
+
+
+def snapshot_for(source, config=None):
+    """
+    source 为快照文件时直接返回；为下载目录或结果文件时生成（或复用比 source 新的）快照并返回其路径。
+    """
+    if source.endswith(SNAPSHOT_SUFFIX):
+        return source
+    if os.path.isdir(source):
+        path = os.path.join(source, "results" + SNAPSHOT_SUFFIX)
+        records = result_reader.iter_directory(source)
+    else:
+        path = source + SNAPSHOT_SUFFIX
+        records = result_reader.iter_records(source)
+    if (
+        os.path.exists(path)
+        and os.path.getmtime(path) >= _source_mtime(source)
+        and _snapshot_version(path) == SNAPSHOT_VERSION
+    ):
+        return path
+    count = snapshot(records, path, config)
+    log.info(f"已生成快照 {path}: {count} 行。")
+    return path
+
+
+def _groups(path):
+    """按 (维度, 键) 排序，逐键产出 ((维度, 键), {行哈希: 行数据})。"""
+    conn = sqlite3.connect(path)
+    try:
+        current, rows = None, {}
+        for dimension, key, digest, data in conn.execute(
+            "SELECT dimension, key, hash, data FROM rows ORDER BY dimension, key, hash"
+        ):
+            if (dimension, key) != current:
+                if current is not None:
+                    yield current, rows
+                current, rows = (dimension, key), {}
+            rows[digest] = data
+        if current is not None:
+            yield current, rows
+    finally:
+        conn.close()
+
+
+def _column_changes(old, new):
+    return {
+        column: [old.get(column), new.get(column)]
+        for column in sorted(set(old) | set(new))
+        if old.get(column) != new.get(column)
+    }
+
+
+def _whole_rows(op, group, rows):
+    dimension, key = group
+    for data in rows:
+        yield {"op": op, "dimension": dimension, "key": key.split(_SEP), "values": json.loads(data)}
+
+
+def _group_changes(group, old, new):
+    """同一键下两次的行：内容相同的行不算变更；各剩一行时逐列比较，否则为删除与新增。"""
+    removed = [data for digest, data in old.items() if digest not in new]
+    added = [data for digest, data in new.items() if digest not in old]
+    if len(removed) == 1 and len(added) == 1:
+        dimension, key = group
+        yield {
+            "op": "changed",
+            "dimension": dimension,
+            "key": key.split(_SEP),
+            "columns": _column_changes(json.loads(removed[0]), json.loads(added[0])),
+        }
+        return
+    yield from _whole_rows("removed", group, removed)
+    yield from _whole_rows("added", group, added)
+
+
+def iter_changes(old_path, new_path):
+    """按 (维度, 键) 归并两个快照，逐条产出变更。"""
+    old_groups, new_groups = _groups(old_path), _groups(new_path)
+    old, new = next(old_groups, None), next(new_groups, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield from _whole_rows("removed", old[0], old[1].values())
+            old = next(old_groups, None)
+        elif old is None or new[0] < old[0]:
+            yield from _whole_rows("added", new[0], new[1].values())
+            new = next(new_groups, None)
+        else:
+            yield from _group_changes(new[0], old[1], new[1])
+            old, new = next(old_groups, None), next(new_groups, None)
+
+
+def write_changes(changes, out_path):
+    """写出变更文件，返回 Counter({(维度, op): 条数})。"""
+    opener = gzip.open if out_path.endswith(".gz") else open
+    directory = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(directory, exist_ok=True)
+    summary = Counter()
+    with opener(out_path, "wt", encoding="utf-8") as f:
+        for change in changes:
+            f.write(json.dumps(change, ensure_ascii=False, default=str, separators=(",", ":")))
+            f.write("\n")
+            summary[(change["dimension"], change["op"])] += 1
+    return summary
+
+
+def diff(old_source, new_source, out_path, config=None):
+    """比较两次运行的结果并写出变更文件，返回汇总 Counter。"""
+    old_path = snapshot_for(old_source, config)
+    new_path = snapshot_for(new_source, config)
+    summary = write_changes(iter_changes(old_path, new_path), out_path)
+    detail = ", ".join(f"{dim} {op} {n}" for (dim, op), n in sorted(summary.items())) or "无变更"
+    log.info(f"变更已写入 {out_path}: {detail}")
+    return summary
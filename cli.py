@@ -0,0 +1,285 @@
+"""
+命令行入口：
+
+    python cli.py run --cookie cookie/cookie1.txt --file file/file1.txt
+    python cli.py run --cookie cookie/cookie1.txt --file file/file1.txt --record-har har/run1.har
+    python cli.py run --cookie cookie/cookie1.txt --file file/file1.txt --replay-har har/run1.har
+    python cli.py run-all --cookie-dir cookie --file-dir file
+    python cli.py pipeline --cookie cookie/cookie1.txt --file a.xlsx --file b.xlsx --depth 2
+    python cli.py submit --cookie cookie/cookie1.txt --file file/file1.txt
+    python cli.py collect [--interval 60] [--once]
+    python cli.py watch --cookie cookie/cookie1.txt [--folder D:\\drops]
+    python cli.py validate-cookies [cookie/cookie1.txt ...]
+    python cli.py download-only --cookie cookie/cookie1.txt --since "2026-01-09 18:00:00"
+    python cli.py diff exports/20260101_090000 exports/20260201_090000 -o changes.jsonl.gz
+    python cli.py bench startup
+    python cli.py bench launch --profile headless-shell
+    python cli.py bench boundary --latency 50
+
+模块顶层只导入标准库轻量模块；Playwright、exportfile 等在子命令内部按需导入，
+--help 与 validate-cookies 不会加载浏览器相关依赖。
+"""
+import argparse
+import glob
+import os
+import sys
+
+import app_config
+
+
+def _read_text(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def _account_name(cookie_path):
+    return os.path.splitext(os.path.basename(cookie_path))[0]
+
+
+def _resolve_import_file(path):
+    """
+    --file 可以直接是导入文件，也可以是 file/fileN.txt 这种内容为导入文件路径的文本。
+    """
+    if path.lower().endswith(".txt"):
+        target = _read_text(path)
+        if os.path.exists(target):
+            return target
+    return path
+
+
+def _automation(args, account):
+    from automation import WebAutomation
+
+    config = app_config.load_config(args.config)
+    if getattr(args, "record_har", None) or getattr(args, "replay_har", None):
+        # load_config 的结果是缓存共享的，覆盖前先复制
+        config = dict(config)
+        if args.record_har:
+            config.update(har_mode="record", har_path=args.record_har)
+        else:
+            config.update(har_mode="replay", har_path=args.replay_har)
+    return WebAutomation(config, account=account)
+
+
+def _add_har_options(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--record-har", metavar="PATH", help="把本次网络流量录制为 HAR")
+    group.add_argument("--replay-har", metavar="PATH", help="从 HAR 离线回放，不访问真实站点")
+
+
+def cmd_run(args):
+    automation = _automation(args, args.account or _account_name(args.cookie))
+    path = automation.run_task(
+        import_file=_resolve_import_file(args.file),
+        cookie_string=_read_text(args.cookie),
+    )
+    print(f"文件已下载至: {path}")
+    return 0
+
+
+def cmd_run_all(args):
+    from test_webcall import run_sequential
+
+    run_sequential(cookie_dir=args.cookie_dir, file_dir=args.file_dir)
+    return 0
+
+
+def cmd_validate_cookies(args):
+    from cookie_check import inspect_cookie
+
+    paths = args.paths or sorted(glob.glob(os.path.join(args.cookie_dir, "*.txt")))
+    if not paths:
+        print("未找到 cookie 文件。")
+        return 1
+    failed = 0
+    for path in paths:
+        try:
+            result = inspect_cookie(_read_text(path))
+        except OSError as e:
+            result = {"ok": False, "problems": [str(e)], "user_id": None}
+        if result["ok"]:
+            print(f"{path}: OK (userId={result['user_id']})")
+        else:
+            failed += 1
+            print(f"{path}: 失败 - {'; '.join(result['problems'])}")
+    return 1 if failed else 0
+
+
+def cmd_download_only(args):
+    automation = _automation(args, args.account or _account_name(args.cookie))
+    path = automation.run_download(_read_text(args.cookie), args.since)
+    if path and not isinstance(path, list):
+        print(f"文件已下载至: {path}")
+    else:
+        print("没有需要下载的新报告。")
+        for existing in path or []:
+            print(f"已下载: {existing}")
+    return 0
+
+
+def cmd_pipeline(args):
+    automation = _automation(args, args.account or _account_name(args.cookie))
+    results = automation.run_pipeline(
+        [_resolve_import_file(path) for path in args.file],
+        _read_text(args.cookie),
+        depth=args.depth,
+    )
+    failed = 0
+    for path, result in results.items():
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"{path}: 失败 - {result}")
+        else:
+            print(f"{path}: 文件已下载至 {result}")
+    return 1 if failed else 0
+
+
+def cmd_submit(args):
+    automation = _automation(args, args.account or _account_name(args.cookie))
+    job = automation.submit_task(
+        _resolve_import_file(args.file), _read_text(args.cookie), os.path.abspath(args.cookie)
+    )
+    if job.get("id"):
+        print(f"已提交作业 {job['id']}，用 collect 收取。")
+    else:
+        print(f"文件已下载至: {job['dest_dir']}")
+    return 0
+
+
+def cmd_collect(args):
+    import runlog
+    from collector import Collector
+
+    config = app_config.load_config(args.config)
+    runlog.setup_from_config(config)
+    collector = Collector(config)
+    if args.once:
+        remaining = collector.collect_once()
+        print(f"未完成作业: {remaining}")
+        return 0
+    collector.run(interval=args.interval, until_empty=not args.forever)
+    return 0
+
+
+def cmd_watch(args):
+    from watch_folder import run_daemon
+
+    automation = _automation(args, args.account or _account_name(args.cookie))
+    folder = args.folder or automation.config.get("import_folder")
+    if not folder:
+        print("未指定监视目录（--folder 或配置 import_folder）。")
+        return 1
+    run_daemon(
+        automation,
+        _read_text(args.cookie),
+        folder,
+        settle_sec=args.settle,
+        poll_interval=args.poll,
+    )
+    return 0
+
+
+def cmd_diff(args):
+    import change_feed
+
+    config = app_config.load_config(args.config)
+    summary = change_feed.diff(args.old, args.new, args.output, config=config)
+    for (dimension, op), count in sorted(summary.items()):
+        print(f"{dimension}\t{op}\t{count}")
+    print(f"变更已写入: {args.output}")
+    return 0
+
+
+def cmd_bench(args):
+    import benchmarks
+
+    return benchmarks.run(args.name, args)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="天眼查批量导入导出自动化")
+    parser.add_argument(
+        "--config",
+        default=app_config.DEFAULT_CONFIG_PATH,
+        help="配置文件路径（默认 web_config.json）",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="单个账号上传并导出一个文件")
+    p.add_argument("--cookie", required=True, help="cookie 文本文件")
+    p.add_argument("--file", required=True, help="导入文件，或内容为导入文件路径的 .txt")
+    p.add_argument("--account", help="日志中的账号名（默认取 cookie 文件名）")
+    _add_har_options(p)
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("run-all", help="按 cookieN.txt / fileN.txt 依次执行")
+    p.add_argument("--cookie-dir", default="cookie")
+    p.add_argument("--file-dir", default="file")
+    p.set_defaults(func=cmd_run_all)
+
+    p = sub.add_parser("pipeline", help="同一账号连续上传多个文件，报告生成与下载在后台进行")
+    p.add_argument("--cookie", required=True)
+    p.add_argument("--file", required=True, action="append", help="导入文件（可重复）")
+    p.add_argument("--account")
+    p.add_argument("--depth", type=int, help="同时在途的文件数（默认配置 pipeline_depth 或 2）")
+    p.set_defaults(func=cmd_pipeline)
+
+    p = sub.add_parser("submit", help="只上传并提交导出，记录作业后关闭浏览器")
+    p.add_argument("--cookie", required=True)
+    p.add_argument("--file", required=True)
+    p.add_argument("--account")
+    p.set_defaults(func=cmd_submit)
+
+    p = sub.add_parser("collect", help="批量检查已提交作业，下载已生成的报告")
+    p.add_argument("--interval", type=int, default=60, help="检查间隔秒数")
+    p.add_argument("--once", action="store_true", help="只检查一遍")
+    p.add_argument("--forever", action="store_true", help="没有未完成作业时也不退出")
+    p.set_defaults(func=cmd_collect)
+
+    p = sub.add_parser("watch", help="监视导入目录，新文件写完后自动上传导出")
+    p.add_argument("--cookie", required=True)
+    p.add_argument("--folder", help="监视目录（默认配置中的 import_folder）")
+    p.add_argument("--account")
+    p.add_argument("--settle", type=float, default=2.0, help="文件大小保持不变多少秒后才处理")
+    p.add_argument("--poll", type=float, default=1.0, help="无 watchdog 时检查目录的间隔秒数")
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("validate-cookies", help="离线检查 cookie 是否完整、是否过期")
+    p.add_argument("paths", nargs="*", help="cookie 文件（默认 cookie 目录下全部 .txt）")
+    p.add_argument("--cookie-dir", default="cookie")
+    p.set_defaults(func=cmd_validate_cookies)
+
+    p = sub.add_parser("download-only", help="不上传，只勾选并下载指定时间之后的报告")
+    p.add_argument("--cookie", required=True)
+    p.add_argument("--since", required=True, help='开始时间 "YYYY-mm-dd HH:MM:SS"')
+    p.add_argument("--account")
+    _add_har_options(p)
+    p.set_defaults(func=cmd_download_only)
+
+    p = sub.add_parser("diff", help="比较两次导出结果，写出新增 / 删除 / 变更记录")
+    p.add_argument("old", help="较早一次的下载目录、结果文件或快照")
+    p.add_argument("new", help="较新一次的下载目录、结果文件或快照")
+    p.add_argument("-o", "--output", default="changes.jsonl.gz", help="变更文件（.gz 结尾时压缩）")
+    p.set_defaults(func=cmd_diff)
+
+    p = sub.add_parser("bench", help="运行基准测试（startup、launch、boundary 等）")
+    p.add_argument("name", help="基准名称")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument(
+        "--profile", action="append", help="launch 基准只测指定配置档（可重复）"
+    )
+    p.add_argument(
+        "--latency", type=float, default=0, help="boundary 基准每页请求模拟的延迟毫秒数"
+    )
+    p.set_defaults(func=cmd_bench)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
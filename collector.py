@@ -0,0 +1,294 @@
+"""
+提交与收取分离。
+
+提交阶段（WebAutomation.submit_task / `cli.py submit`）上传文件、等待 matchState、提交导出，
+把本次报告 ID 与 myReport/list 请求模板记入作业库后立即关闭浏览器。
+
+收取阶段（Collector / `cli.py collect`）定期按账号批量查询所有未完成作业的报告状态，
+已全部生成的作业经 requests 直连下载；直连失败时才为该作业打开浏览器批量下载。
+报告生成期间不占用任何浏览器。
+
+作业库为 JSON 文件（配置 "job_store"，默认 jobs.json）。`submit` 与运行中的 `collect` 可能是不同进程，
+每次修改都在文件锁（jobs.json.lock）内重新读入、修改、写回。
+作业保存请求模板的 url / method / 请求体与报告页实际发出的普通请求头；认证类请求头只保存名字，
+收取时从 cookie 文件中取同名 cookie 的值（X-AUTH-TOKEN -> auth_token），认证信息不落盘。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+import app_config
+import fileutil
+import metrics
+import runlog
+from cookie_check import parse_cookie_pairs
+from report_list import ReportListClient, ReportPageWatcher, ReportWaitError, report_state
+
+log = runlog.get_logger("collector")
+
+DEFAULT_JOB_STORE = "jobs.json"
+# 作业中保存的请求模板字段；请求头另经 split_headers 去掉认证信息
+TEMPLATE_KEYS = ("url", "method", "post_data")
+# 请求头名含这些片段时视为认证信息
+_SECRET_HEADER_MARKERS = ("auth", "token", "cookie", "session")
+SUBMITTED = "submitted"
+DOWNLOADED = "downloaded"
+FAILED = "failed"
+
+
+class JobStore:
+    """作业列表，每次修改后整体原子写回；线程锁 + 文件锁，多个进程同时修改也不会丢作业。"""
+
+    def __init__(self, path=DEFAULT_JOB_STORE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            jobs = json.load(f)
+        # 旧版本保存了完整请求头，下次写回时去掉其中的认证信息
+        for job in jobs:
+            template = job.get("template") or {}
+            if "auth_headers" not in template:
+                template["headers"], template["auth_headers"] = split_headers(
+                    template.get("headers")
+                )
+        return jobs
+
+    def _save(self, jobs):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(jobs, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def all(self):
+        with self._lock, fileutil.locked(self.path):
+            return self._load()
+
+    def outstanding(self):
+        return [job for job in self.all() if job["status"] == SUBMITTED]
+
+    def add(self, job):
+        with self._lock, fileutil.locked(self.path):
+            jobs = self._load()
+            jobs.append(job)
+            self._save(jobs)
+        return job
+
+    def update(self, job_id, **fields):
+        with self._lock, fileutil.locked(self.path):
+            jobs = self._load()
+            for job in jobs:
+                if job["id"] == job_id:
+                    job.update(fields)
+            self._save(jobs)
+
+
+def store_from_config(config):
+    return JobStore((config or {}).get("job_store") or DEFAULT_JOB_STORE)
+
+
+def split_headers(headers):
+    """把学到的请求头分成 (可保存的普通请求头, 认证请求头名列表)。"""
+    public, secret = {}, []
+    for name, value in (headers or {}).items():
+        if any(marker in name.lower() for marker in _SECRET_HEADER_MARKERS):
+            secret.append(name)
+        else:
+            public[name] = value
+    return public, secret
+
+
+def new_job(account, import_file, cookie_path, submission):
+    learned = submission.tracker.client.template
+    template = {key: learned.get(key) for key in TEMPLATE_KEYS}
+    template["headers"], template["auth_headers"] = split_headers(learned.get("headers"))
+    return {
+        "id": uuid.uuid4().hex[:12],
+        "account": account,
+        "import_file": import_file,
+        "cookie_path": cookie_path,
+        "start_str": submission.start_str,
+        "submitted_at": time.time(),
+        "report_ids": list(submission.report_ids),
+        "template": template,
+        "status": SUBMITTED,
+        "dest_dir": None,
+        "error": None,
+    }
+
+
+def _cookie_name(header):
+    """认证请求头对应的 cookie 名：去掉 x- 前缀，- 换成 _（X-AUTH-TOKEN -> auth_token）。"""
+    name = header.lower()
+    if name.startswith("x-"):
+        name = name[2:]
+    return name.replace("-", "_")
+
+
+def request_headers(template, cookie_string):
+    """
+    收取时的 myReport/list 请求头：作业保存的普通请求头，加上提交时出现过的认证请求头，
+    其值取自 cookie 文件中对应的 cookie；找不到对应 cookie 的认证请求头不发送。
+    cookie 本身由 session 携带。
+    """
+    headers = dict(template.get("headers") or {})
+    cookies = {name.lower(): value for name, value in parse_cookie_pairs(cookie_string).items()}
+    for header in template.get("auth_headers") or ():
+        value = cookies.get(_cookie_name(header))
+        if value:
+            headers[header] = value
+        else:
+            log.warning(f"cookie 中没有请求头 {header} 对应的值，不发送该请求头。")
+    return headers
+
+
+def cookie_domain(config):
+    """cookie 的域名：cookie_domain，缺省时取 import_page_url 的主机名。"""
+    domain = config.get("cookie_domain")
+    if not domain and config.get("import_page_url"):
+        domain = urlparse(config["import_page_url"]).hostname
+    return domain
+
+
+def cookies_from_string(cookie_string, domain):
+    """cookie 文本 -> make_session 所需的字典列表。"""
+    return [
+        {"name": name, "value": value, "domain": domain or "", "path": "/"}
+        for name, value in parse_cookie_pairs(cookie_string).items()
+    ]
+
+
+class Collector:
+    def __init__(self, config, store=None, workers=None, max_age_sec=24 * 3600):
+        self.config = config
+        self.store = store or store_from_config(config)
+        self.workers = workers or config.get("download_workers", 4)
+        self.max_age_sec = max_age_sec
+
+    def _read_cookie(self, job):
+        with open(job["cookie_path"], "r", encoding="utf-8") as f:
+            return f.read().strip()
+
+    def collect_once(self):
+        """检查一遍所有未完成作业，返回仍未完成的作业数。"""
+        by_account = {}
+        for job in self.store.outstanding():
+            by_account.setdefault(job["account"], []).append(job)
+        remaining = 0
+        for account, jobs in by_account.items():
+            with runlog.bind(account=account, job="collect", config=self.config):
+                remaining += self._collect_account(jobs)
+        return remaining
+
+    def _collect_account(self, jobs):
+        from report_download import DownloadError, download_reports, make_session
+
+        try:
+            cookie_string = self._read_cookie(jobs[0])
+        except OSError as e:
+            log.warning(f"无法读取 cookie 文件: {e}")
+            return len(jobs)
+        cookies = cookies_from_string(cookie_string, cookie_domain(self.config))
+        session = make_session(cookies, pool_size=self.workers)
+        try:
+            # 同一账号的全部作业一次查询：从第一页读到找齐所有报告 ID 为止
+            client = ReportListClient(None)
+            template = max(jobs, key=lambda job: job["submitted_at"])["template"]
+            client.template = dict(template, headers=request_headers(template, cookie_string))
+            watcher = ReportPageWatcher(client, session, workers=self.workers)
+            wanted = [report_id for job in jobs for report_id in job["report_ids"]]
+            try:
+                items = watcher.find_items(wanted)
+            except ReportWaitError as e:
+                # 超出读取范围：读到的作业照常处理，其余作业下面按未找到放弃
+                log.warning(str(e))
+                items, lost = e.found, set(wanted) - set(e.found)
+            else:
+                lost = set()
+        finally:
+            session.close()
+        if items is None:
+            log.warning("报告列表请求失败，稍后重试。")
+            return len(jobs)
+
+        remaining = 0
+        for job in jobs:
+            job_items = [items.get(report_id) for report_id in job["report_ids"]]
+            states = {report_state(item) for item in job_items}
+            if "failed" in states or lost & set(job["report_ids"]):
+                error = "report_failed" if "failed" in states else "not_found"
+                log.warning(f"作业 {job['id']} 的报告生成失败或已找不到（{error}），放弃。")
+                self.store.update(job["id"], status=FAILED, error=error)
+                continue
+            if states != {"ready"}:
+                if time.time() - job["submitted_at"] > self.max_age_sec:
+                    log.warning(f"作业 {job['id']} 超过 {self.max_age_sec} 秒仍未生成，放弃。")
+                    self.store.update(job["id"], status=FAILED, error="timeout")
+                else:
+                    remaining += 1
+                continue
+            metrics.REPORT_READY_WAIT_SECONDS.observe(time.time() - job["submitted_at"])
+            dest_dir = os.path.join(
+                app_config.get_export_download_path(self.config),
+                f"{time.strftime('%Y%m%d_%H%M%S')}_{job['id']}",
+            )
+            try:
+                with metrics.DOWNLOAD_SECONDS.time(method="direct"):
+                    download_reports(job_items, cookies, dest_dir, workers=self.workers)
+            except DownloadError as e:
+                log.warning(f"作业 {job['id']} 直连下载失败，改用浏览器批量下载: {e}")
+                try:
+                    dest_dir = self._download_in_browser(job, cookie_string)
+                except DownloadError as e:
+                    log.warning(f"作业 {job['id']} 浏览器批量下载失败，放弃: {e}")
+                    self.store.update(job["id"], status=FAILED, error=str(e))
+                    continue
+            if dest_dir:
+                log.info(f"作业 {job['id']}（{os.path.basename(job['import_file'])}）已下载到: {dest_dir}")
+                self.store.update(job["id"], status=DOWNLOADED, dest_dir=dest_dir)
+            else:
+                remaining += 1
+        return remaining
+
+    def _download_in_browser(self, job, cookie_string):
+        """
+        打开浏览器批量下载作业的报告，返回下载位置；出错时返回 None（下一轮重试），
+        结果为空（没有下载，也没有已下载过的文件）时抛 DownloadError。
+        """
+        from automation import WebAutomation
+        from report_download import DownloadError
+
+        automation = WebAutomation(self.config, account=job["account"])
+        try:
+            with metrics.DOWNLOAD_SECONDS.time(method="batch"):
+                result = automation.run_download(
+                    cookie_string, job["start_str"], report_ids=job["report_ids"]
+                )
+        except Exception as e:
+            log.warning(f"作业 {job['id']} 浏览器下载失败: {e}")
+            return None
+        if not result:
+            raise DownloadError("没有下载到任何报告")
+        if isinstance(result, list):
+            # 没有需要下载的新报告：result 为之前已下载的文件
+            return os.path.commonpath(result) if len(result) > 1 else os.path.dirname(result[0])
+        return result
+
+    def run(self, interval=60, until_empty=True):
+        """定期收取；until_empty 时没有未完成作业就结束。"""
+        while True:
+            remaining = self.collect_once()
+            if remaining:
+                log.info(f"还有 {remaining} 个作业未完成，{interval} 秒后再查。")
+            elif until_empty:
+                log.info("全部作业已收取。")
+                return
+            time.sleep(interval)
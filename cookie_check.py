@@ -0,0 +1,74 @@
+"""
+离线检查 cookie 字符串：不启动浏览器，只看关键字段是否存在、auth_token 是否过期。
+"""
+import base64
+import json
+import time
+from urllib.parse import unquote
+
+REQUIRED_COOKIES = ("auth_token", "tyc-user-info")
+
+
+def parse_cookie_pairs(cookie_string):
+    """把 "k1=v1; k2=v2" 解析为有序字典。"""
+    pairs = {}
+    for part in (cookie_string or "").split(";"):
+        if "=" in part:
+            name, value = part.strip().split("=", 1)
+            pairs[name] = value
+    return pairs
+
+
+def _jwt_payload(token):
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))
+    except Exception:
+        return None
+
+
+def inspect_cookie(cookie_string, now=None):
+    """
+    返回 {"ok": bool, "problems": [...], "user_id": ..., "expires_at": ...}。
+    """
+    now = time.time() if now is None else now
+    pairs = parse_cookie_pairs(cookie_string)
+    problems = []
+    result = {"ok": False, "problems": problems, "user_id": None, "expires_at": None}
+
+    if not pairs:
+        problems.append("cookie 为空或无法解析")
+        return result
+
+    for name in REQUIRED_COOKIES:
+        if name not in pairs:
+            problems.append(f"缺少 {name}")
+
+    token = pairs.get("auth_token")
+    if token:
+        payload = _jwt_payload(token)
+        if payload is None:
+            problems.append("auth_token 无法解析")
+        else:
+            exp = payload.get("exp")
+            result["expires_at"] = exp
+            if exp is not None and exp <= now:
+                expired_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(exp))
+                problems.append(f"auth_token 已于 {expired_at} 过期")
+
+    user_info = pairs.get("tyc-user-info")
+    if user_info:
+        try:
+            info = json.loads(unquote(user_info))
+        except Exception:
+            info = None
+        if info is None:
+            problems.append("tyc-user-info 无法解析")
+        else:
+            result["user_id"] = info.get("userId")
+            if str(info.get("isExpired")) == "1":
+                problems.append("tyc-user-info 标记会员已过期")
+
+    result["ok"] = not problems
+    return result
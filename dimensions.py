@@ -0,0 +1,124 @@
+"""
+导出维度注册表。
+
+每个维度由数据描述：弹窗类型（basic 为“基础工商信息导出”，more 为“更多维度导出”）、
+按钮文字、每批上限、确认接口与日志标签。web_config.json 的 "dimensions" 可覆盖或新增，例如
+
+    "dimensions": {"branch": {"button": "分支机构", "batch_limit": 5000}}
+
+"export_dimensions" 选择每个作业导出的维度：列表（所有作业共用），
+或按导入文件名匹配的字典 {"*": ["basic"], "invest_*.xlsx": ["basic", "investment"]}。
+未配置时导出 basic、shareholder、investment 三个维度（原有行为）。
+"""
+import threading
+
+import app_config
+import runlog
+
+log = runlog.get_logger("export")
+
+BASIC = "basic"
+MORE = "more"
+
+DIM_ENDPOINT = "batch/search/company/export/dim"
+
+DEFAULT_DIMENSIONS = {
+    "basic": {
+        "kind": BASIC,
+        "label": "基本信息",
+        "batch_limit": 10000,
+        "endpoint": "batch/search/company/exportAndFields",
+        "accept_data": "success",
+    },
+    "shareholder": {"button": "股东信息", "label": "股东", "batch_limit": 5000},
+    "investment": {"button": "对外投资", "label": "对外投资", "batch_limit": 5000},
+}
+
+DEFAULT_SELECTION = ("basic", "shareholder", "investment")
+# "dimensions" 中每个维度可配置的字段（Dimension 的构造参数）
+SPEC_KEYS = ("kind", "button", "label", "batch_limit", "endpoint", "accept_data")
+
+_warned = set()
+_warned_lock = threading.Lock()
+
+
+def _warn_once(message):
+    """registry() 调用频繁，同一条配置告警只记一次。"""
+    with _warned_lock:
+        if message in _warned:
+            return
+        _warned.add(message)
+    log.warning(message)
+
+
+class Dimension:
+    def __init__(
+        self,
+        key,
+        kind=MORE,
+        button=None,
+        label=None,
+        batch_limit=5000,
+        endpoint=DIM_ENDPOINT,
+        accept_data=None,
+    ):
+        self.key = key
+        self.kind = kind
+        self.button = button
+        self.label = label or button or key
+        self.batch_limit = batch_limit
+        self.endpoint = endpoint
+        self.accept_data = accept_data
+
+    def accept(self, data):
+        """确认接口 state == ok 时，再按 accept_data 核对 data 字段（未配置则不核对）。"""
+        return self.accept_data is None or data.get("data") == self.accept_data
+
+    def __repr__(self):
+        return f"Dimension({self.key!r}, label={self.label!r}, batch_limit={self.batch_limit})"
+
+
+def registry(config=None):
+    """{key: Dimension}：默认维度合并配置中的 "dimensions"。"""
+    config = app_config.active() if config is None else config
+    specs = {key: dict(spec) for key, spec in DEFAULT_DIMENSIONS.items()}
+    for key, spec in (config.get("dimensions") or {}).items():
+        if not isinstance(spec, dict):
+            _warn_once(f"维度 {key} 的配置不是字典，已忽略。")
+            continue
+        unknown = sorted(set(spec) - set(SPEC_KEYS))
+        if unknown:
+            _warn_once(
+                f"维度 {key} 的配置含未知字段 {', '.join(unknown)}，已忽略"
+                f"（可用字段: {', '.join(SPEC_KEYS)}）。"
+            )
+        specs.setdefault(key, {}).update(
+            {name: value for name, value in spec.items() if name in SPEC_KEYS}
+        )
+    return {key: Dimension(key, **spec) for key, spec in specs.items()}
+
+
+def from_name(name, default="basic", config=None):
+    """按报告名 / 文件名中的维度按钮文字识别维度 key，识别不到时返回 default。"""
+    for key, dim in registry(config).items():
+        if dim.kind != BASIC and any(
+            text and text in (name or "") for text in (dim.button, dim.label)
+        ):
+            return key
+    return default
+
+
+def for_job(config=None, job=None):
+    """当前作业要导出的 Dimension 列表（按配置顺序）；未知的维度名跳过并告警。"""
+    config = app_config.active() if config is None else config
+    selection = app_config.per_job(config.get("export_dimensions"), job)
+    if selection is None:
+        selection = DEFAULT_SELECTION
+    known = registry(config)
+    dims = []
+    for key in dict.fromkeys(selection):
+        if key not in known:
+            log.warning(f"未知的导出维度: {key}")
+            continue
+        dims.append(known[key])
+    return dims
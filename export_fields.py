@@ -0,0 +1,120 @@
+"""
+“基础工商信息导出”弹窗中要勾选的导出字段。
+
+web_config.json 的 "export_fields" 为字段名列表（所有作业共用），或按导入文件名匹配的字典：
+
+    "export_fields": {"*": ["企业名称", "统一社会信用代码", "登记状态"], "invest_*.xlsx": [...]}
+
+未配置或匹配不到时保持原来的全选。字段越少，报告生成越快、文件越小。
+同一账号上次已勾好的字段组合记入缓存；弹窗再次打开（如分批导出）时只核对勾选状态，
+一致则不再逐个点击。
+"""
+import threading
+
+import app_config
+import har_session
+import runlog
+from selector_registry import registry
+
+log = runlog.get_logger("export")
+
+CHECKED = "tic-gouxuan"
+PARTIAL = "tic-duoxuankuang-banxuan"
+
+_lock = threading.Lock()
+# {账号: 已勾选的字段元组}
+_applied = {}
+
+
+def resolve(config=None, job=None):
+    """当前作业的字段列表；未配置时返回 None（表示全选）。"""
+    config = app_config.active() if config is None else config
+    fields = app_config.per_job(config.get("export_fields"), job)
+    if not fields:
+        return None
+    return tuple(dict.fromkeys(fields))
+
+
+def _state(checkbox):
+    return checkbox.get_attribute("class") or ""
+
+
+def _click_until(checkbox, done, attempts=25):
+    checkbox.click()
+    for _ in range(attempts):  # ~5秒
+        if done(_state(checkbox)):
+            return True
+        har_session.pause(checkbox.page, 200)
+    return False
+
+
+def _field_checkbox(page, field):
+    return registry.locator(page, "export_field_checkbox", text=field, timeout=3000)
+
+
+def _matches(page, fields):
+    """弹窗中 fields 全部已勾选且不是全选。"""
+    if CHECKED in _state(registry.locator(page, "select_all_checkbox")):
+        return False
+    try:
+        return all(CHECKED in _state(_field_checkbox(page, field)) for field in fields)
+    except Exception:
+        return False
+
+
+def _clear_all(page):
+    checkbox = registry.locator(page, "select_all_checkbox")
+    state = _state(checkbox)
+    if PARTIAL in state:
+        # 半选时点击会变为全选，再点一次才清空
+        _click_until(checkbox, lambda s: CHECKED in s)
+        state = _state(checkbox)
+    if CHECKED in state:
+        return _click_until(checkbox, lambda s: CHECKED not in s and PARTIAL not in s)
+    return True
+
+
+def apply(page, fields, account=None):
+    """
+    在已打开的弹窗中只勾选 fields。成功返回 True；
+    字段全部找不到时返回 False 且不改动弹窗，由调用方退回全选，避免导出空字段。
+    """
+    if account is None:
+        account = runlog.current_context().get("account") or runlog.DEFAULT_ACCOUNT
+    with _lock:
+        cached = _applied.get(account)
+    if cached == fields and _matches(page, fields):
+        log.info(f"导出字段与上次一致（{len(fields)} 个），不再重新勾选。")
+        return True
+
+    # 先找齐复选框再取消全选：一个都找不到时保持弹窗原样
+    checkboxes, missing = [], []
+    for field in fields:
+        try:
+            checkboxes.append((field, _field_checkbox(page, field)))
+        except Exception:
+            missing.append(field)
+    if not checkboxes:
+        log.warning(f"弹窗中找不到任何配置的导出字段: {missing}")
+        with _lock:
+            _applied.pop(account, None)
+        return False
+
+    if not _clear_all(page):
+        log.warning("取消全选失败，请检查页面。")
+        return False
+    for field, checkbox in checkboxes:
+        if CHECKED not in _state(checkbox):
+            if not _click_until(checkbox, lambda s: CHECKED in s):
+                missing.append(field)
+    if missing:
+        log.warning(f"未能勾选导出字段: {missing}")
+    if len(missing) == len(fields):
+        with _lock:
+            _applied.pop(account, None)
+        return False
+    with _lock:
+        _applied[account] = fields
+    log.info(f"已勾选 {len(fields) - len(missing)} 个导出字段。")
+    return True
+
@@ -3,22 +3,37 @@ import os
 import time
 from playwright.sync_api import TimeoutError
 
+import app_config
+import batch_limits
+import dimensions
+import export_fields
+import har_session
+import metrics
+import profiling
+import rate_limit
+import report_catalog
+import retry_policy
+import runlog
+from report_boundary import newer_entries
+from report_list import (
+    REPORT_URL,
+    ReportListBuffer,
+    ReportListClient,
+    ReportPageWatcher,
+    ReportTracker,
+    ReportWaitError,
+    report_ids_from_response,
+)
+from selector_registry import registry
+
+log = runlog.get_logger("export")
+
 
 def _get_export_download_path():
     """
-    读取 web_config.json 中的 export_download_path，若缺失则使用 ./downloads。
+    当前配置中的 export_download_path，若缺失则使用 ./downloads（配置按 mtime 缓存）。
     """
-    config_path = os.path.join(os.path.dirname(__file__), "web_config.json")
-    default_path = os.path.join(os.getcwd(), "downloads")
-    try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
-            path = cfg.get("export_download_path") or default_path
-    except Exception:
-        path = default_path
-    if not os.path.exists(path):
-        os.makedirs(path, exist_ok=True)
-    return path
+    return app_config.get_export_download_path()
 
 
 def wait_for_state_done(page, timeout_sec=60):
@@ -49,7 +64,7 @@ def wait_for_state_done(page, timeout_sec=60):
             match_state = None
         if match_state == 2 and not state["done"]:
             state["done"] = True
-            print("上传结束")
+            log.info("上传结束")
 
     page.on("response", _log_response)
 
@@ -66,10 +81,10 @@ def wait_for_state_done(page, timeout_sec=60):
             if state["done"]:
                 break
     if not state["done"]:
-        print("在规定时间内未检测到 matchState==2。")
+        log.warning("在规定时间内未检测到 matchState==2。")
 
     try:
-        page.off("response", _log_response)
+        page.remove_listener("response", _log_response)
     except Exception:
         pass
 
@@ -80,360 +95,584 @@ def click_export_button(page):
     """
     Step 2: 找到并点击“基础工商信息导出”按钮。
     """
-    btn_selector = "//span[contains(@class, '_c7f86') and contains(@class, '_63015') and contains(text(), '基础工商信息导出')]"
-    btn = page.locator(btn_selector)
-    btn.wait_for(state="visible")
+    btn = registry.locator(page, "export_button")
     btn.click()
-    print("已点击“基础工商信息导出”按钮。")
+    log.info("已点击“基础工商信息导出”按钮。")
 
 
 def wait_export_modal(page):
     """
     Step 3: 等待“基础工商信息导出”弹窗出现。
     """
-    modal_selector = "//span[contains(@class, '_6e216') and contains(@class, '_cdd93') and contains(., '基础工商信息导出')]"
-    page.wait_for_selector(modal_selector, state="visible")
-    print("“基础工商信息导出”弹窗已出现。")
+    registry.locator(page, "export_modal")
+    log.info("“基础工商信息导出”弹窗已出现。")
 
 
 def ensure_select_all_fields(page):
     """
-    Step 4: 非全选择全选导出字段。
+    Step 4: 非全选（半选或未勾选）时点击全选导出字段。
     """
-    checkbox_selector = (
-        "//i[contains(@class, '_f4eb7') and contains(@class, '_f6a60') "
-        "and contains(@class, '_53505') and contains(@class, '_c9c1f')]"
-    )
-    checkbox = page.locator(checkbox_selector)
-    checkbox.wait_for(state="visible")
+    checkbox = registry.locator(page, "select_all_checkbox")
     class_attr = checkbox.get_attribute("class") or ""
     if "tic-gouxuan" in class_attr:
-        print("已经是全选")
-    elif "tic-duoxuankuang-banxuan" in class_attr:
+        log.info("已经是全选")
+    elif "tic-" in class_attr:
+        # 半选（tic-duoxuankuang-banxuan）与未勾选的图标点击一次都变为全选
         checkbox.click()
         # 轮询检查是否变为选中态
         for _ in range(25):  # ~5秒
             class_attr = checkbox.get_attribute("class") or ""
             if "tic-gouxuan" in class_attr:
-                print("点击全选成功")
+                log.info("点击全选成功")
                 break
-            time.sleep(0.2)
+            har_session.pause(page, 200)
         else:
-            print("点击全选后未检测到已选中状态，请检查页面。")
+            log.warning("点击全选后未检测到已选中状态，请检查页面。")
     else:
-        print("未找到可识别的全选复选框状态。")
+        log.warning("未找到可识别的全选复选框状态。")
+
+
+def ensure_export_fields(page):
+    """
+    Step 4: 按 export_fields 配置勾选导出字段；未配置或勾选失败时全选。
+    """
+    fields = export_fields.resolve()
+    if fields is None or not export_fields.apply(page, fields):
+        ensure_select_all_fields(page)
 
 
 def read_export_count(page):
     """
     Step 5: 读取 class 为 _b4a3e _ab8c7 的 span 文本，转为数字并输出。
     """
-    count_selector = "//span[contains(@class, '_b4a3e') and contains(@class, '_ab8c7')]"
-    span = page.locator(count_selector)
-    span.wait_for(state="visible")
+    span = registry.locator(page, "export_count")
     raw_text = span.inner_text().strip()
     # 去掉千分位逗号
     digits = raw_text.replace(",", "")
     try:
         value = int(digits)
-        print(f"导出数量: {value}")
+        log.info(f"导出数量: {value}")
         return value
     except ValueError:
-        print(f"无法解析导出数量，原始值: {raw_text}")
+        log.warning(f"无法解析导出数量，原始值: {raw_text}")
         return None
 
 
-def perform_export(page, total_count):
+EXPORT_CONFIRM_TIMEOUT = 60
+TOO_LARGE = "too_large"
+
+
+class ExportConfirm:
+    """
+    监听某个页面上的导出确认接口（exportAndFields / export/dim）。
+    必须在点击“导出”之前创建；poll() 返回 True / "warn"，批次超过服务端上限返回 "too_large"
+    （上限记入 self.limit），超时返回 False，未出结果返回 None。
+    只监听本页面的响应，多个页面并行导出时互不串扰。
+    """
+
+    def __init__(
+        self, page, target, accept, label, timeout_sec=EXPORT_CONFIRM_TIMEOUT, dimension=None
+    ):
+        self.page = page
+        self.target = target
+        self.accept = accept
+        self.label = label
+        self.dimension = dimension
+        self.confirmed_at = None
+        self.deadline = time.time() + timeout_sec
+        self.started = time.perf_counter()
+        self.result = None
+        self.report_ids = []
+        self.limit = None
+        page.on("response", self._on_response)
+
+    def _on_response(self, resp):
+        if self.result is not None or self.target not in resp.url:
+            return
+        try:
+            data = json.loads(resp.text())
+        except Exception:
+            return
+        state = data.get("state")
+        if state == "ok" and self.accept(data):
+            log.info(f"本批次{self.label}导出请求成功。")
+            self.report_ids = report_ids_from_response(data)
+            self.confirmed_at = time.time()
+            self.result = True
+            self._observe("ok")
+        elif state == "warn":
+            log.warning(f"{self.label}导出次数不够，刷新页面继续后续流程。")
+            self.result = "warn"
+            self._observe("warn")
+            metrics.QUOTA_WARN_TOTAL.inc(dimension=self.label)
+        elif state is not None:
+            message = data.get("message") or data.get("msg") or ""
+            limit = batch_limits.limit_from_text(message)
+            if limit:
+                log.warning(f"{self.label}导出批次超过上限 {limit}：{message}")
+                self.limit = limit
+                self.result = TOO_LARGE
+                self._observe("too_large")
+
+    def _observe(self, result):
+        metrics.EXPORT_CONFIRM_SECONDS.observe(
+            time.perf_counter() - self.started, dimension=self.label, result=result
+        )
+
+    def poll(self):
+        if self.result is not None:
+            return self.result
+        if time.time() >= self.deadline:
+            log.warning(f"等待{self.label}导出成功超时。")
+            self._observe("timeout")
+            return False
+        return None
+
+    def close(self):
+        try:
+            self.page.remove_listener("response", self._on_response)
+        except Exception:
+            pass
+
+
+def _confirm(page, dim):
+    return ExportConfirm(
+        page, dim.endpoint, accept=dim.accept, label=dim.label, dimension=dim.key
+    )
+
+
+def _dimension(key):
+    return dimensions.registry()[key]
+
+
+class ExportLedger:
+    """
+    记录本次运行被服务端确认的导出批次（每批生成一个报告）及响应中带回的报告 ID。
+    by_dimension 为各维度确认的批次数，last_confirmed 为最后一次确认的时间，
+    用于在共用账号的报告列表中只认领与本次批次相符的报告。
+    """
+
+    def __init__(self):
+        self.accepted = {}
+        self.by_dimension = {}
+        self.report_ids = []
+        self.warned = 0
+        self.last_confirmed = None
+
+    def record(self, waiter):
+        if waiter.result == "warn":
+            self.warned += 1
+            return
+        self.accepted[waiter.label] = self.accepted.get(waiter.label, 0) + 1
+        if waiter.dimension:
+            self.by_dimension[waiter.dimension] = self.by_dimension.get(waiter.dimension, 0) + 1
+        if waiter.confirmed_at:
+            self.last_confirmed = max(self.last_confirmed or 0, waiter.confirmed_at)
+        self.report_ids.extend(waiter.report_ids)
+
+    @property
+    def total(self):
+        return sum(self.accepted.values())
+
+
+def run_export_flows(flows, pump_page, poll_ms=100, ledger=None):
+    """
+    协作式调度导出流程。每个 flow 是生成器：执行页面操作后 yield 一个 ExportConfirm，
+    调度器在等待期间持续驱动 Playwright 事件循环，哪个确认先到就先恢复哪个 flow。
+    Playwright 同步 API 只能单线程使用，多个页面的 60 秒确认等待在这里重叠进行。
+    """
+    pending = {}
+
+    def advance(flow, value):
+        try:
+            pending[flow] = flow.send(value)
+        except StopIteration:
+            pass
+
+    for flow in flows:
+        advance(flow, None)
+
+    while pending:
+        pump_page.wait_for_timeout(poll_ms)
+        for flow, waiter in list(pending.items()):
+            result = waiter.poll()
+            if result is None:
+                continue
+            waiter.close()
+            del pending[flow]
+            if result in (True, "warn") and ledger is not None:
+                ledger.record(waiter)
+            advance(flow, result)
+
+
+def _confirm_steps(page, waiter):
+    """等待单次导出确认；warn 时刷新页面。"""
+    ok = yield waiter
+    if ok == "warn":
+        try:
+            rate_limit.reload(page, wait_until="domcontentloaded")
+        except Exception:
+            pass
+    return ok
+
+
+def _export_range_steps(
+    page, total_count, batch_size, submit_range, reopen_fn, dim=None, reopen_first=False
+):
     """
-    Step 6: 根据数量选择导出方式。
-    - 少于 1 万：点击 class="_f64c8 tyc-btn-v2 _53199 _c26a6 _d025c" 的按钮。
-    - 大于等于 1 万：使用“自定义范围”分批导出，每批最多 10000。
+    分批提交导出范围，逐批等待确认。warn 时刷新页面并终止本维度，不终止整个程序。
+    服务端提示批次超过上限时记下上限，按新上限从当前起点重排剩余范围。
     """
+    first_batch = not reopen_first  # 第一次使用已打开的弹窗，后续才重新打开
+    start = 1
+    while start <= total_count:
+        end = min(start + batch_size - 1, total_count)
+        if not first_batch and reopen_fn:
+            reopen_fn()
+        first_batch = False
+        waiter = submit_range(start, end)
+        ok = (yield from _confirm_steps(page, waiter)) if waiter else False
+        if ok == TOO_LARGE and waiter.limit and waiter.limit < end - start + 1:
+            if dim is not None:
+                batch_limits.record_limit(dim, waiter.limit, "server")
+            batch_size = waiter.limit
+            log.info(f"按上限 {batch_size} 重新分批，从 {start} 继续。")
+            continue
+        if ok == "warn":
+            break
+        if ok is not True:
+            log.warning(f"范围 {start}-{end} 导出失败或超时，停止。")
+            break
+        if dim is not None:
+            batch_limits.record_accepted(dim, end - start + 1)
+        start = end + 1
+
+
+def _rejected_as_too_large(ok, waiter, size, dim):
+    """
+    直接导出被服务端以超过上限拒绝：上限小于本次条数时记下上限并返回 True（改为分批）；
+    提示的上限不小于本次条数时说明不是批次问题，不记录、不重排。
+    """
+    if ok != TOO_LARGE or not waiter.limit:
+        return False
+    if waiter.limit >= size:
+        log.warning(f"{dim.label}导出被拒绝，但提示的上限 {waiter.limit} 不小于 {size} 条，不重新分批。")
+        return False
+    batch_limits.record_limit(dim, waiter.limit, "server")
+    return True
+
+
+def _read_modal_limit(page, dim):
+    """弹窗中如有单批上限提示，记入批次上限；不等待，提示不存在时直接跳过。"""
+    for sel in registry.candidates("export_limit_hint"):
+        try:
+            loc = page.locator(sel)
+            if loc.count():
+                limit = batch_limits.limit_from_text(loc.first.inner_text())
+                if limit:
+                    batch_limits.record_limit(dim, limit, "modal")
+                return
+        except Exception:
+            continue
+
+
+def perform_export_steps(page, total_count, dim=None):
+    """
+    Step 6: 根据数量选择导出方式（dim 默认为 basic 维度）。
+    - 少于每批上限：点击 class="_f64c8 tyc-btn-v2 _53199 _c26a6 _d025c" 的按钮。
+    - 大于等于每批上限：使用“自定义范围”分批导出。
+    """
+    dim = dim or _dimension("basic")
     if total_count is None:
-        print("无法判断总条数，跳过导出点击。")
+        log.warning("无法判断总条数，跳过导出点击。")
         return
 
-    if total_count < 10000:
-        btn_selector = "//button[contains(@class, '_f64c8') and contains(@class, 'tyc-btn-v2') and contains(@class, '_53199') and contains(@class, '_c26a6') and contains(@class, '_d025c')]"
-        btn = page.locator(btn_selector)
-        btn.wait_for(state="visible")
+    _read_modal_limit(page, dim)
+    batch_size = batch_limits.batch_size(dim)
+    if total_count < batch_size:
+        btn = registry.locator(page, "basic_export_confirm")
+        waiter = _confirm(page, dim)
         btn.click()
-        print("总条数 < 10000，已点击直接导出按钮。")
+        log.info(f"总条数 {total_count} 少于单批上限 {batch_size}，已点击直接导出按钮。")
+        ok = yield from _confirm_steps(page, waiter)
+        if _rejected_as_too_large(ok, waiter, total_count, dim):
+            yield from perform_export_custom_ranges_steps(page, total_count, dim, reopen_first=True)
+        elif ok is True:
+            batch_limits.record_accepted(dim, total_count)
     else:
-        perform_export_custom_ranges(page, total_count)
+        yield from perform_export_custom_ranges_steps(page, total_count, dim)
+
+
+def perform_export(page, total_count, dim=None):
+    run_export_flows([perform_export_steps(page, total_count, dim)], page)
 
 
-def perform_export_custom_ranges(page, total_count):
+def perform_export_custom_ranges_steps(page, total_count, dim=None, reopen_first=False):
     """
-    大于等于 1 万时，使用自定义范围分批导出。
-    每批最多导出 10000 条，逐批触发 exportAndFields 接口成功后继续。
+    大于等于每批上限时，使用自定义范围分批导出，逐批触发 exportAndFields 接口成功后继续。
     """
+    dim = dim or _dimension("basic")
 
     def open_custom_range():
         # 重新打开弹窗
         click_export_button(page)
         wait_export_modal(page)
-        ensure_select_all_fields(page)
+        ensure_export_fields(page)
         # 进入自定义范围
-        span_selector = (
-            "//span[contains(@class, '_576dc') and contains(text(), '自定义范围：')]"
-        )
-        span = page.locator(span_selector)
-        span.wait_for(state="visible")
+        span = registry.locator(page, "custom_range")
         span.click()
-        print("已打开弹窗并进入自定义范围。")
-
-    def wait_export_success():
-        target = "batch/search/company/exportAndFields"
-        deadline = time.time() + 60  # up to 60s per批
-        while time.time() < deadline:
-            remaining_ms = max(1, int((deadline - time.time()) * 1000))
-            try:
-                resp = page.context.wait_for_event("response", timeout=remaining_ms)
-            except TimeoutError:
-                continue
-            if target in resp.url:
-                try:
-                    data = json.loads(resp.text())
-                    state = data.get("state")
-                    if state == "ok" and data.get("data") == "success":
-                        print("本批次导出请求成功。")
-                        return True
-                    if state == "warn":
-                        print("基本信息导出没次数了，刷新页面继续后续流程。")
-                        try:
-                            page.reload(wait_until="domcontentloaded")
-                        except Exception:
-                            pass
-                        return "warn"
-                except Exception:
-                    pass
-        print("等待 exportAndFields 成功超时。")
-        return False
+        log.info("已打开弹窗并进入自定义范围。")
 
     def submit_range(start, end):
-        inputs = page.locator("//input[contains(@class, '_90acb')]")
-        if inputs.count() < 2:
-            print("未找到自定义范围输入框。")
-            return False
+        inputs = _range_inputs(page)
+        if inputs is None:
+            return None
         inputs.nth(0).fill(str(start))
         inputs.nth(1).fill(str(end))
         # 点击导出按钮
-        btn_selector = "//button[contains(@class, '_f64c8') and contains(@class, 'tyc-btn-v2') and contains(@class, '_53199') and contains(@class, '_c26a6') and contains(@class, '_d025c')]"
-        btn = page.locator(btn_selector)
-        btn.wait_for(state="visible")
+        btn = registry.locator(page, "basic_export_confirm")
+        waiter = _confirm(page, dim)
         btn.click()
-        print(f"已提交导出范围：{start}-{end}")
-        return wait_export_success()
+        log.info(f"已提交导出范围：{start}-{end}")
+        return waiter
+
+    yield from _export_range_steps(
+        page,
+        total_count,
+        batch_limits.batch_size(dim),
+        submit_range,
+        open_custom_range,
+        dim=dim,
+        reopen_first=reopen_first,
+    )
+
+
+def perform_export_custom_ranges(page, total_count, dim=None):
+    run_export_flows([perform_export_custom_ranges_steps(page, total_count, dim)], page)
 
-    start = 1
-    batch_size = 10000
-    first_batch = True  # 第一次使用已打开的弹窗，后续才重新打开
-    while start <= total_count:
-        end = min(start + batch_size - 1, total_count)
-        if not first_batch:
-            open_custom_range()
-        ok = submit_range(start, end)
-        if ok == "warn":
-            # 刷新后终止本次自定义导出循环，但不终止整个程序
-            break
-        if not ok:
-            print(f"范围 {start}-{end} 导出失败或超时，停止。")
-            break
-        start = end + 1
-        first_batch = False
+
+def _range_inputs(page, timeout=5000):
+    """自定义范围的起止输入框（按页面缓存），不足两个时返回 None。"""
+    try:
+        inputs = registry.locator(page, "range_inputs", timeout=timeout)
+    except TimeoutError:
+        inputs = None
+    if inputs is None or inputs.count() < 2:
+        log.warning("未找到自定义范围输入框。")
+        return None
+    return inputs
 
 
 def open_more_dimensions_modal(page, target_text):
     click_more_dimensions_export_button(page)
-    btn = page.locator(
-        "//button[contains(@class, '_50ab4') and contains(@class, '_58c27') and contains(@class, '_6c649')][.//span[contains(text(), $text)] ]"
-    ).filter(has_text=target_text)
-    btn.wait_for(state="visible")
+    btn = registry.locator(page, "dimension_button", text=target_text)
     btn.click()
-    print(f"已重新打开“更多维度导出”并进入“{target_text}”。")
+    log.info(f"已重新打开“更多维度导出”并进入“{target_text}”。")
 
 
-def perform_more_dimensions_export(
-    page, total_count, open_modal_fn=None, batch_size=5000
+def perform_more_dimensions_export_steps(
+    page, total_count, dim, open_modal_fn=None, reopen_first=False
 ):
     """
-    更多维度导出，默认每批 5000 条，超过则分批并可重开弹窗。
+    更多维度导出，按该维度的单批上限分批，并可重开弹窗。
     """
     if total_count is None:
-        print("无法判断总条数，跳过导出。")
+        log.warning("无法判断总条数，跳过导出。")
         return
 
-    export_btn_selector = "//button[contains(@class, '_50ab4') and contains(@class, 'index_exportButton__9Jnq2') and contains(@class, '_52bf6')][.//span[contains(text(), '导出数据')]]"
-
-    def wait_export_success():
-        target = "batch/search/company/export/dim"
-        deadline = time.time() + 60
-        while time.time() < deadline:
-            remaining_ms = max(1, int((deadline - time.time()) * 1000))
-            try:
-                resp = page.context.wait_for_event("response", timeout=remaining_ms)
-            except TimeoutError:
-                continue
-            if target in resp.url:
-                try:
-                    data = json.loads(resp.text())
-                    state = data.get("state")
-                    if state == "ok":
-                        print("本批次股东导出请求成功。")
-                        return True
-                    if state == "warn":
-                        print("更多维度导出次数不够，刷新页面继续后续流程。")
-                        try:
-                            page.reload(wait_until="domcontentloaded")
-                        except Exception:
-                            pass
-                        return "warn"
-                except Exception:
-                    pass
-        print("等待股东导出成功超时。")
-        return False
-
     def submit_range(start, end):
-        inputs = page.locator("//input[contains(@class, '_90acb')]")
-        if inputs.count() < 2:
-            print("未找到自定义范围输入框。")
-            return False
+        inputs = _range_inputs(page)
+        if inputs is None:
+            return None
         inputs.nth(0).fill(str(start))
         inputs.nth(1).fill(str(end))
-        btn = page.locator(export_btn_selector)
-        btn.wait_for(state="visible")
+        btn = registry.locator(page, "dimension_export_confirm")
+        waiter = _confirm(page, dim)
         btn.click()
-        print(f"导出范围：{start}-{end}")
-        return wait_export_success()
+        log.info(f"导出范围：{start}-{end}")
+        return waiter
+
+    yield from _export_range_steps(
+        page,
+        total_count,
+        batch_limits.batch_size(dim),
+        submit_range,
+        open_modal_fn,
+        dim=dim,
+        reopen_first=reopen_first,
+    )
 
-    start = 1
-    first_batch = True
-    while start <= total_count:
-        end = min(start + batch_size - 1, total_count)
-        if not first_batch:
-            if open_modal_fn:
-                open_modal_fn()
-        ok = submit_range(start, end)
-        if ok == "warn":
-            break
-        if not ok:
-            print(f"导出范围 {start}-{end} 失败或超时，停止。")
-            break
-        start = end + 1
-        first_batch = False
+
+def perform_more_dimensions_export(page, total_count, dim, open_modal_fn=None):
+    run_export_flows(
+        [
+            perform_more_dimensions_export_steps(
+                page, total_count, dim, open_modal_fn=open_modal_fn
+            )
+        ],
+        page,
+    )
 
 
-def basic_export_flow(page):
+def basic_export_steps(page, dim=None):
     """
     Step 1: 点击“基础工商信息导出”按钮
     Step 2: 等待弹窗出现
-    Step 3: 全选导出字段
+    Step 3: 勾选导出字段（默认全选）
     Step 4: 获取总条数
     Step 5: 按数量执行导出（含分批）
     """
     click_export_button(page)
     wait_export_modal(page)
-    ensure_select_all_fields(page)
+    ensure_export_fields(page)
     total_count = read_export_count(page)
-    perform_export(page, total_count)
+    yield from perform_export_steps(page, total_count, dim)
 
 
 def click_more_dimensions_export_button(page):
     """
     点击“更多维度导出”按钮。
     """
-    btn_selector = "//span[contains(@class, '_c7f86') and contains(@class, '_63015') and contains(text(), '更多维度导出')]"
-    btn = page.locator(btn_selector)
-    btn.wait_for(state="visible")
+    btn = registry.locator(page, "more_dimensions_button")
     btn.click()
-    print("已点击“更多维度导出”按钮。")
+    log.info("已点击“更多维度导出”按钮。")
 
 
-def shareholder_export_flow(page):
+def more_dimension_export_steps(page, dim):
     """
-    Step 1: 点击“更多维度导出”按钮：span元素，class包含“_c7f86 _63015”，text包含“更多维度导出”
-    Step 2: 点击“股东信息”按钮
+    更多维度导出流程：
+    Step 1: 点击“更多维度导出”
+    Step 2: 点击 dim.button（如“股东信息”“对外投资”）
     Step 3: 获取总条数
-    Step 4: 按数量执行导出（含分批）
+    Step 4: 按数量执行导出（超过单批上限时分批）
     """
     click_more_dimensions_export_button(page)
-    # Step 2: 点击“股东信息”按钮
-    shareholder_btn = page.locator(
-        "//button[contains(@class, '_50ab4') and contains(@class, '_58c27') and contains(@class, '_6c649')][.//span[contains(text(), '股东信息')]]"
-    )
-    shareholder_btn.wait_for(state="visible")
-    shareholder_btn.click()
-    print("已点击“股东信息”按钮。")
-    # Step 3: 获取总条数
+    btn = registry.locator(page, "dimension_button", text=dim.button)
+    btn.click()
+    log.info(f"已点击“{dim.button}”按钮。")
     total_count = read_export_count(page)
-    # Step 4: 按数量执行导出（含分批）
-    if total_count < 5000:
-        # 股东导出按钮
-        export_btn_selector = "//button[contains(@class, '_50ab4') and contains(@class, 'index_exportButton__9Jnq2') and contains(@class, '_52bf6')][.//span[contains(text(), '导出数据')]]"
-        btn = page.locator(export_btn_selector)
-        btn.wait_for(state="visible")
+    if total_count is None:
+        log.warning(f"无法判断{dim.label}总条数，跳过导出。")
+        return
+    _read_modal_limit(page, dim)
+    batch_size = batch_limits.batch_size(dim)
+
+    def reopen():
+        open_more_dimensions_modal(page, dim.button)
+
+    if total_count < batch_size:
+        btn = registry.locator(page, "dimension_export_confirm")
+        waiter = _confirm(page, dim)
         btn.click()
-        print("股东总条数 < 5000，已点击导出数据。")
+        log.info(f"{dim.label}总条数 {total_count} 少于单批上限 {batch_size}，已点击导出数据。")
+        ok = yield from _confirm_steps(page, waiter)
+        if _rejected_as_too_large(ok, waiter, total_count, dim):
+            yield from perform_more_dimensions_export_steps(
+                page, total_count, dim, open_modal_fn=reopen, reopen_first=True
+            )
+        elif ok is True:
+            batch_limits.record_accepted(dim, total_count)
     else:
-        perform_more_dimensions_export(
-            page,
-            total_count,
-            open_modal_fn=lambda: open_more_dimensions_modal(page, "股东信息"),
-            batch_size=5000,
+        yield from perform_more_dimensions_export_steps(
+            page, total_count, dim, open_modal_fn=reopen
         )
 
 
-def external_investment_export_flow(page):
+def dimension_export_steps(page, dim):
+    if dim.kind == dimensions.BASIC:
+        return basic_export_steps(page, dim)
+    return more_dimension_export_steps(page, dim)
+
+
+def dimension_export_flow(page, dim, ledger=None):
+    run_export_flows([dimension_export_steps(page, dim)], page, ledger=ledger)
+
+
+def _open_export_page(page, timeout_ms=15000):
     """
-    对外投资导出流程：
-    Step 1: 点击“更多维度导出”
-    Step 2: 点击“对外投资”按钮
-    Step 3: 获取总条数
-    Step 4: 按数量执行导出（含分批，5000/批）
+    在同一 context 中新开页面并打开上传结果页，等待导出按钮出现；失败返回 None。
     """
-    click_more_dimensions_export_button(page)
-    investment_btn = page.locator(
-        "//button[contains(@class, '_50ab4') and contains(@class, '_58c27') and contains(@class, '_6c649')][.//span[contains(text(), '对外投资')]]"
-    )
-    investment_btn.wait_for(state="visible")
-    investment_btn.click()
-    print("已点击“对外投资”按钮。")
-    total_count = read_export_count(page)
-    if total_count < 5000:
-        export_btn_selector = "//button[contains(@class, '_50ab4') and contains(@class, 'index_exportButton__9Jnq2') and contains(@class, '_52bf6')][.//span[contains(text(), '导出数据')]]"
-        btn = page.locator(export_btn_selector)
-        btn.wait_for(state="visible")
-        btn.click()
-        print("对外投资总条数 < 5000，已点击导出数据。")
-    else:
-        perform_more_dimensions_export(
-            page,
-            total_count,
-            open_modal_fn=lambda: open_more_dimensions_modal(page, "对外投资"),
-            batch_size=5000,
-        )
+    extra = page.context.new_page()
+    try:
+        rate_limit.goto(extra, page.url, wait_until="domcontentloaded")
+        registry.locator(extra, "more_dimensions_button", timeout=timeout_ms)
+        return extra
+    except Exception as e:
+        log.warning(f"新页面未能打开导出结果页，改为在主页面顺序导出: {e}")
+        try:
+            extra.close()
+        except Exception:
+            pass
+        return None
 
 
-def select_report(page, start_str, report_url=None):
+def export_dimensions_concurrently(page, dims, ledger=None):
+    """
+    matchState==2 后各维度的导出在服务端互不依赖：
+    第一个维度在主页面执行，其余各开一个同 context 的页面，
+    逐批确认等待交错进行。新页面打不开时退回主页面顺序执行。
+    """
+    if not dims:
+        return
+    flows = [dimension_export_steps(page, dims[0])]
+    extra_pages = []
+    fallback = []
+    for dim in dims[1:]:
+        extra = _open_export_page(page)
+        if extra is None:
+            fallback.append(dim)
+            continue
+        extra_pages.append(extra)
+        flows.append(dimension_export_steps(extra, dim))
+
+    try:
+        run_export_flows(flows, page, ledger=ledger)
+    finally:
+        for extra in extra_pages:
+            try:
+                extra.close()
+            except Exception:
+                pass
+
+    for dim in fallback:
+        har_session.sleep(1)
+        dimension_export_flow(page, dim, ledger=ledger)
+
+
+def select_report(
+    page,
+    start_str,
+    report_url=None,
+    report_ids=None,
+    list_client=None,
+    poll_workers=4,
+    skip_downloaded=False,
+    selected=None,
+):
+    """
+    在报告页勾选本次导出的报告并等待其全部生成（reportStatus == 2）。
+    传入 report_ids 时只勾选/跟踪这些报告；否则按 payDate 晚于 start_str 勾选。
+    能直接调用 myReport/list 时，先经接口并发等待所有相关页生成完毕，再操作页面勾选。
+    skip_downloaded 时不勾选报告目录中已下载过的报告；勾选的报告 ID 追加到 selected。
+    """
+    if selected is None:
+        selected = []
     target = "myReport/list"
-    buffered = []
+    buffered = ReportListBuffer()
+    client = list_client or ReportListClient(page.context.request)
+    list_requests = []
 
     def _on_resp(resp):
-        if target not in resp.url:
-            return
-        try:
-            data = json.loads(resp.text())
-            buffered.append(data)
-        except Exception:
-            return
+        if target in resp.url:
+            buffered.offer(resp)
+            if not list_requests:
+                list_requests.append(resp.request)
 
-    # 提前注册监听，避免跳转后错过首个接口
-    page.on("response", _on_resp)
+    # 提前注册监听，避免跳转后错过首个接口；context 的 response 事件已覆盖本页面
     page.context.on("response", _on_resp)
     if report_url:
-        page.goto(report_url)
-        print(f"已跳转到报告页面 {report_url}")
+        rate_limit.goto(page, report_url)
+        log.info(f"已跳转到报告页面 {report_url}")
 
     def to_ms(datetime_str):
         try:
@@ -449,129 +688,82 @@ def select_report(page, start_str, report_url=None):
             return None
 
     def wait_report_list(expected_page_num=None, timeout_sec=30):
+        """
+        从缓冲中按 FIFO 取出（指定页码的）列表数据；没有时阻塞等待下一个 myReport/list 响应。
+        所有响应只经 _on_resp 进入缓冲，这里不再重复解析。
+        """
         deadline = time.time() + timeout_sec
-
-        def pop_buffered():
-            if not buffered:
-                return None
-            # 按 FIFO 取出并消费，避免重复命中旧数据
-            data = buffered.pop(0)
-            page_num = data.get("data", {}).get("pageNum")
-            if expected_page_num is None or page_num == expected_page_num:
+        while True:
+            data = buffered.pop(expected_page_num)
+            if data:
                 return data
-            # 未命中则继续找下一条
-            return pop_buffered()
-
-        while time.time() < deadline:
-            buffered_hit = pop_buffered()
-            if buffered_hit:
-                return buffered_hit
 
-            remaining_ms = max(1, int((deadline - time.time()) * 1000))
+            remaining_ms = int((deadline - time.time()) * 1000)
+            if remaining_ms <= 0:
+                return None
             try:
-                resp = page.context.wait_for_event("response", timeout=remaining_ms)
+                resp = page.context.wait_for_event(
+                    "response",
+                    predicate=lambda r: target in r.url,
+                    timeout=remaining_ms,
+                )
             except TimeoutError:
                 continue
+            buffered.offer(resp)
 
-            if target not in resp.url:
-                continue
-
-            try:
-                data = json.loads(resp.text())
-            except Exception:
-                continue
-
-            page_num = data.get("data", {}).get("pageNum")
-            if expected_page_num is not None and page_num != expected_page_num:
-                continue
-            return data
-        return None
-
-    def click_row_checkbox(row):
-        candidates = [
-            row.locator("td").first.locator("div div svg"),
-            row.locator("td").first.locator("svg"),
-        ]
-        for cand in candidates:
-            try:
-                for idx in range(cand.count()):
-                    el = cand.nth(idx)
-                    if el.is_visible():
-                        el.click()
-                        return True
-            except Exception:
-                continue
-        return False
-
-    def click_first_visible(locator):
+    def wait_rows_visible():
         try:
-            for idx in range(locator.count()):
-                el = locator.nth(idx)
-                if el.is_visible():
-                    el.click()
-                    return True
-        except Exception:
-            return False
-        return False
+            registry.locator(page, "report_rows", timeout=15000)
+        except TimeoutError:
+            pass
 
     def select_first_n_rows(n):
         if n <= 0:
-            print("无需勾选任何行。")
+            log.info("无需勾选任何行。")
             return
-        rows = page.locator("tbody tr")
-        try:
-            rows.first.wait_for(state="visible", timeout=15000)
-        except TimeoutError:
-            pass
-
-        row_count = rows.count()
-        max_n = min(n, row_count)
-        for i in range(max_n):
-            row = rows.nth(i)
-            ok = click_row_checkbox(row)
+        wait_rows_visible()
+        clicked = registry.click_row_checkboxes(page, range(n))
+        for i, ok in enumerate(clicked):
             if not ok:
-                print(f"第 {i + 1} 行未找到可点击的勾选 svg。")
-        print(f"已勾选前 {max_n} 行。")
+                log.warning(f"第 {i + 1} 行未找到可点击的勾选 svg。")
+        log.info(f"已勾选前 {len(clicked)} 行。")
 
     def select_all_rows_on_page():
-        ok = click_first_visible(page.locator("thead svg"))
+        ok = registry.click_first_visible(page, "header_checkbox")
         if ok:
-            print("已通过表头勾选全选当前页。")
+            log.info("已通过表头勾选全选当前页。")
             return True
 
-        rows = page.locator("tbody tr")
-        row_count = rows.count()
-        for i in range(row_count):
-            click_row_checkbox(rows.nth(i))
-        print("已逐行勾选当前页全部行。")
+        registry.click_row_checkboxes(page)
+        log.info("已逐行勾选当前页全部行。")
         return True
 
+    def select_rows(page_num, items, whole_page):
+        """勾选 items（当前页最前的若干行），跳过已下载的报告。"""
+        fresh = [(i, item) for i, item in enumerate(items) if item.get("id") not in skip_ids]
+        if len(fresh) == len(items):
+            if whole_page:
+                select_all_rows_on_page()
+            else:
+                select_first_n_rows(len(items))
+        else:
+            log.info(f"第 {page_num} 页跳过已下载的报告 {len(items) - len(fresh)} 个。")
+            if fresh:
+                wait_rows_visible()
+                clicked = registry.click_row_checkboxes(page, [i for i, _ in fresh])
+                for (i, _), ok in zip(fresh, clicked):
+                    if not ok:
+                        log.warning(f"第 {page_num} 页第 {i + 1} 行未找到可点击的勾选 svg。")
+        selected.extend(item.get("id") for _, item in fresh)
+
     def click_next_page_icon():
-        return click_first_visible(page.locator("i.tic.tic-laydate-next-m"))
+        return registry.click_first_visible(page, "next_page")
 
     def click_prev_page_icon():
-        selectors = [
-            "i.tic.tic-laydate-prev-m",
-            "i.tic.tic-laydate-prev",
-            "i.tic.tic-laydate-pre-m",
-            "i.tic.tic-laydate-pre",
-        ]
-        for sel in selectors:
-            if click_first_visible(page.locator(sel)):
-                return True
-        return False
+        return registry.click_first_visible(page, "prev_page")
 
     def click_page_num(page_num):
-        xpath = (
-            "//div[contains(@class,'pageWrap')]"
-            f"//div[contains(@class,'num') and normalize-space(text())='{page_num}']"
-        )
-        loc = page.locator(xpath)
-        if click_first_visible(loc):
-            return True
-
-        loc = page.locator("div.pageWrap div.num").filter(has_text=str(page_num))
-        return click_first_visible(loc)
+        return registry.click_first_visible(page, "page_num", text=page_num)
 
     def goto_page(target_page_num, current_page_num, timeout_sec=30):
         if target_page_num == current_page_num:
@@ -583,7 +775,7 @@ def select_report(page, start_str, report_url=None):
                 expected_page_num=target_page_num, timeout_sec=timeout_sec
             )
             if not data:
-                time.sleep(0.5)
+                har_session.sleep(0.5)
                 data = wait_report_list(
                     expected_page_num=target_page_num, timeout_sec=timeout_sec
                 )
@@ -633,35 +825,30 @@ def select_report(page, start_str, report_url=None):
         return current_page_num, False, None
 
     def page_all_ready(data):
-        payload = data.get("data", {})
-        items = payload.get("items") or []
-        if not items:
-            return True
-        for item in items:
-            status = safe_int(item.get("reportStatus"))
-            if status != 2:
-                return False
-        return True
+        return count_unready(data) == 0
 
     def count_unready(data):
+        """
+        页面逐页等待时的未生成数。按 ID 跟踪时，勾选时在这一页、现在却不在的报告也算未生成，
+        避免报告被新报告挤到下一页后这一页被误判为已完成。
+        """
         payload = data.get("data", {})
         items = payload.get("items") or []
-        unready = 0
-        for item in items:
-            status = safe_int(item.get("reportStatus"))
-            if status != 2:
-                unready += 1
-        return unready
+        if report_ids is None:
+            return sum(1 for item in items if safe_int(item.get("reportStatus")) != 2)
+        expected = page_ids.get(safe_int(payload.get("pageNum")) or 1, set())
+        ready = {item.get("id") for item in items if safe_int(item.get("reportStatus")) == 2}
+        return len(expected - ready)
 
     def wait_until_page_ready(page_num, initial_data=None, timeout_sec=7200):
         if initial_data and page_all_ready(initial_data):
-            print(f"第{page_num}页文档全部生成完毕。")
+            log.info(f"第{page_num}页文档全部生成完毕。")
             return True
 
         if initial_data:
             remaining = count_unready(initial_data)
             if remaining > 0:
-                print(
+                log.info(
                     f"第{page_num}页还剩{remaining}个文档未生成完毕，接口轮询中，请稍后"
                 )
 
@@ -674,49 +861,102 @@ def select_report(page, start_str, report_url=None):
             if not data:
                 continue
             if page_all_ready(data):
-                print(f"第{page_num}页文档全部生成完毕。")
+                log.info(f"第{page_num}页文档全部生成完毕。")
                 return True
             remaining = count_unready(data)
             if remaining > 0:
-                print(
+                log.info(
                     f"第{page_num}页还剩{remaining}个文档未生成完毕，接口轮询中，请稍后"
                 )
         return False
 
-    try:
-        start_ms = to_ms(start_str)
-        if start_ms is None:
-            print(f"无法解析开始时间 start_str: {start_str}")
-            return False
-
+    def open_first_page():
         data = wait_report_list(timeout_sec=30)
         if not data:
-            print("未捕获到报告列表接口数据。")
-            return False
+            log.warning("未捕获到报告列表接口数据。")
+            return None
 
         initial_page_num = safe_int(data.get("data", {}).get("pageNum")) or 1
         if initial_page_num != 1:
             current_page_num = initial_page_num
             current_page_num, ok, data2 = goto_page(1, current_page_num)
             if not ok:
-                print("初始化跳转第一页失败。")
-                return False
+                log.warning("初始化跳转第一页失败。")
+                return None
             if data2:
                 data = data2
+        return data
 
-        page_list_data = {}
-        pending_pages = set()
-        current_page_num = None
+    def turn_to_next_page(page_num):
+        ok = click_next_page_icon()
+        if not ok:
+            log.warning("未找到可点击的下一页按钮。")
+            return None
 
-        max_pages = 200
-        selection_done = False
+        data = wait_report_list(expected_page_num=page_num + 1, timeout_sec=30)
+        if not data:
+            log.warning("翻页后未捕获到新的报告列表接口数据。")
+            return None
+        har_session.sleep(0.5)
+        return data
+
+    def select_by_ids(data, page_list_data, pending_pages, max_pages=200):
+        """
+        逐页勾选目标 ID 所在的行；新报告位于列表最前，通常只需看一两页。
+        返回最后停留的页码，失败返回 None。
+        """
+        remaining = set(target_ids)
+        current_page_num = 1
         for _ in range(max_pages):
             payload = data.get("data", {})
             items = payload.get("items") or []
-            if not items:
-                print("报告列表为空。")
-                selection_done = True
+            page_num = safe_int(payload.get("pageNum")) or 1
+            current_page_num = page_num
+            page_list_data[page_num] = data
+
+            hits = [(i, item) for i, item in enumerate(items) if item.get("id") in remaining]
+            if hits:
+                clicked = registry.click_row_checkboxes(page, [i for i, _ in hits])
+                for (i, _), ok in zip(hits, clicked):
+                    if not ok:
+                        log.warning(f"第 {page_num} 页第 {i + 1} 行未找到可点击的勾选 svg。")
+                remaining -= {item.get("id") for _, item in hits}
+                selected.extend(item.get("id") for _, item in hits)
+                if any(safe_int(item.get("reportStatus")) != 2 for _, item in hits):
+                    pending_pages.add(page_num)
+                    page_ids[page_num] = {item.get("id") for _, item in hits}
+                log.info(f"第 {page_num} 页勾选本次报告 {len(hits)} 个。")
+
+            if not remaining:
+                return current_page_num
+
+            page_size = safe_int(payload.get("pageSize")) or max(len(items), 1)
+            total = safe_int(payload.get("total")) or 0
+            if not items or page_num * page_size >= total:
                 break
+            data = turn_to_next_page(page_num)
+            if not data:
+                return None
+
+        log.warning(f"有 {len(remaining)} 个本次报告未在列表中找到: {sorted(remaining)}")
+        return None
+
+    def select_by_start_time(data, page_list_data, pending_pages, max_pages=200):
+        """
+        按 payDate 晚于 start_str 逐页勾选。返回最后停留的页码，失败返回 None。
+        """
+        start_ms = to_ms(start_str)
+        if start_ms is None:
+            log.warning(f"无法解析开始时间 start_str: {start_str}")
+            return None
+
+        current_page_num = 1
+        for _ in range(max_pages):
+            payload = data.get("data", {})
+            items = payload.get("items") or []
+            if not items:
+                log.info("报告列表为空。")
+                return current_page_num
 
             page_num = safe_int(payload.get("pageNum")) or 1
             current_page_num = page_num
@@ -731,8 +971,8 @@ def select_report(page, start_str, report_url=None):
             last_item = items[-1] if items else {}
             last_pay_date = safe_int(last_item.get("payDate"))
             if last_pay_date is None:
-                print("无法读取最后一条数据的 payDate。")
-                return False
+                log.warning("无法读取最后一条数据的 payDate。")
+                return None
 
             if last_pay_date <= start_ms:
                 # 如果最后一条 payDate 早于 start_str，说明第一页已经包含 start_str 之后的全部数据。
@@ -745,43 +985,133 @@ def select_report(page, start_str, report_url=None):
                         select_count += 1
                     else:
                         break
-                select_first_n_rows(select_count)
-                selection_done = True
-                break
+                select_rows(page_num, items[:select_count], whole_page=False)
+                return current_page_num
 
-            select_all_rows_on_page()
+            select_rows(page_num, items, whole_page=True)
 
             has_next = (page_num * page_size) < total
             if not has_next:
-                print("已到最后一页。")
-                selection_done = True
-                break
+                log.info("已到最后一页。")
+                return current_page_num
 
-            ok = click_next_page_icon()
-            if not ok:
-                print("未找到可点击的下一页按钮。")
+            data = turn_to_next_page(page_num)
+            if not data:
+                return None
+
+        log.warning("翻页次数超出上限，停止勾选。")
+        return None
+
+    def scan_unready_ids_by_time(watcher, data):
+        """
+        从第 1 页按批并发读到 start_str 的边界页，返回 start_str 之后仍在生成中的报告 ID。
+        """
+        start_ms = to_ms(start_str)
+        if start_ms is None:
+            return None
+        result = newer_entries(
+            watcher.fetch,
+            start_ms,
+            first=data,
+            fetch_many=watcher.fetch_many,
+            batch=watcher.workers,
+        )
+        if result is None:
+            return None
+        boundary, entries = result
+        log.info(
+            f"start_str 之后的 {len(entries)} 个报告位于第 1-{boundary.last_page} 页"
+            f"（共 {boundary.requests} 次请求）。"
+        )
+        return {entry.id for entry in entries if entry.status == 1}
+
+    def wait_ready_over_api(data):
+        """
+        不翻页，经接口按报告 ID 并发轮询，直到本次报告全部生成。返回 True/False；
+        接口不可用时返回 None，由页面逐页等待兜底。
+        按 ID 而不是页码轮询：等待期间的新报告会把本次报告挤到后面的页。
+        """
+        if not client.ready and list_requests:
+            try:
+                client.learn(list_requests[0])
+            except Exception as e:
+                log.warning(f"记录 myReport/list 请求模板失败: {e}")
+        if not client.ready or har_session.active():
+            # HAR 录制 / 回放只走浏览器内的请求，由页面逐页等待
+            return None
+
+        from report_download import make_session
+
+        session = make_session(page.context.cookies(), pool_size=poll_workers)
+        try:
+            watcher = ReportPageWatcher(client, session, workers=poll_workers)
+            if report_ids is not None:
+                unready = set(target_ids)
+            else:
+                unready = scan_unready_ids_by_time(watcher, data)
+                if unready is None:
+                    return None
+            if not unready:
+                return True
+            log.info(f"经接口按 ID 轮询 {len(unready)} 个报告的生成状态...")
+            try:
+                found = watcher.wait_for_ids(
+                    sorted(unready), sleep=lambda sec: page.wait_for_timeout(sec * 1000)
+                )
+            except ReportWaitError as e:
+                log.warning(str(e))
                 return False
+            return found is not None
+        finally:
+            session.close()
+
+    target_ids = set(report_ids or ())
+    # 按 ID 跟踪时，各待生成页上勾选的报告 ID
+    page_ids = {}
+    skip_ids = set()
+    if skip_downloaded:
+        catalog = report_catalog.for_account()
+        if catalog is not None:
+            skip_ids = catalog.downloaded_ids()
 
-            data = wait_report_list(expected_page_num=page_num + 1, timeout_sec=30)
+    try:
+        if report_ids is not None and target_ids & skip_ids:
+            log.info(f"{len(target_ids & skip_ids)} 个报告已下载过，不再勾选。")
+            target_ids -= skip_ids
+            if not target_ids:
+                return True
+
+        data = open_first_page()
+        if not data:
+            return False
+
+        ready = wait_ready_over_api(data)
+        if ready is False:
+            return False
+        if ready:
+            # 报告已全部生成，刷新报告页使列表状态与接口一致后再勾选
+            buffered.clear()
+            rate_limit.reload(page, wait_until="domcontentloaded")
+            data = open_first_page()
             if not data:
-                print("翻页后未捕获到新的报告列表接口数据。")
                 return False
-            time.sleep(0.5)
 
-        if not selection_done:
-            print("翻页次数超出上限，停止勾选。")
+        page_list_data = {}
+        pending_pages = set()
+        if report_ids is not None:
+            current_page_num = select_by_ids(data, page_list_data, pending_pages)
+        else:
+            current_page_num = select_by_start_time(data, page_list_data, pending_pages)
+        if current_page_num is None:
             return False
 
         if not pending_pages:
-            print("全部文档生成成功")
+            log.info("全部文档生成成功")
             return True
 
-        if current_page_num is None:
-            current_page_num = 1
-
         current_page_num, ok, data = goto_page(1, current_page_num)
         if not ok:
-            print("跳转第一页失败。")
+            log.warning("跳转第一页失败。")
             return False
         if data:
             page_list_data[1] = data
@@ -789,7 +1119,7 @@ def select_report(page, start_str, report_url=None):
         for p in sorted(pending_pages):
             current_page_num, ok, data = goto_page(p, current_page_num)
             if not ok:
-                print(f"跳转到第 {p} 页失败。")
+                log.warning(f"跳转到第 {p} 页失败。")
                 return False
             if data:
                 page_list_data[p] = data
@@ -798,73 +1128,202 @@ def select_report(page, start_str, report_url=None):
                 p, initial_data=data or page_list_data.get(p)
             )
             if not ok_ready:
-                print(f"等待第 {p} 页 reportStatus 全部为 2 超时。")
+                log.warning(f"等待第 {p} 页 reportStatus 全部为 2 超时。")
                 return False
 
-        print("全部文档生成成功")
+        log.info("全部文档生成成功")
         return True
     finally:
         try:
-            page.off("response", _on_resp)
-        except Exception:
-            pass
-        try:
-            page.context.off("response", _on_resp)
+            page.context.remove_listener("response", _on_resp)
         except Exception:
             pass
 
 
-def batch_download(page):
+def batch_download(page, report_ids=None):
+    """点击批量下载并保存压缩包；传入所勾选的 report_ids 时记入报告目录。"""
     download_dir = _get_export_download_path()
 
     with page.expect_download() as download_info:
-        btn = page.locator(
-            "button._50ab4._52bf6._9e3b9:has(span:has-text('批量下载'))"
+        btn = registry.locator(
+            page, "batch_download", state="attached", timeout=20000
         ).first
-        btn.wait_for(state="attached", timeout=20000)
         btn.evaluate("el => el.click()")
-        print("已点击批量下载")
+        log.info("已点击批量下载")
 
     download = download_info.value
     filename = download.suggested_filename
     save_path = os.path.join(download_dir, filename)
     download.save_as(save_path)
-    print(f"文件已保存到: {save_path}")
+    log.info(f"文件已保存到: {save_path}")
+    report_catalog.record_archive(report_ids, save_path)
     return save_path
 
 
-def export_file(page):
+def direct_download(page, tracker, report_ids, workers=4):
+    """
+    按 fileUrl 直连并发下载本次报告，保存到 export_download_path 下以开始时间命名的目录，
+    返回该目录；失败返回 None 由调用方退回浏览器批量下载。
+    """
+    from report_download import DownloadError, download_reports
+
+    items = tracker.items_for(report_ids)
+    missing = set(report_ids) - set(items)
+    if missing:
+        log.warning(f"{len(missing)} 个报告未读到下载地址，改用批量下载。")
+        return None
+    dest_dir = os.path.join(
+        _get_export_download_path(), time.strftime("%Y%m%d_%H%M%S", time.localtime())
+    )
+    try:
+        download_reports(
+            list(items.values()), page.context.cookies(), dest_dir, workers=workers
+        )
+    except DownloadError as e:
+        log.warning(f"直连下载失败，改用批量下载: {e}")
+        return None
+    log.info(f"文件已保存到: {dest_dir}")
+    return dest_dir
+
+
+class ExportSubmission:
+    """
+    一个导入文件的导出提交结果。report_ids 为本次新建的报告 ID，无法识别时为 None。
+    """
+
+    def __init__(self, start_str, tracker, ledger, report_ids):
+        self.start_str = start_str
+        self.tracker = tracker
+        self.ledger = ledger
+        self.report_ids = report_ids
+
+
+def submit_exports(page, concurrent=True, dims=None):
+    """
+    上传完成后提交各维度的导出（dims 默认按 export_dimensions 配置），
+    等待服务端确认并识别本次新建的报告；不等待报告生成，返回 ExportSubmission。
+    """
+    with profiling.phase("submit_exports", page.context):
+        return _submit_exports(page, concurrent, dims)
+
+
+# 服务端 payDate 与本机时钟的允许偏差
+REPORT_CLOCK_SKEW_MS = 120 * 1000
+
+
+def _report_window(start_str, ledger):
+    """本次报告 payDate 的合理范围 (开始, 结束) 毫秒：提交开始前后到最后一次确认之后。"""
+    start_ms = int(time.mktime(time.strptime(start_str, "%Y-%m-%d %H:%M:%S")) * 1000)
+    end = ledger.last_confirmed or time.time()
+    return start_ms - REPORT_CLOCK_SKEW_MS, int(end * 1000) + REPORT_CLOCK_SKEW_MS
+
+
+def _submit_exports(page, concurrent, dims):
+    if dims is None:
+        dims = dimensions.for_job()
+    log.info(f"本次导出维度: {[dim.label for dim in dims]}")
     start_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    print(f"开始时间 {start_str}")
+    log.info(f"开始时间 {start_str}")
     # Step 1: 等待 batch/search/company/state 直到 matchState==2.
-    wait_for_state_done(page)
+    with metrics.MATCH_STATE_WAIT_SECONDS.time():
+        wait_for_state_done(page)
+    # 记录导出前的报告列表，导出后据此识别本次新建的报告
+    tracker = ReportTracker(
+        page.context, fetch_page=page if har_session.active() else None
+    )
+    tracker.snapshot()
     # (optional buffer) ensure server-side完成后再继续
-    time.sleep(1)
-    # 基础工商信息导出流程
-    basic_export_flow(page)
-    time.sleep(1)
-    # 股东信息导出流程
-    shareholder_export_flow(page)
-    time.sleep(1)
-
-    # 对外投资导出流程
-    external_investment_export_flow(page)
-    time.sleep(1)
-    # 导航至报告页面，并带最多 3 次重试（失败则刷新重试）
-    report_url = "https://www.tianyancha.com/usercenter/report"
-    ok = False
-    for attempt in range(3):
-        ok = select_report(page, start_str, report_url=report_url)
-        if ok:
-            break
-        print(f"select_report 失败，第 {attempt + 1} 次尝试后刷新重试...")
-        try:
-            page.reload(wait_until="domcontentloaded")
-        except Exception:
-            pass
-    if not ok:
-        print("select_report 重试 3 次仍失败，终止导出流程。")
+    har_session.sleep(1)
+    ledger = ExportLedger()
+    if concurrent:
+        # 各维度在各自页面上并行提交
+        export_dimensions_concurrently(page, dims, ledger=ledger)
+    else:
+        for i, dim in enumerate(dims):
+            if i:
+                har_session.sleep(1)
+            dimension_export_flow(page, dim, ledger=ledger)
+    har_session.sleep(1)
+    log.info(f"服务端已确认导出 {ledger.total} 批: {ledger.accepted}")
+    if not ledger.total and ledger.warned:
+        raise retry_policy.TaskFailure(
+            retry_policy.QUOTA_WARN, f"导出次数不够，{ledger.warned} 批导出均被拒绝。"
+        )
+    report_ids = tracker.new_report_ids(
+        expected=ledger.total,
+        known_ids=ledger.report_ids,
+        per_dimension=ledger.by_dimension,
+        window=_report_window(start_str, ledger),
+    )
+    if report_ids is None:
+        log.warning("无法识别本次新建的报告，按开始时间勾选。")
+    return ExportSubmission(start_str, tracker, ledger, report_ids)
+
+
+def collect_exports(page, submission, direct=True, download_workers=4):
+    """
+    在报告页等待 submission 的报告全部生成并下载，返回保存路径，失败返回 False。
+    """
+    with profiling.phase("collect_exports", page.context):
+        return _collect_exports(page, submission, direct, download_workers)
+
+
+def _collect_exports(page, submission, direct, download_workers):
+    start_str = submission.start_str
+    tracker = submission.tracker
+    report_ids = submission.report_ids
+    if report_ids is not None and not report_ids:
+        log.warning("本次导出没有新建任何报告，终止导出流程。")
         return False
 
-    save_path = batch_download(page)
+    # 导航至报告页面，失败按 selector_timeout 策略退避后刷新重试
+    selected = []
+
+    def _select():
+        del selected[:]
+        if not select_report(
+            page,
+            start_str,
+            report_url=REPORT_URL,
+            report_ids=report_ids,
+            list_client=tracker.client,
+            poll_workers=download_workers,
+            selected=selected,
+        ):
+            raise retry_policy.TaskFailure(
+                retry_policy.SELECTOR_TIMEOUT, "select_report 失败"
+            )
+
+    try:
+        with metrics.REPORT_READY_WAIT_SECONDS.time():
+            retry_policy.run(
+                _select,
+                label="勾选报告",
+                on_retry=lambda kind, attempt: rate_limit.reload(
+                    page, wait_until="domcontentloaded"
+                ),
+            )
+    except retry_policy.TaskFailure as e:
+        if e.kind != retry_policy.SELECTOR_TIMEOUT:
+            raise
+        log.warning("select_report 重试后仍失败，终止导出流程。")
+        return False
+
+    save_path = None
+    if direct and report_ids and not har_session.active():
+        with metrics.DOWNLOAD_SECONDS.time(method="direct"):
+            save_path = direct_download(
+                page, tracker, report_ids, workers=download_workers
+            )
+    if not save_path:
+        with metrics.DOWNLOAD_SECONDS.time(method="batch"):
+            save_path = batch_download(page, selected)
+    registry.log_stats()
     return save_path
+
+
+def export_file(page, concurrent=True, direct=True, download_workers=4):
+    submission = submit_exports(page, concurrent=concurrent)
+    return collect_exports(
+        page, submission, direct=direct, download_workers=download_workers
+    )
@@ -0,0 +1,165 @@
+"""
+资源调度：限制长时间运行时 Chromium 的内存。
+
+- 每个浏览器 context 处理 governor_max_tasks 个任务后，或该 context 的渲染进程 RSS
+  超过 governor_context_rss_mb 时回收该 context：关闭后用当前 cookie 新建并重新登录；
+  context 的渲染进程指 track(context) 之后新出现的 renderer 进程；
+- 开始新任务前检查本 worker 的浏览器 RSS（governor_total_rss_mb）与本机可用内存
+  （governor_min_available_mb），接近上限时等待（背压），最多等 governor_max_wait_sec 秒；
+  内存紧张时先回收已处理过任务的 context，再等待。
+
+未配置的阈值不生效。
+"""
+import time
+
+import metrics
+import procstat
+import runlog
+
+log = runlog.get_logger("governor")
+
+MB = 1024 * 1024
+# 总 RSS 达到上限的这个比例即开始背压
+BACKPRESSURE_RATIO = 0.9
+
+CONTEXT_RECYCLES = metrics.Counter(
+    "tyc_context_recycles_total", "Browser contexts recycled by the governor.", ("reason",)
+)
+BACKPRESSURE_SECONDS = metrics.Histogram(
+    "tyc_backpressure_wait_seconds", "Time new tasks waited for memory headroom."
+)
+
+_JS_HEAP = "() => (performance.memory ? performance.memory.usedJSHeapSize : 0)"
+
+
+class ResourceGovernor:
+    def __init__(
+        self,
+        max_tasks=20,
+        context_rss_mb=None,
+        total_rss_mb=None,
+        min_available_mb=None,
+        check_interval=5,
+        max_wait_sec=1800,
+    ):
+        self.max_tasks = max_tasks
+        self.context_rss_mb = context_rss_mb
+        self.total_rss_mb = total_rss_mb
+        self.min_available_mb = min_available_mb
+        self.check_interval = check_interval
+        self.max_wait_sec = max_wait_sec
+        self._tasks = {}
+        self._renderers = {}
+
+    @classmethod
+    def from_config(cls, config):
+        config = config or {}
+        return cls(
+            max_tasks=config.get("governor_max_tasks", 20),
+            context_rss_mb=config.get("governor_context_rss_mb"),
+            total_rss_mb=config.get("governor_total_rss_mb"),
+            min_available_mb=config.get("governor_min_available_mb"),
+            max_wait_sec=config.get("governor_max_wait_sec", 1800),
+        )
+
+    def track(self, context):
+        """在 context 打开页面之前调用：记下已有的渲染进程，之后新出现的计入该 context。"""
+        self._renderers[id(context)] = set(procstat.renderer_processes())
+
+    def context_rss(self, context):
+        """context 的渲染进程 RSS 之和（字节）；未 track 时计入全部渲染进程。"""
+        existing = self._renderers.get(id(context), set())
+        return sum(
+            procstat.rss(pid) for pid in procstat.renderer_processes() if pid not in existing
+        )
+
+    def sample(self, context=None):
+        """返回 {"browser_rss": 字节, "processes": {pid: 字节}, "js_heap": 字节, "available": 字节}。"""
+        processes = {pid: procstat.rss(pid) for pid in procstat.browser_processes()}
+        js_heap = None
+        if context is not None:
+            js_heap = 0
+            for page in context.pages:
+                try:
+                    js_heap += page.evaluate(_JS_HEAP) or 0
+                except Exception:
+                    continue
+        return {
+            "browser_rss": sum(processes.values()),
+            "processes": processes,
+            "js_heap": js_heap,
+            "available": procstat.available_memory(),
+        }
+
+    def task_done(self, context):
+        self._tasks[id(context)] = self._tasks.get(id(context), 0) + 1
+
+    def recycle_reason(self, context, pressure=False):
+        """需要回收时返回原因（"tasks" / "memory" / "pressure"），否则 None。"""
+        tasks = self._tasks.get(id(context), 0)
+        if self.max_tasks and tasks >= self.max_tasks:
+            return "tasks"
+        if self.context_rss_mb:
+            rss = self.context_rss(context)
+            if rss >= self.context_rss_mb * MB:
+                usage = self.sample(context)
+                log.info(
+                    f"context 渲染进程 RSS {rss // MB} MB（JS 堆 "
+                    f"{(usage['js_heap'] or 0) // MB} MB）超过 {self.context_rss_mb} MB。"
+                )
+                return "memory"
+        # 刚新建的 context 回收也释放不了内存
+        if pressure and tasks:
+            return "pressure"
+        return None
+
+    def recycle(self, context, reopen, pressure=False):
+        """
+        需要时关闭 context，并调用 reopen(cookies) 以其当前 cookie 重建会话，返回新的 context。
+        pressure 为 True 表示本机内存紧张，处理过任务的 context 也回收。
+        """
+        reason = self.recycle_reason(context, pressure)
+        if reason is None:
+            return context
+        cookies = context.cookies()
+        self._tasks.pop(id(context), None)
+        self._renderers.pop(id(context), None)
+        try:
+            context.close()
+        except Exception as e:
+            log.warning(f"关闭 context 失败: {e}")
+        CONTEXT_RECYCLES.inc(reason=reason)
+        log.info(f"回收浏览器 context（{reason}），用 {len(cookies)} 个 cookie 重建会话。")
+        return reopen(cookies)
+
+    def pressure(self):
+        """内存紧张时返回原因，否则 None。"""
+        if not (self.total_rss_mb or self.min_available_mb):
+            return None
+        usage = self.sample()
+        if self.total_rss_mb and usage["browser_rss"] >= self.total_rss_mb * BACKPRESSURE_RATIO * MB:
+            return f"浏览器 RSS {usage['browser_rss'] // MB} MB 接近上限 {self.total_rss_mb} MB"
+        available = usage["available"]
+        if self.min_available_mb and available is not None and available < self.min_available_mb * MB:
+            return f"本机可用内存 {available // MB} MB 低于 {self.min_available_mb} MB"
+        return None
+
+    def wait_for_headroom(self, sleep=time.sleep):
+        """内存紧张时阻塞，直到恢复或超时；返回等待的秒数。"""
+        if not (self.total_rss_mb or self.min_available_mb):
+            return 0
+        started = time.monotonic()
+        reason = self.pressure()
+        if reason is None:
+            return 0
+        log.warning(f"{reason}，暂停开始新任务。")
+        while reason is not None and time.monotonic() - started < self.max_wait_sec:
+            sleep(self.check_interval)
+            reason = self.pressure()
+        waited = time.monotonic() - started
+        BACKPRESSURE_SECONDS.observe(waited)
+        if reason is None:
+            log.info(f"内存已回落，等待 {waited:.0f} 秒后继续。")
+        else:
+            log.warning(f"等待 {waited:.0f} 秒后内存仍紧张，继续执行。")
+        return waited
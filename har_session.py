@@ -0,0 +1,142 @@
+"""
+HAR 录制 / 回放。
+
+web_config.json（或命令行 --record-har / --replay-har）中：
+
+- "har_mode": "record" 时把浏览器 context 的全部网络流量写入 "har_path"；
+- "har_mode": "replay" 时经 route_from_har 从 HAR 返回响应，不访问真实站点，
+  并跳过流程中的固定等待，便于离线、可重复、尽快地重跑 export_file。
+
+"har_path" 可包含 {account}。录制与回放时都只走浏览器内的请求（报告列表经页面 fetch，
+不使用直连下载与接口并发轮询），保证录下来的流量就是回放时需要的流量。
+
+模式属于 WebAutomation 实例：它在任务作用域内以 runlog.bind(har_mode=...) 绑定，
+流程中的 active() / replaying() / sleep() / pause() 读取当前作用域，不设进程级状态。
+"""
+import base64
+import json
+import os
+import time
+from collections import deque
+
+import runlog
+
+log = runlog.get_logger("har")
+
+RECORD = "record"
+REPLAY = "replay"
+
+# 请求体每次都不同（上传的 multipart 分隔符随机）的接口，回放时只按 URL 依次匹配
+DEFAULT_LOOSE_MATCH = ["batch/search/import"]
+
+_SKIP_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def resolve(config, account=None):
+    """返回 (mode, path)，未启用时 mode 为 None。"""
+    config = config or {}
+    mode = config.get("har_mode")
+    if mode not in (RECORD, REPLAY):
+        return None, None
+    path = config.get("har_path") or os.path.join("har", "{account}.har")
+    return mode, path.format(account=account or runlog.DEFAULT_ACCOUNT)
+
+
+def current_mode():
+    """当前作用域的 HAR 模式，未启用时为 None。"""
+    return runlog.current_context().get("har_mode")
+
+
+def active():
+    return current_mode() is not None
+
+
+def replaying():
+    return current_mode() == REPLAY
+
+
+def sleep(seconds):
+    """流程中的固定等待；回放时响应是现成的，直接跳过。"""
+    if not replaying():
+        time.sleep(seconds)
+
+
+def pause(page, ms):
+    """page.wait_for_timeout 的回放版本：回放时只让出一次事件循环。"""
+    page.wait_for_timeout(1 if replaying() else ms)
+
+
+def context_options(config, account=None):
+    mode, path = resolve(config, account)
+    if mode != RECORD:
+        return {}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    options = {"record_har_path": path}
+    if config.get("har_url_filter"):
+        options["record_har_url_filter"] = config["har_url_filter"]
+    log.info(f"HAR 录制到: {path}")
+    return options
+
+
+def attach(context, config, account=None):
+    """回放模式下为 context 挂上 HAR 路由。"""
+    mode, path = resolve(config, account)
+    if mode != REPLAY:
+        return
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"HAR 文件不存在: {path}")
+    context.route_from_har(path, not_found=config.get("har_not_found", "abort"))
+    patterns = config.get("har_loose_match", DEFAULT_LOOSE_MATCH)
+    if patterns and path.endswith(".har"):
+        _route_loose(context, path, patterns)
+    log.info(f"HAR 回放: {path}")
+
+
+def _load_entries(path, patterns):
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f).get("log", {}).get("entries", [])
+    queues = {pattern: deque() for pattern in patterns}
+    for entry in entries:
+        url = entry.get("request", {}).get("url", "")
+        for pattern in patterns:
+            if pattern in url:
+                queues[pattern].append(entry["response"])
+                break
+    return queues
+
+
+def _response_body(response):
+    content = response.get("content") or {}
+    text = content.get("text") or ""
+    if content.get("encoding") == "base64":
+        return base64.b64decode(text)
+    return text.encode("utf-8")
+
+
+def _route_loose(context, path, patterns):
+    """
+    按录制顺序返回匹配 URL 的响应，不比较请求体；用完后重复最后一条。
+    后注册的路由优先，因此先于 route_from_har 生效。
+    """
+    queues = {p: q for p, q in _load_entries(path, patterns).items() if q}
+    if not queues:
+        return
+
+    def _match(url):
+        return any(pattern in url for pattern in queues)
+
+    def _handler(route):
+        url = route.request.url
+        queue = next(q for p, q in queues.items() if p in url)
+        response = queue.popleft() if len(queue) > 1 else queue[0]
+        route.fulfill(
+            status=response.get("status", 200),
+            headers={
+                h["name"]: h["value"]
+                for h in response.get("headers", [])
+                if h["name"].lower() not in _SKIP_RESPONSE_HEADERS
+            },
+            body=_response_body(response),
+        )
+
+    context.route(_match, _handler)
@@ -0,0 +1,86 @@
+"""
+浏览器启动配置档。
+
+web_config.json 中用 "launch_profile" 选择，"launch_profiles" 可覆盖或新增配置档；
+未指定时按 "headless" 选择 headless-shell 或 headed-debug。
+"""
+import copy
+
+# 长时间批处理时避免后台页被节流，并关闭 Linux 工作机上无用的 GPU
+COMMON_ARGS = [
+    "--disable-gpu",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--no-first-run",
+    "--mute-audio",
+]
+
+SMALL_VIEWPORT = {"width": 1280, "height": 720}
+
+PROFILES = {
+    # Playwright 自带的 Chromium，headless 时使用轻量的 chromium-headless-shell
+    "headless-shell": {
+        "channel": None,
+        "headless": True,
+        "args": COMMON_ARGS,
+        "ignore_default_args": [],
+        "viewport": SMALL_VIEWPORT,
+    },
+    # 本机 Chrome 的新版 headless 模式（与有头 Chrome 行为一致）
+    "chrome-new-headless": {
+        "channel": "chrome",
+        "headless": True,
+        "args": COMMON_ARGS,
+        "ignore_default_args": [],
+        "viewport": SMALL_VIEWPORT,
+    },
+    # 有头 Chrome，便于本地调试（原先的固定启动方式）
+    "headed-debug": {
+        "channel": "chrome",
+        "headless": False,
+        "args": [],
+        "ignore_default_args": [],
+        "viewport": None,
+    },
+}
+
+
+def resolve(config):
+    """返回 (配置档名称, 配置档)。"""
+    config = config or {}
+    profiles = dict(PROFILES)
+    for name, overrides in (config.get("launch_profiles") or {}).items():
+        profiles[name] = {**profiles.get(name, PROFILES["headless-shell"]), **overrides}
+
+    name = config.get("launch_profile")
+    if not name:
+        name = "headless-shell" if config.get("headless") else "headed-debug"
+    if name not in profiles:
+        raise ValueError(f"未知的 launch_profile: {name}，可选: {', '.join(sorted(profiles))}")
+    return name, copy.deepcopy(profiles[name])
+
+
+def launch_options(profile):
+    options = {
+        "headless": profile.get("headless", True),
+        "args": list(profile.get("args") or []),
+    }
+    if profile.get("channel"):
+        options["channel"] = profile["channel"]
+    if profile.get("ignore_default_args"):
+        options["ignore_default_args"] = list(profile["ignore_default_args"])
+    return options
+
+
+def context_options(profile):
+    viewport = profile.get("viewport")
+    if viewport is None:
+        return {}
+    return {"viewport": dict(viewport), "device_scale_factor": 1}
+
+
+def launch(playwright, profile):
+    return playwright.chromium.launch(**launch_options(profile))
@@ -0,0 +1,332 @@
+"""
+Prometheus 文本格式的运行指标。
+
+web_config.json 中设置 "metrics_port"（可选 "metrics_host"，默认 127.0.0.1，只允许本机抓取）后，
+每个 worker 进程在该端口的 /metrics 暴露指标。
+
+热路径上的更新不加锁：每个线程写自己的分片（threading.local），
+只在线程首次写入时加锁登记分片，抓取时再汇总各分片；已结束线程的分片并入基础合计后移除。
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import runlog
+
+log = runlog.get_logger("metrics")
+
+DEFAULT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 1800, 3600, 7200)
+
+_registry = []
+_registry_lock = threading.Lock()
+_server = None
+
+
+def _label_str(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    ]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _Sharded(_Metric):
+    """
+    每个线程一个分片，写入无锁。线程结束后其分片并入基础合计并移除，
+    短生命周期的线程池不会让分片无限增多。
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._base = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _prune(self):
+        """把已结束线程的分片并入 _base（调用方持有 _shards_lock）；结束的线程不会再写入。"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, value in shard.items():
+                    self._add(self._base, key, value)
+        self._shards = live
+
+    def _add(self, totals, key, value):
+        raise NotImplementedError
+
+    def _snapshot_shards(self):
+        with self._shards_lock:
+            self._prune()
+            shards = [shard for _, shard in self._shards]
+            base = list(self._base.items())
+        yield base
+        for shard in shards:
+            # 其他线程可能正在写入，复制失败时重试
+            while True:
+                try:
+                    yield list(shard.items())
+                    break
+                except RuntimeError:
+                    continue
+
+    def collect(self):
+        totals = {}
+        for items in self._snapshot_shards():
+            for key, value in items:
+                self._add(totals, key, value)
+        return totals
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _add(self, totals, key, value):
+        totals[key] = totals.get(key, 0) + value
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            # [各桶计数..., +Inf 计数, 总和]
+            entry = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+                break
+        else:
+            entry[len(self.buckets)] += 1
+        entry[-1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _add(self, totals, key, entry):
+        merged = totals.get(key)
+        if merged is None:
+            totals[key] = list(entry)
+        else:
+            for i, value in enumerate(entry):
+                merged[i] += value
+
+    def render(self):
+        lines = self.header()
+        for key, entry in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                labels = _label_str(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_str(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Gauge(_Metric):
+    """当前值。inc/dec 是读-改-写，由锁保护（不在热路径上）；也可传入 func 在抓取时计算。"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), func=None):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        lines = self.header()
+        if self.func is not None:
+            try:
+                values = {(): self.func()}
+            except Exception as e:
+                log.warning(f"指标 {self.name} 采集失败: {e}")
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+def _chromium_rss():
+    import procstat
+
+    return procstat.browser_rss()
+
+
+TASKS_STARTED = Counter("tyc_tasks_started_total", "Tasks started.", ("task",))
+TASKS_SUCCEEDED = Counter("tyc_tasks_succeeded_total", "Tasks that succeeded.", ("task",))
+TASKS_FAILED = Counter(
+    "tyc_tasks_failed_total", "Tasks that failed, by failure class.", ("task", "failure_class")
+)
+LOGIN_CHECK_SECONDS = Histogram("tyc_login_check_seconds", "getUserInfo login check time.")
+MATCH_STATE_WAIT_SECONDS = Histogram(
+    "tyc_match_state_wait_seconds", "Wait for batch/search/company/state matchState==2."
+)
+EXPORT_CONFIRM_SECONDS = Histogram(
+    "tyc_export_confirm_seconds",
+    "Time from export click to the server's confirmation, per batch.",
+    ("dimension", "result"),
+)
+REPORT_READY_WAIT_SECONDS = Histogram(
+    "tyc_report_ready_wait_seconds", "Time until the run's reports are selected and ready."
+)
+DOWNLOAD_SECONDS = Histogram("tyc_download_seconds", "Report download time.", ("method",))
+QUOTA_WARN_TOTAL = Counter(
+    "tyc_quota_warn_total", "Export batches rejected with state=warn.", ("dimension",)
+)
+OPEN_CONTEXTS = Gauge("tyc_open_browser_contexts", "Browser contexts currently open.")
+CHROMIUM_RSS_BYTES = Gauge(
+    "tyc_chromium_rss_bytes", "RSS of the browser processes under this worker.", func=_chromium_rss
+)
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """
+    在后台线程启动 /metrics；指标属于整个进程，同一进程只启动一次，返回实际端口。
+    之后的配置要求别的地址时只记录警告。
+    """
+    global _server
+    with _registry_lock:
+        if _server is not None and port and (host, port) != _server.server_address[:2]:
+            log.warning(
+                f"指标服务已在 {_server.server_address[0]}:{_server.server_address[1]} 运行，"
+                f"忽略 {host}:{port}。"
+            )
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+            threading.Thread(
+                target=_server.serve_forever, name="metrics", daemon=True
+            ).start()
+            log.info(f"指标服务已启动: http://{host}:{_server.server_address[1]}/metrics")
+        return _server.server_address[1]
+
+
+def serve_from_config(config):
+    port = (config or {}).get("metrics_port")
+    if port is None:
+        return None
+    return serve(int(port), (config or {}).get("metrics_host") or "127.0.0.1")
+
+
+def shutdown():
+    global _server
+    with _registry_lock:
+        server, _server = _server, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,182 @@
+"""
+同一账号的多文件流水线。
+
+浏览器只负责上传与提交导出：一个文件的导出被服务端确认、拿到本次报告 ID 后，
+立即上传下一个文件；之前文件的“等待生成 + 直连下载”交给后台线程，经 requests 连接池
+按报告 ID 轮询 myReport/list，不占用浏览器。同时在途的文件数由 pipeline_depth 限制。
+
+无法识别报告 ID、关闭了直连下载或处于 HAR 录制 / 回放时，该文件退回在浏览器中顺序完成。
+每个文件开始前经 governor 检查内存（背压），提交后按任务数 / 内存回收浏览器 context。
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import app_config
+import governor
+import metrics
+import retry_policy
+import runlog
+from report_list import ReportListClient, ReportPageWatcher
+
+log = runlog.get_logger("pipeline")
+
+DEFAULT_DEPTH = 2
+
+
+class PipelineJob:
+    def __init__(self, import_file):
+        self.import_file = import_file
+        self.name = os.path.basename(import_file)
+        self.future = None
+        self.result = None
+        self.error = None
+
+
+class AccountPipeline:
+    def __init__(self, automation, cookie_string, depth=None, poll_interval=10):
+        config = automation.config
+        self.automation = automation
+        self.cookie_string = cookie_string
+        self.depth = max(depth or config.get("pipeline_depth", DEFAULT_DEPTH), 1)
+        self.concurrent = config.get("concurrent_exports", True)
+        self.direct = config.get("direct_download", True)
+        self.workers = config.get("download_workers", 4)
+        self.poll_interval = poll_interval
+        self.governor = governor.ResourceGovernor.from_config(config)
+
+    def run(self, import_files):
+        """依次处理 import_files，返回 {文件: 保存路径或异常}。"""
+        from playwright.sync_api import sync_playwright
+
+        jobs = [PipelineJob(path) for path in import_files]
+        in_flight = deque()
+        with sync_playwright() as p, ThreadPoolExecutor(
+            max_workers=self.depth, thread_name_prefix="pipeline"
+        ) as pool:
+            browser = self.automation._launch_browser(p)
+            try:
+                context, page = self._open_session(browser, self.cookie_string)
+                for i, job in enumerate(jobs):
+                    while len(in_flight) >= self.depth:
+                        # 在途已满：等最早的文件下载完再上传下一个
+                        self._finish(in_flight.popleft())
+                    if i:
+                        # 先回收（内存紧张时也回收用过的 context），再等内存回落
+                        context, page = self._recycle(browser, context, page)
+                    self.governor.wait_for_headroom()
+                    self._submit(page, job, pool)
+                    self.governor.task_done(context)
+                    if job.future is not None:
+                        in_flight.append(job)
+                    elif self._hopeless(job.error):
+                        for rest in jobs[i + 1 :]:
+                            rest.error = job.error
+                        break
+            finally:
+                # 后台只用 HTTP，浏览器可以先关
+                self.automation._close_browser(browser)
+            while in_flight:
+                self._finish(in_flight.popleft())
+        return {job.import_file: job.error or job.result for job in jobs}
+
+    def _open_session(self, browser, cookies):
+        context = self.automation._new_context(browser)
+        self.governor.track(context)
+        self.automation._load_cookies(context, cookies)
+        page = context.new_page()
+        self.automation._login(page)
+        return context, page
+
+    def _recycle(self, browser, context, page):
+        recycled = self.governor.recycle(
+            context,
+            lambda cookies: self._open_session(browser, cookies)[0],
+            pressure=self.governor.pressure() is not None,
+        )
+        if recycled is context:
+            return context, page
+        return recycled, recycled.pages[0]
+
+    def _hopeless(self, error):
+        return error is not None and retry_policy.engine.policies.get(
+            retry_policy.classify(error), {}
+        ).get("trips")
+
+    def _submit(self, page, job, pool):
+        from exportfile import collect_exports, submit_exports
+
+        metrics.TASKS_STARTED.inc(task="pipeline")
+        with runlog.bind(job=job.name):
+            try:
+                self.automation._upload_import_file(page, job.import_file)
+                submission = submit_exports(page, concurrent=self.concurrent)
+                if submission.report_ids == []:
+                    raise Exception("本次导出没有新建任何报告")
+                if (
+                    submission.report_ids is None
+                    or not self.direct
+                    or self.automation.har_mode is not None
+                ):
+                    log.info(f"{job.name} 在浏览器中顺序完成。")
+                    job.result = collect_exports(
+                        page, submission, direct=self.direct, download_workers=self.workers
+                    )
+                    if not job.result:
+                        raise Exception("export_file failed")
+                    self._count(job)
+                    return
+                job.future = pool.submit(
+                    self._collect,
+                    runlog.current_context(),
+                    job,
+                    submission.report_ids,
+                    dict(submission.tracker.client.template),
+                    page.context.cookies(),
+                )
+                log.info(f"{job.name} 已提交 {len(submission.report_ids)} 个报告，转入后台等待。")
+            except Exception as e:
+                job.error = e
+                log.warning(f"{job.name} 提交失败: {e}")
+                self._count(job)
+
+    def _collect(self, context, job, report_ids, template, cookies):
+        from report_download import download_reports, make_session
+
+        with runlog.bind(**context):
+            session = make_session(cookies, pool_size=self.workers)
+            try:
+                client = ReportListClient(None)
+                client.template = template
+                watcher = ReportPageWatcher(client, session, workers=self.workers)
+                with metrics.REPORT_READY_WAIT_SECONDS.time():
+                    items = watcher.wait_for_ids(report_ids, interval=self.poll_interval)
+            finally:
+                session.close()
+            if items is None:
+                raise Exception("等待报告生成超时")
+            dest_dir = os.path.join(
+                app_config.get_export_download_path(self.automation.config),
+                f"{time.strftime('%Y%m%d_%H%M%S')}_{os.path.splitext(job.name)[0]}",
+            )
+            with metrics.DOWNLOAD_SECONDS.time(method="direct"):
+                download_reports(list(items.values()), cookies, dest_dir, workers=self.workers)
+            log.info(f"文件已保存到: {dest_dir}")
+            return dest_dir
+
+    def _finish(self, job):
+        try:
+            job.result = job.future.result()
+        except Exception as e:
+            job.error = e
+            log.warning(f"{job.name} 后台处理失败: {e}")
+        self._count(job)
+
+    def _count(self, job):
+        if job.error is None:
+            metrics.TASKS_SUCCEEDED.inc(task="pipeline")
+        else:
+            metrics.TASKS_FAILED.inc(
+                task="pipeline", failure_class=retry_policy.classify(job.error)
+            )
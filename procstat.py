@@ -0,0 +1,121 @@
+"""
+进程树内存采样：优先用 psutil，未安装时在 Linux 上读取 /proc。
+"""
+import os
+
+try:
+    import psutil
+except ImportError:  # psutil 为可选依赖
+    psutil = None
+
+BROWSER_NAME_HINTS = ("chrome", "chromium", "headless_shell")
+
+
+def _proc_children_map():
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # comm 可能含空格，ppid 在右括号之后的第二个字段
+        rest = stat[stat.rfind(")") + 2 :].split()
+        children.setdefault(int(rest[1]), []).append(int(entry))
+    return children
+
+
+def _proc_name(pid):
+    try:
+        with open(f"/proc/{pid}/comm", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _proc_rss(pid):
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def descendants(root_pid=None):
+    """返回 root_pid（默认当前进程）所有子孙进程的 [(pid, name)]。"""
+    root_pid = os.getpid() if root_pid is None else root_pid
+    if psutil is not None:
+        try:
+            return [
+                (child.pid, child.name())
+                for child in psutil.Process(root_pid).children(recursive=True)
+            ]
+        except psutil.Error:
+            return []
+    if not os.path.isdir("/proc"):
+        return []
+    children = _proc_children_map()
+    result, stack = [], list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        result.append((pid, _proc_name(pid)))
+        stack.extend(children.get(pid, []))
+    return result
+
+
+def rss(pid):
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return 0
+    return _proc_rss(pid)
+
+
+def browser_processes(root_pid=None):
+    """当前进程拉起的 Chromium/Chrome 进程 pid 列表。"""
+    return [
+        pid
+        for pid, name in descendants(root_pid)
+        if any(hint in name.lower() for hint in BROWSER_NAME_HINTS)
+    ]
+
+
+def cmdline(pid):
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).cmdline()
+        except psutil.Error:
+            return []
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().decode("utf-8", "replace").split("\0")
+    except OSError:
+        return []
+
+
+def renderer_processes(root_pid=None):
+    """浏览器进程中的渲染进程（--type=renderer）pid 列表。"""
+    return [pid for pid in browser_processes(root_pid) if "--type=renderer" in cmdline(pid)]
+
+
+def browser_rss(root_pid=None):
+    """当前进程下全部浏览器进程的 RSS 之和（字节）。"""
+    return sum(rss(pid) for pid in browser_processes(root_pid))
+
+
+def available_memory():
+    """本机可用内存（字节），无法读取时返回 None。"""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
@@ -0,0 +1,179 @@
+"""
+按阶段开启的采样分析与 Playwright trace。
+
+web_config.json 中 "profile_phases" 列出要分析的阶段（true 表示全部）：
+run_task、login、upload、submit_exports、collect_exports。
+阶段内每 profile_interval_ms 毫秒采样一次该线程的 Python 调用栈，
+同时为浏览器 context 录制 Playwright trace（不截图，含 DOM 快照与网络）。
+产物按运行保存在 profile_dir（默认 profiles/）：
+
+    <时间>_<账号>_<文件>_<阶段>.folded      折叠栈，可用 speedscope / flamegraph.pl 查看
+    <时间>_<账号>_<文件>_<阶段>.trace.zip   playwright show-trace 查看
+
+设置在进入阶段时从当前作用域的配置（app_config.active()）读取；
+未开启时 phase() 返回同一个空操作对象，不启动线程。
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import app_config
+import runlog
+
+log = runlog.get_logger("profile")
+
+PHASES = ("run_task", "login", "upload", "submit_exports", "collect_exports")
+DEFAULT_DIR = "profiles"
+DEFAULT_INTERVAL_MS = 5
+
+# 正在录制 trace 的 context（同一 context 同时只能有一个 trace，嵌套阶段只分析 Python）
+_tracing = set()
+_tracing_lock = threading.Lock()
+_UNSAFE = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def settings(config=None):
+    """返回 (要分析的阶段, 产物目录, 采样间隔秒)；config 默认为当前作用域的配置。"""
+    config = app_config.active() if config is None else config
+    phases = config.get("profile_phases")
+    if phases is True:
+        phases = PHASES
+    interval_ms = config.get("profile_interval_ms") or DEFAULT_INTERVAL_MS
+    return frozenset(phases or ()), config.get("profile_dir") or DEFAULT_DIR, interval_ms / 1000
+
+
+class StackSampler:
+    """后台线程定期读取目标线程的调用栈，按折叠栈计数。"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, n=10):
+        """按采样数排序的叶子函数 [(函数, 占比)]。"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = self.samples or 1
+        return [(name, count / total) for name, count in leaves.most_common(n)]
+
+
+class _NoopPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopPhase()
+
+
+class _Phase:
+    def __init__(self, name, context, out_dir, interval):
+        self.name = name
+        self.context = context
+        self.out_dir = out_dir
+        self.interval = interval
+        self.sampler = None
+        self.tracing = False
+        self.started = None
+
+    def _base_path(self):
+        ctx = runlog.current_context()
+        parts = [
+            time.strftime("%Y%m%d_%H%M%S"),
+            ctx.get("account") or runlog.DEFAULT_ACCOUNT,
+            os.path.splitext(ctx.get("job") or "-")[0],
+            self.name,
+        ]
+        os.makedirs(self.out_dir, exist_ok=True)
+        return os.path.join(self.out_dir, "_".join(_UNSAFE.sub("_", str(p)) for p in parts))
+
+    def __enter__(self):
+        self.base = self._base_path()
+        if self.context is not None:
+            with _tracing_lock:
+                self.tracing = id(self.context) not in _tracing
+                if self.tracing:
+                    _tracing.add(id(self.context))
+            if self.tracing:
+                try:
+                    self.context.tracing.start(
+                        title=self.name, screenshots=False, snapshots=True, sources=False
+                    )
+                except Exception as e:
+                    log.warning(f"Playwright trace 启动失败: {e}")
+                    self._release()
+        self.started = time.perf_counter()
+        self.sampler = StackSampler(threading.get_ident(), self.interval).start()
+        return self
+
+    def _release(self):
+        with _tracing_lock:
+            _tracing.discard(id(self.context))
+        self.tracing = False
+
+    def __exit__(self, *exc):
+        self.sampler.stop()
+        elapsed = time.perf_counter() - self.started
+        folded = self.base + ".folded"
+        self.sampler.write_folded(folded)
+        if self.tracing:
+            try:
+                self.context.tracing.stop(path=self.base + ".trace.zip")
+            except Exception as e:
+                log.warning(f"Playwright trace 保存失败: {e}")
+            self._release()
+        top = ", ".join(f"{name} {share:.0%}" for name, share in self.sampler.top(5))
+        log.info(
+            f"阶段 {self.name} 用时 {elapsed:.1f} 秒，{self.sampler.samples} 个采样，"
+            f"已保存到 {self.base}.*；热点: {top}"
+        )
+        return False
+
+
+def phase(name, context=None):
+    """
+    分析一个阶段：with profiling.phase("submit_exports", page.context): ...
+    当前作用域的配置未开启该阶段时返回空操作对象。
+    """
+    phases, out_dir, interval = settings()
+    if name not in phases:
+        return _NOOP
+    return _Phase(name, context, out_dir, interval)
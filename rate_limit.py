@@ -0,0 +1,256 @@
+"""
+客户端令牌桶限流：按账号、按域名分别限制页面跳转、接口轮询与文件下载的速率，
+让持续吞吐停在 WAF 封禁阈值之下，而不是被封后整体停摆。
+
+web_config.json 中 "rate_limits" 可覆盖默认值，格式为
+{"api": {"account": [每秒速率, 突发上限], "host": [每秒速率, 突发上限]}, ...}；
+速率为 0 或 null 表示不限。限额只在本进程内生效，多个 worker 进程时请按进程数分摊。
+
+令牌桶按 (类别, 范围, 账号或域名) 在进程内共享；限额、接口模式与惩罚秒数在每次取令牌时
+从当前作用域的配置（app_config.active()）读取，同一进程中的多个实例互不覆盖。
+"""
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import app_config
+import metrics
+import runlog
+
+log = runlog.get_logger("ratelimit")
+
+NAVIGATION = "navigation"
+API = "api"
+DOWNLOAD = "download"
+
+# 华为云 WAF 拦截 / 限流时的状态码
+BLOCK_STATUSES = (418, 429)
+DEFAULT_PENALTY_SEC = 30
+
+DEFAULT_LIMITS = {
+    NAVIGATION: {"account": [0.5, 3], "host": [2, 6]},
+    API: {"account": [2, 5], "host": [5, 10]},
+    DOWNLOAD: {"account": [4, 8], "host": [10, 20]},
+}
+
+# 页面自身发出、需要限流的接口
+DEFAULT_API_PATTERNS = (
+    "myReport/list",
+    "batch/search/company/state",
+    "exportAndFields",
+    "export/dim",
+)
+
+PENALTIES = metrics.Counter(
+    "tyc_rate_limit_penalties_total",
+    "Responses that looked like WAF throttling and paused a bucket.",
+    ("kind",),
+)
+
+WAIT_SECONDS = metrics.Histogram(
+    "tyc_rate_limit_wait_seconds",
+    "Time spent waiting for rate-limit tokens.",
+    ("kind", "scope"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+class TokenBucket:
+    """rate 个/秒补充，最多攒 burst 个。reserve 先扣令牌（可为负）再返回需等待的秒数，先到先得。"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, n=1):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def drain(self, seconds):
+        """被限流后清空令牌，接下来 seconds 秒内不再放行。"""
+        with self._lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+            self.updated = time.monotonic()
+
+    def resize(self, rate, burst):
+        """修改速率与上限，保留当前令牌；欠账（限流惩罚）按新速率折算，剩余等待时间不变。"""
+        with self._lock:
+            if self.tokens < 0:
+                self.tokens = self.tokens * rate / self.rate
+            self.rate = rate
+            self.burst = max(burst, 1)
+            self.tokens = min(self.tokens, self.burst)
+
+
+def merge_limits(overrides=None):
+    merged = {kind: dict(scopes) for kind, scopes in DEFAULT_LIMITS.items()}
+    for kind, scopes in (overrides or {}).items():
+        merged.setdefault(kind, {}).update(scopes)
+    return merged
+
+
+class RateLimiter:
+    """构造时未给出的限额、接口模式与惩罚秒数取自当前作用域的配置。"""
+
+    def __init__(self, limits=None, api_patterns=None, penalty_sec=None):
+        self._limits = limits
+        self._api_patterns = api_patterns
+        self._penalty_sec = penalty_sec
+        self._buckets = {}
+        self._merged = {}
+        self._lock = threading.Lock()
+
+    def settings(self, config=None):
+        """返回 (合并后的限额, 接口模式, 惩罚秒数)；config 默认为当前作用域的配置。"""
+        config = app_config.active() if config is None else config
+        overrides = self._limits if self._limits is not None else config.get("rate_limits")
+        with self._lock:
+            # 按覆盖对象缓存合并结果；保留对象引用，id 不会被复用
+            cached = self._merged.get(id(overrides))
+            if cached is None:
+                cached = self._merged[id(overrides)] = (overrides, merge_limits(overrides))
+        patterns = self._api_patterns
+        if patterns is None:
+            patterns = config.get("rate_limit_api_patterns") or DEFAULT_API_PATTERNS
+        penalty_sec = self._penalty_sec
+        if penalty_sec is None:
+            penalty_sec = config.get("rate_limit_penalty_sec")
+        if penalty_sec is None:
+            penalty_sec = DEFAULT_PENALTY_SEC
+        return cached[1], tuple(patterns), penalty_sec
+
+    def _bucket(self, limits, kind, scope, key):
+        limit = limits.get(kind, {}).get(scope)
+        if not limit or not limit[0]:
+            return None
+        with self._lock:
+            bucket = self._buckets.get((kind, scope, key))
+            if bucket is None:
+                bucket = self._buckets[(kind, scope, key)] = TokenBucket(*limit)
+            elif (bucket.rate, bucket.burst) != (limit[0], max(limit[1], 1)):
+                # 配置不同的实例共用同一账号或域名时以最近的配置为准，不丢掉正在生效的惩罚
+                bucket.resize(*limit)
+            return bucket
+
+    def _scoped(self, kind, url, account, config=None):
+        if account is None:
+            account = runlog.current_context().get("account") or runlog.DEFAULT_ACCOUNT
+        limits = self.settings(config)[0]
+        host = urlsplit(url).hostname if url else None
+        buckets = {"account": self._bucket(limits, kind, "account", account)}
+        if host:
+            buckets["host"] = self._bucket(limits, kind, "host", host)
+        return {scope: bucket for scope, bucket in buckets.items() if bucket is not None}
+
+    def reserve(self, kind, url=None, account=None, config=None):
+        """扣一个令牌但不等待，返回 (最久需等待的范围, 秒数)；不限流时返回 (None, 0)。"""
+        scoped = self._scoped(kind, url, account, config)
+        waits = {scope: bucket.reserve() for scope, bucket in scoped.items()}
+        if not waits:
+            return None, 0.0
+        return max(waits.items(), key=lambda item: item[1])
+
+    def acquire(self, kind, url=None, account=None, sleep=time.sleep):
+        """取一个令牌，必要时等待；返回等待的秒数。"""
+        scope, wait = self.reserve(kind, url, account)
+        if scope is None:
+            return 0.0
+        WAIT_SECONDS.observe(wait, kind=kind, scope=scope)
+        if wait > 0:
+            if wait >= 1:
+                log.info(f"{kind} 限流（{scope}），等待 {wait:.1f} 秒。")
+            sleep(wait)
+        return wait
+
+    def penalize(self, kind, url=None, account=None, status=None, config=None):
+        """收到疑似 WAF 限流的响应：暂停该账号与域名的同类请求 penalty_sec 秒。"""
+        penalty_sec = self.settings(config)[2]
+        PENALTIES.inc(kind=kind)
+        log.warning(f"{kind} 请求疑似被 WAF 限流（HTTP {status}），暂停 {penalty_sec} 秒。")
+        for bucket in self._scoped(kind, url, account, config).values():
+            bucket.drain(penalty_sec)
+
+    def check(self, kind, status, url=None, account=None, config=None):
+        """status 为限流状态码时 penalize，返回是否被限流。"""
+        if status in BLOCK_STATUSES:
+            self.penalize(kind, url, account, status, config)
+            return True
+        return False
+
+    def classify(self, request, api_patterns=None):
+        """浏览器请求的限流类别，不需要限流时返回 None。"""
+        if request.is_navigation_request():
+            return NAVIGATION
+        if api_patterns is None:
+            api_patterns = self.settings()[1]
+        if any(pattern in request.url for pattern in api_patterns):
+            return API
+        return None
+
+    def attach(self, context, account=None):
+        """
+        记账页面自身发出的接口请求，并检查页面跳转与接口的响应状态。
+        路由只匹配 api_patterns（正则交给 Playwright 驱动匹配，其余请求不经过 Python）；
+        路由处理函数运行在 Playwright 的分发线程上，这里只扣令牌不等待，
+        欠下的等待由流程中的 pace() / goto() 用 page.wait_for_timeout 补上。
+        回调不在任务作用域内执行，所以在这里取下当前配置。
+        """
+        account = account or runlog.DEFAULT_ACCOUNT
+        config = app_config.active()
+        api_patterns = self.settings(config)[1]
+        pattern = re.compile("|".join(re.escape(p) for p in api_patterns))
+
+        def _handler(route):
+            self.reserve(API, route.request.url, account, config)
+            route.fallback()
+
+        def _on_response(response):
+            kind = self.classify(response.request, api_patterns)
+            if kind is not None:
+                self.check(kind, response.status, response.url, account, config)
+
+        context.route(pattern, _handler)
+        context.on("response", _on_response)
+
+    def pace(self, page, kind=NAVIGATION, url=None, account=None):
+        """在 Playwright 流程中取令牌：等待经 page.wait_for_timeout，不阻塞事件分发。"""
+        return self.acquire(
+            kind, url, account, sleep=lambda sec: page.wait_for_timeout(sec * 1000)
+        )
+
+
+limiter = RateLimiter()
+
+
+def acquire(kind, url=None, account=None, sleep=time.sleep):
+    return limiter.acquire(kind, url=url, account=account, sleep=sleep)
+
+
+def check(kind, status, url=None, account=None):
+    return limiter.check(kind, status, url=url, account=account)
+
+
+def pace(page, kind=NAVIGATION, url=None, account=None):
+    return limiter.pace(page, kind=kind, url=url, account=account)
+
+
+def goto(page, url, **kwargs):
+    """限流后跳转。"""
+    pace(page, NAVIGATION, url)
+    return page.goto(url, **kwargs)
+
+
+def reload(page, **kwargs):
+    """限流后刷新。"""
+    pace(page, NAVIGATION, page.url)
+    return page.reload(**kwargs)
@@ -0,0 +1,173 @@
+"""
+在 myReport/list 中定位 start_str 的边界页。
+
+列表按 payDate 倒序排列：第 1 页到边界页是 start_str 之后新建的报告，边界页之后都是旧报告。
+只需要边界页本身时，先从第一页读出 total / pageSize，再按各页最后一条的 payDate
+二分查找边界页，只需 O(log 页数) 次请求（find_boundary）。需要边界页之前全部报告时
+（按时间等待本次报告生成），这些页每一页都要读，newer_entries 改为从第 1 页按批并发顺序读到边界页。
+
+读过的页只保留 ReportEntry（id、payDate、reportStatus），不保留完整的报告字典。
+二分期间如有新报告插入，列表整体后移，边界最多偏后一页，不影响“到边界页为止”的勾选。
+"""
+from collections import namedtuple
+
+ReportEntry = namedtuple("ReportEntry", ("id", "pay_date", "status"))
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compact(items):
+    """报告字典列表 -> ReportEntry 元组。"""
+    return tuple(
+        ReportEntry(item.get("id"), _int(item.get("payDate")), _int(item.get("reportStatus")))
+        for item in items
+    )
+
+
+class ReportBoundary:
+    """
+    查找结果：last_page 为最后一个含有新报告的页，newer 为新报告条数，
+    pages 为查找中读过的页 {页码: (ReportEntry, ...)}，requests 为请求次数。
+    """
+
+    def __init__(self, last_page, newer, page_size, total, pages, requests):
+        self.last_page = last_page
+        self.newer = newer
+        self.page_size = page_size
+        self.total = total
+        self.pages = pages
+        self.requests = requests
+
+    def __repr__(self):
+        return (
+            f"ReportBoundary(last_page={self.last_page}, newer={self.newer}, "
+            f"total={self.total}, requests={self.requests})"
+        )
+
+
+class _PageReader:
+    """按页码读取并缓存压缩后的页；fetch(page_num) 返回接口 JSON，失败返回 None。"""
+
+    def __init__(self, fetch, first=None):
+        self.fetch = fetch
+        self.pages = {}
+        self.requests = 0
+        self.page_size = None
+        self.total = None
+        if first is not None:
+            self._add(first, 1)
+
+    def _add(self, data, page_num):
+        payload = data.get("data") or {}
+        entries = compact(payload.get("items") or [])
+        if self.page_size is None:
+            self.page_size = _int(payload.get("pageSize")) or max(len(entries), 1)
+            self.total = _int(payload.get("total")) or 0
+        self.pages[page_num] = entries
+        return entries
+
+    def get(self, page_num):
+        if page_num not in self.pages:
+            self.requests += 1
+            data = self.fetch(page_num)
+            if not data:
+                return None
+            self._add(data, page_num)
+        return self.pages[page_num]
+
+    @property
+    def page_count(self):
+        return max(-(-self.total // self.page_size), 1)
+
+
+def _is_boundary(entries, start_ms):
+    """该页最后一条不晚于 start_ms（或为空页）：边界在此页或之前。"""
+    if not entries:
+        return True
+    last = entries[-1].pay_date
+    return last is None or last <= start_ms
+
+
+def _result(reader, last_page, start_ms):
+    entries = reader.pages.get(last_page) or ()
+    on_page = sum(1 for entry in entries if entry.pay_date is not None and entry.pay_date > start_ms)
+    newer = (last_page - 1) * reader.page_size + on_page
+    return ReportBoundary(
+        last_page, newer, reader.page_size, reader.total, reader.pages, reader.requests
+    )
+
+
+def find_boundary(fetch, start_ms, first=None):
+    """二分查找边界页，返回 ReportBoundary；请求失败返回 None。first 为已取得的第一页数据。"""
+    reader = _PageReader(fetch, first)
+    if reader.get(1) is None:
+        return None
+    if _is_boundary(reader.pages[1], start_ms):
+        return _result(reader, 1, start_ms)
+    lo, hi = 2, reader.page_count
+    if hi < lo:
+        return _result(reader, 1, start_ms)
+    # 不变式：lo - 1 页不是边界；hi 页是边界，或已是最后一页
+    while lo < hi:
+        mid = (lo + hi) // 2
+        entries = reader.get(mid)
+        if entries is None:
+            return None
+        if _is_boundary(entries, start_ms):
+            hi = mid
+        else:
+            lo = mid + 1
+    if reader.get(lo) is None:
+        return None
+    return _result(reader, lo, start_ms)
+
+
+def newer_entries(fetch, start_ms, first=None, fetch_many=None, batch=4):
+    """
+    start_ms 之后的全部报告。第 1 页到边界页每一页都要读，二分查找只会多出 O(log 页数) 次请求，
+    因此这里从第 1 页顺序向后读到边界页为止；给出 fetch_many(页码列表) -> {页码: 数据} 时
+    每轮并发读 batch 页，最多多读 batch - 1 页。
+    返回 (ReportBoundary, [ReportEntry, ...])，请求失败返回 None。
+    """
+    reader = _PageReader(fetch, first)
+    if reader.get(1) is None:
+        return None
+    page_num = 1
+    while not _is_boundary(reader.pages[page_num], start_ms) and page_num < reader.page_count:
+        page_num += 1
+        if page_num in reader.pages:
+            continue
+        wanted = list(range(page_num, min(page_num + batch, reader.page_count + 1)))
+        if fetch_many is None or len(wanted) == 1:
+            if reader.get(page_num) is None:
+                return None
+            continue
+        reader.requests += len(wanted)
+        for num, data in fetch_many(wanted).items():
+            if not data:
+                return None
+            reader._add(data, num)
+    entries = [
+        entry
+        for num in range(1, page_num + 1)
+        for entry in reader.pages[num]
+        if entry.pay_date is not None and entry.pay_date > start_ms
+    ]
+    return _result(reader, page_num, start_ms), entries
+
+
+def find_boundary_linear(fetch, start_ms, first=None, max_pages=200):
+    """原有做法：从第一页逐页向后读，直到某页最后一条不晚于 start_ms。用于对照基准。"""
+    reader = _PageReader(fetch, first)
+    for page_num in range(1, max_pages + 1):
+        entries = reader.get(page_num)
+        if entries is None:
+            return None
+        if _is_boundary(entries, start_ms) or page_num >= reader.page_count:
+            return _result(reader, page_num, start_ms)
+    return _result(reader, max_pages, start_ms)
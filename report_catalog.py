@@ -0,0 +1,265 @@
+"""
+按账号保存的报告目录（SQLite）。
+
+- 任何捕获到的 myReport/list 响应（页面监听、接口轮询）都增量写入 reports 表：
+  id、payDate、reportStatus、type、reportNameDetail、fileSize 与 fileUrl 中的文件数；
+- 每个下载完成的文件记入 files 表（路径、大小、sha256），批量下载的压缩包按所含报告记录；
+- 直连下载跳过已下载且文件仍在的报告文件（从本地复制）；download-only 不再勾选
+  全部文件都已下载的报告（fileUrl 中每个文件都在，或有包含整个报告的压缩包）。
+
+路径由 "report_catalog" 配置，默认 catalog/{account}.sqlite；设为 false 关闭。HAR 回放时不启用。
+"""
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import app_config
+import har_session
+import runlog
+from fileutil import file_sha256
+
+log = runlog.get_logger("catalog")
+
+DEFAULT_PATH = os.path.join("catalog", "{account}.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id TEXT PRIMARY KEY,
+    pay_date INTEGER,
+    status INTEGER,
+    type INTEGER,
+    name_detail TEXT,
+    file_size INTEGER,
+    file_count INTEGER,
+    synced_at REAL
+);
+CREATE INDEX IF NOT EXISTS reports_pay_date ON reports (pay_date);
+CREATE TABLE IF NOT EXISTS files (
+    report_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    downloaded_at REAL,
+    whole INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (report_id, name)
+);
+"""
+
+_UPSERT = """
+INSERT INTO reports (id, pay_date, status, type, name_detail, file_size, file_count, synced_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    pay_date = excluded.pay_date,
+    status = excluded.status,
+    type = excluded.type,
+    name_detail = excluded.name_detail,
+    file_size = excluded.file_size,
+    file_count = excluded.file_count,
+    synced_at = excluded.synced_at
+"""
+
+# 早期版本的目录缺少的列
+_MIGRATIONS = (
+    ("reports", "file_count", "INTEGER"),
+    ("files", "whole", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _file_count(item):
+    """与 report_download.report_files 一致：fileUrl 中有 url 的条目数。"""
+    return sum(1 for f in item.get("fileUrl") or [] if f.get("url"))
+
+
+class ReportCatalog:
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # 接口轮询与下载在线程池中进行，共用一个连接并由锁串行化
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        for table, column, decl in _MIGRATIONS:
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def sync(self, data):
+        """写入一页 myReport/list 响应中的报告，返回条数。"""
+        items = ((data or {}).get("data") or {}).get("items") or []
+        now = time.time()
+        rows = [
+            (
+                item["id"],
+                _int(item.get("payDate")),
+                _int(item.get("reportStatus")),
+                _int(item.get("type")),
+                item.get("reportNameDetail"),
+                _int(item.get("fileSize")),
+                _file_count(item),
+                now,
+            )
+            for item in items
+            if item.get("id")
+        ]
+        if rows:
+            with self._lock, self._conn:
+                self._conn.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def report(self, report_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, pay_date, status, type, name_detail, file_size "
+                "FROM reports WHERE id = ?",
+                (report_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "pay_date", "status", "type", "name_detail", "file_size"), row))
+
+    def file(self, report_id, name):
+        """已记录的下载文件 {path, size, sha256}；未记录或文件已不存在时返回 None。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, size, sha256 FROM files WHERE report_id = ? AND name = ?",
+                (report_id, name),
+            ).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            return None
+        return {"path": row[0], "size": row[1], "sha256": row[2]}
+
+    def downloaded_ids(self):
+        """
+        全部文件都已下载且仍在的报告 ID：有包含整个报告的压缩包，
+        或 fileUrl 中的每个文件都有记录。不知道文件数（未同步过列表）的报告不算。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT f.report_id, f.name, f.path, f.whole, r.file_count "
+                "FROM files f LEFT JOIN reports r ON r.id = f.report_id"
+            ).fetchall()
+        names, complete = {}, set()
+        for report_id, name, path, whole, file_count in rows:
+            if not os.path.exists(path):
+                continue
+            names.setdefault(report_id, set()).add(name)
+            if whole or (file_count and len(names[report_id]) >= file_count):
+                complete.add(report_id)
+        return complete
+
+    def record_file(self, report_id, name, path, sha256, whole=False):
+        """
+        记录一个下载完成的文件；批量下载的压缩包对其中每个报告各记一条，
+        whole 表示该文件包含报告的全部文件。
+        """
+        path = os.path.abspath(path)
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files "
+                    "(report_id, name, path, size, sha256, downloaded_at, whole) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        report_id,
+                        name,
+                        path,
+                        os.path.getsize(path),
+                        sha256,
+                        time.time(),
+                        int(whole),
+                    ),
+                )
+        except sqlite3.Error as e:
+            log.warning(f"报告目录记录下载失败: {e}")
+
+    def location(self, report_ids):
+        """这些报告已下载到、且仍在的文件路径列表。"""
+        report_ids = list(report_ids)
+        if not report_ids:
+            return []
+        placeholders = ",".join("?" * len(report_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT path FROM files WHERE report_id IN ({placeholders}) "
+                "ORDER BY path",
+                report_ids,
+            ).fetchall()
+        return [path for (path,) in rows if os.path.exists(path)]
+
+    def reuse(self, spec, dest_dir):
+        """
+        spec 对应的文件已下载过且大小一致时，放一份到 dest_dir（优先硬链接）并返回路径，否则 None。
+        """
+        entry = self.file(spec["id"], spec["name"])
+        if entry is None or os.path.getsize(entry["path"]) != entry["size"]:
+            return None
+        target = os.path.join(dest_dir, spec["name"])
+        if os.path.abspath(target) != entry["path"] and not os.path.exists(target):
+            try:
+                os.link(entry["path"], target)
+            except OSError:
+                shutil.copy2(entry["path"], target)
+        return target
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def for_account(account=None, config=None):
+    """当前账号的 ReportCatalog；关闭或 HAR 回放时返回 None。"""
+    config = app_config.active() if config is None else config
+    template = config.get("report_catalog", DEFAULT_PATH)
+    if template is False or har_session.replaying():
+        return None
+    if account is None:
+        account = runlog.current_context().get("account") or runlog.DEFAULT_ACCOUNT
+    path = os.path.abspath((template or DEFAULT_PATH).format(account=account))
+    with _catalogs_lock:
+        catalog = _catalogs.get(path)
+        if catalog is None:
+            try:
+                catalog = _catalogs[path] = ReportCatalog(path)
+            except sqlite3.Error as e:
+                log.warning(f"报告目录 {path} 无法打开: {e}")
+                return None
+        return catalog
+
+
+def sync(data):
+    """把一页列表响应写入当前账号的目录；出错只记日志，不影响主流程。"""
+    catalog = for_account()
+    if catalog is None:
+        return 0
+    try:
+        return catalog.sync(data)
+    except sqlite3.Error as e:
+        log.warning(f"报告目录写入失败: {e}")
+        return 0
+
+
+def record_archive(report_ids, path):
+    """浏览器批量下载的压缩包：对其中每个报告记一条。"""
+    catalog = for_account()
+    if catalog is None or not report_ids:
+        return
+    sha256 = file_sha256(path)
+    name = os.path.basename(path)
+    for report_id in report_ids:
+        catalog.record_file(report_id, name, path, sha256, whole=True)
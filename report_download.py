@@ -0,0 +1,235 @@
+"""
+报告文件直连下载：不经浏览器“批量下载”，直接按 myReport/list 中的 fileUrl 拉取。
+
+- 共用一个带连接池的 requests.Session，cookie 取自账号的浏览器 context；
+- 多个文件并发下载；
+- 先写入 .part 临时文件，中断后用 Range 续传，校验大小后原子重命名到目标目录；
+- 下载完成的文件连同 sha256 记入报告目录，报告目录中已有的文件直接复用，不再请求。
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import rate_limit
+import report_catalog
+import runlog
+from fileutil import file_sha256
+
+log = runlog.get_logger("download")
+
+CHUNK_SIZE = 1024 * 1024
+_SIZE_EXPONENTS = {"B": 0, "KB": 1, "MB": 2, "GB": 3}
+_INVALID_CHARS = re.compile(r'[\\/:*?"<>|]')
+
+
+class DownloadError(Exception):
+    pass
+
+
+def make_session(cookies, pool_size=8):
+    """
+    cookies 为 Playwright context.cookies() 的返回值（字典列表）。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    for cookie in cookies or []:
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain", ""),
+            path=cookie.get("path", "/"),
+        )
+    return session
+
+
+def parse_size_detail(text):
+    """
+    "3.72MB" -> [(字节数, 允许误差), ...]。fileSizeDetail 只保留两位小数，
+    且不确定按 1024 还是 1000 进位，两种解释都作为候选，只能近似校验。
+    """
+    match = re.match(r"^\s*([\d.]+)\s*([KMG]?B)\s*$", text or "", re.I)
+    if not match:
+        return None
+    number, unit = match.groups()
+    exponent = _SIZE_EXPONENTS[unit.upper()]
+    decimals = len(number.split(".")[1]) if "." in number else 0
+    candidates = []
+    for base in (1024, 1000):
+        scale = base ** exponent
+        candidates.append((int(float(number) * scale), int(scale * (10 ** -decimals)) + 1))
+    return candidates
+
+
+def report_files(item):
+    """
+    把 myReport/list 的一条报告展开为待下载文件：[{id, url, name, size, size_approx}]。
+    """
+    files = []
+    urls = [f.get("url") for f in (item.get("fileUrl") or []) if f.get("url")]
+    for idx, url in enumerate(urls):
+        name = unquote(os.path.basename(urlsplit(url).path)) or item.get("reportNameDetail")
+        if not name:
+            name = f"{item.get('id')}_{idx}.zip"
+        size = item.get("fileSize")
+        approx = parse_size_detail(item.get("fileSizeDetail"))
+        files.append(
+            {
+                "id": item.get("id"),
+                "url": url,
+                "name": _INVALID_CHARS.sub("_", name),
+                "size": int(size) if str(size or "").isdigit() else None,
+                "size_approx": approx,
+            }
+        )
+    return files
+
+
+def _total_from_response(resp, offset):
+    content_range = resp.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit():
+        return int(length) + (offset if resp.status_code == 206 else 0)
+    return None
+
+
+def _check_size(spec, actual, total):
+    if total is not None and actual != total:
+        raise DownloadError(f"{spec['name']} 大小不符: {actual} != {total}")
+    if spec["size"] is not None and actual != spec["size"]:
+        raise DownloadError(f"{spec['name']} 大小不符: {actual} != {spec['size']}")
+    if spec["size_approx"] and not any(
+        abs(actual - expected) <= tolerance for expected, tolerance in spec["size_approx"]
+    ):
+        raise DownloadError(
+            f"{spec['name']} 大小与列表中的 {spec['size_approx']} 不符: {actual}"
+        )
+
+
+def download_file(session, spec, dest_dir, attempts=3, timeout=(10, 120)):
+    """
+    下载单个文件，支持断点续传；返回最终路径。
+    """
+    final_path = os.path.join(dest_dir, spec["name"])
+    part_path = final_path + ".part"
+    if os.path.exists(final_path):
+        try:
+            _check_size(spec, os.path.getsize(final_path), None)
+            log.info(f"已存在，跳过: {final_path}")
+            return final_path
+        except DownloadError:
+            pass
+
+    last_error = None
+    for attempt in range(1, attempts + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        rate_limit.acquire(rate_limit.DOWNLOAD, spec["url"])
+        try:
+            with session.get(
+                spec["url"], headers=headers, stream=True, timeout=timeout
+            ) as resp:
+                rate_limit.check(rate_limit.DOWNLOAD, resp.status_code, spec["url"])
+                if resp.status_code == 416 and offset:
+                    # 临时文件已经完整
+                    total = _total_from_response(resp, offset)
+                    _check_size(spec, offset, total)
+                    os.replace(part_path, final_path)
+                    return final_path
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    offset = 0  # 服务器不支持续传，从头写
+                total = _total_from_response(resp, offset)
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+            _check_size(spec, os.path.getsize(part_path), total)
+            os.replace(part_path, final_path)
+            log.info(f"文件已下载: {final_path}")
+            return final_path
+        except DownloadError as e:
+            # 大小不符说明临时文件不可信，删除后重下
+            last_error = e
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+        except requests.RequestException as e:
+            last_error = e
+        log.warning(f"{spec['name']} 第 {attempt} 次下载失败: {last_error}")
+    raise DownloadError(f"{spec['name']} 下载失败: {last_error}")
+
+
+def download_reports(items, cookies, dest_dir, workers=4, on_file=None):
+    """
+    并发下载已生成报告的全部文件，返回 {report_id: [路径, ...]}；任一文件失败则抛 DownloadError。
+    on_file(spec, path) 在每个文件下载完成时于下载线程中调用，spec 含 report_name。
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    specs, names = [], set()
+    for item in items:
+        for spec in report_files(item):
+            spec["report_name"] = item.get("reportName") or item.get("name") or ""
+            # 同名文件并发写同一个 .part 会互相破坏，重名时加上报告 ID
+            if spec["name"] in names:
+                spec["name"] = f"{spec['id']}_{spec['name']}"
+            names.add(spec["name"])
+            specs.append(spec)
+    if not specs:
+        raise DownloadError("没有可下载的文件（fileUrl 为空）。")
+
+    catalog = report_catalog.for_account()
+    results, errors, lock = {}, [], threading.Lock()
+    if catalog is not None:
+        pending = []
+        for spec in specs:
+            path = catalog.reuse(spec, dest_dir)
+            if path is None:
+                pending.append(spec)
+                continue
+            results.setdefault(spec["id"], []).append(path)
+            if on_file is not None:
+                on_file(spec, path)
+        if len(pending) < len(specs):
+            log.info(f"报告目录中已有 {len(specs) - len(pending)} 个文件，直接复用。")
+        specs = pending
+        if not specs:
+            return results
+    log.info(f"开始直连下载 {len(specs)} 个文件，并发 {workers}。")
+
+    session = make_session(cookies, pool_size=max(workers, 1))
+    context = runlog.current_context()
+
+    def _task(spec):
+        with runlog.bind(**context):
+            try:
+                path = download_file(session, spec, dest_dir)
+                if catalog is not None:
+                    catalog.record_file(spec["id"], spec["name"], path, file_sha256(path))
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                return
+            with lock:
+                results.setdefault(spec["id"], []).append(path)
+            if on_file is not None:
+                on_file(spec, path)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            list(pool.map(_task, specs))
+    finally:
+        session.close()
+    if errors:
+        raise DownloadError(f"{len(errors)} 个文件下载失败: {errors[0]}")
+    return results
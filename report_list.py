@@ -0,0 +1,510 @@
+"""
+myReport/list 接口的直接调用与本次导出报告的识别。
+
+报告页自身发出的 myReport/list 请求（URL、方法、请求头、请求体）被记录为模板，
+之后只改写页码即可经浏览器 context 的 APIRequestContext 直接调用，cookie 自动携带，
+不需要操作报告页 UI。
+"""
+import json
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import dimensions
+import har_session
+import rate_limit
+import report_catalog
+import runlog
+
+log = runlog.get_logger("reports")
+
+REPORT_URL = "https://www.tianyancha.com/usercenter/report"
+REPORT_LIST_TARGET = "myReport/list"
+
+# 报告 ID 形如 W83010948091767956721541
+_REPORT_ID_RE = re.compile(r"^[A-Z]\d{10,}$")
+
+# reportStatus：2 为文档生成成功，0 / 1 为排队或生成中，其他值视为生成失败
+READY_STATUS = 2
+PENDING_STATUSES = (0, 1)
+
+# 按 ID 查找报告时最多读取的页数
+MAX_PAGES = 50
+
+_SKIP_HEADERS = {"content-length", "cookie", "host", "connection", "accept-encoding"}
+
+# 在页面内发起请求，使其经过 context 的路由（HAR 录制 / 回放）
+_PAGE_FETCH_JS = """async ([url, method, headers, body]) => {
+    const resp = await fetch(url, {method, headers, body, credentials: "include"});
+    return {status: resp.status, text: await resp.text()};
+}"""
+
+
+def report_ids_from_response(data):
+    """
+    从 exportAndFields / export/dim 的响应中尽量提取新建报告的 ID；
+    接口只返回 "success" 时返回空列表。
+    """
+    payload = (data or {}).get("data")
+    candidates = payload if isinstance(payload, list) else [payload]
+    ids = []
+    for value in candidates:
+        if isinstance(value, dict):
+            value = value.get("id") or value.get("reportId")
+        if isinstance(value, str) and _REPORT_ID_RE.match(value):
+            ids.append(value)
+    return ids
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _synced(data):
+    """主动请求到的列表页同样写入报告目录。"""
+    if isinstance(data, dict):
+        report_catalog.sync(data)
+    return data
+
+
+class ReportListBuffer:
+    """
+    myReport/list 响应缓冲。
+
+    - 事件回调里只做 offer()：按响应对象去重后放入有界队列，不解析、不阻塞；
+    - 消费方 pop() 时才解析 JSON，并按 pageNum 建索引；
+    - 各队列都有上限，长时间等待时内存保持平稳，取出为摊还 O(1)。
+    """
+
+    def __init__(self, capacity=32, per_page=4):
+        self.capacity = capacity
+        self.per_page = per_page
+        self._raw = deque(maxlen=capacity)
+        self._recent = deque(maxlen=capacity)
+        self._recent_ids = set()
+        self._all = deque(maxlen=capacity)
+        self._pages = {}
+
+    def offer(self, resp):
+        """记录一个响应；同一响应对象（页面与 context 各触发一次）只记录一次。"""
+        key = id(resp)
+        if key in self._recent_ids:
+            return False
+        if len(self._recent) == self._recent.maxlen:
+            self._recent_ids.discard(id(self._recent[0]))
+        # 保留对象引用，窗口内 id 不会被复用
+        self._recent.append(resp)
+        self._recent_ids.add(key)
+        self._raw.append(resp)
+        return True
+
+    def add(self, data):
+        """直接加入已解析的数据。"""
+        entry = [data, False]
+        self._all.append(entry)
+        page_num = (data.get("data") or {}).get("pageNum")
+        queue = self._pages.get(page_num)
+        if queue is None:
+            queue = self._pages[page_num] = deque(maxlen=self.per_page)
+        queue.append(entry)
+
+    def _ingest(self):
+        while self._raw:
+            resp = self._raw.popleft()
+            try:
+                data = json.loads(resp.text())
+            except Exception:
+                continue
+            if isinstance(data, dict):
+                report_catalog.sync(data)
+                self.add(data)
+
+    def pop(self, page_num=None):
+        """取出最早的一条（可指定 pageNum），没有则返回 None。"""
+        self._ingest()
+        queue = self._all if page_num is None else self._pages.get(page_num)
+        while queue:
+            entry = queue.popleft()
+            if not entry[1]:
+                entry[1] = True
+                return entry[0]
+        if page_num is not None and queue is not None:
+            del self._pages[page_num]
+        return None
+
+    def clear(self):
+        self._raw.clear()
+        self._all.clear()
+        self._pages.clear()
+
+    def __len__(self):
+        return len(self._raw) + sum(1 for entry in self._all if not entry[1])
+
+
+class ReportListClient:
+    """
+    复用报告页发出的 myReport/list 请求，改写 pageNum / pageSize 后直接调用接口。
+    设置 page 后改在该页面内 fetch，请求会经过 HAR 路由。
+    """
+
+    def __init__(self, request_context, page=None):
+        self.request_context = request_context
+        self.page = page
+        self.template = None
+
+    @property
+    def ready(self):
+        return self.template is not None
+
+    def learn(self, request):
+        """从 Playwright Request 记录请求模板。"""
+        try:
+            headers = request.all_headers()
+        except Exception:
+            headers = request.headers
+        self.template = {
+            "url": request.url,
+            "method": request.method,
+            "headers": {
+                k: v
+                for k, v in headers.items()
+                if not k.startswith(":") and k.lower() not in _SKIP_HEADERS
+            },
+            "post_data": request.post_data,
+        }
+
+    def build(self, page_num, page_size=None):
+        """返回 (url, body)：页码写入 JSON 请求体或查询参数。"""
+        url = self.template["url"]
+        body = self.template["post_data"]
+        updates = {"pageNum": page_num}
+        if page_size:
+            updates["pageSize"] = page_size
+        if body:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                payload = None
+            if isinstance(payload, dict):
+                payload.update(updates)
+                return url, json.dumps(payload)
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        query.update({k: str(v) for k, v in updates.items()})
+        return urlunsplit(parts._replace(query=urlencode(query))), body
+
+    def fetch(self, page_num, page_size=None):
+        """请求第 page_num 页，失败返回 None。"""
+        if not self.ready:
+            return None
+        url, body = self.build(page_num, page_size)
+        if self.page is not None:
+            return self._fetch_in_page(page_num, url, body)
+        # APIRequestContext 不经过 context.route，在这里限流
+        rate_limit.acquire(rate_limit.API, url)
+        try:
+            resp = self.request_context.fetch(
+                url,
+                method=self.template["method"],
+                headers=self.template["headers"],
+                data=body,
+            )
+            if not resp.ok:
+                rate_limit.check(rate_limit.API, resp.status, url)
+                log.warning(f"myReport/list 第 {page_num} 页请求失败: HTTP {resp.status}")
+                return None
+            return _synced(resp.json())
+        except Exception as e:
+            log.warning(f"myReport/list 第 {page_num} 页请求异常: {e}")
+            return None
+
+    def _fetch_in_page(self, page_num, url, body):
+        try:
+            result = self.page.evaluate(
+                _PAGE_FETCH_JS,
+                [url, self.template["method"], self.template["headers"], body],
+            )
+            if not 200 <= result["status"] < 300:
+                log.warning(f"myReport/list 第 {page_num} 页请求失败: HTTP {result['status']}")
+                return None
+            return _synced(json.loads(result["text"]))
+        except Exception as e:
+            log.warning(f"myReport/list 第 {page_num} 页请求异常: {e}")
+            return None
+
+    def fetch_with(self, session, page_num, page_size=None, timeout=30):
+        """与 fetch 相同，但经 requests.Session 请求，可在线程中并发调用。"""
+        if not self.ready:
+            return None
+        url, body = self.build(page_num, page_size)
+        rate_limit.acquire(rate_limit.API, url)
+        try:
+            resp = session.request(
+                self.template["method"],
+                url,
+                headers=self.template["headers"],
+                data=body,
+                timeout=timeout,
+            )
+            if not resp.ok:
+                rate_limit.check(rate_limit.API, resp.status_code, url)
+                log.warning(f"myReport/list 第 {page_num} 页请求失败: HTTP {resp.status_code}")
+                return None
+            return _synced(resp.json())
+        except Exception as e:
+            log.warning(f"myReport/list 第 {page_num} 页请求异常: {e}")
+            return None
+
+
+class ReportWaitError(Exception):
+    """跟踪的报告生成失败，或超出读取页数仍未找到；found 为已读到的 {id: item}。"""
+
+    def __init__(self, message, found=None):
+        super().__init__(message)
+        self.found = found or {}
+
+
+def report_state(item):
+    """报告条目的状态："ready"（reportStatus 2）、"pending"（未出现或 0 / 1）或 "failed"。"""
+    status = _int((item or {}).get("reportStatus"))
+    if status == READY_STATUS:
+        return "ready"
+    if status is None or status in PENDING_STATUSES:
+        return "pending"
+    return "failed"
+
+
+class ReportPageWatcher:
+    """
+    经接口轮询报告列表，按 ID 等待跟踪的报告全部生成。
+    只请求接口，不翻动报告页 UI；每轮用 fetch_many 并发读取 workers 页。
+    """
+
+    def __init__(self, client, session, workers=4):
+        self.client = client
+        self.session = session
+        self.workers = max(workers, 1)
+
+    def fetch(self, page_num):
+        return self.client.fetch_with(self.session, page_num)
+
+    def fetch_many(self, page_nums):
+        """并发请求多页，返回 {页码: 数据}，失败的页值为 None。"""
+        page_nums = list(page_nums)
+        context = runlog.current_context()
+
+        def _task(page_num):
+            with runlog.bind(**context):
+                return self.fetch(page_num)
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(page_nums) or 1)) as pool:
+            return dict(zip(page_nums, pool.map(_task, page_nums)))
+
+    def find_items(self, report_ids, max_pages=MAX_PAGES):
+        """
+        从第一页起每轮并发读取 workers 页，直到找齐 report_ids 或读完列表，返回 {id: item}；
+        请求失败返回 None。读满 max_pages 页后列表仍未读完且没找齐时抛 ReportWaitError。
+        """
+        wanted = set(report_ids)
+        found = {}
+        page_num, last_page = 1, max_pages
+        while True:
+            batch = list(range(page_num, min(page_num + self.workers, last_page + 1)))
+            if not batch:
+                missing = sorted(wanted - set(found))
+                raise ReportWaitError(
+                    f"前 {max_pages} 页中没有找到报告 {missing}，已被挤出读取范围。", found
+                )
+            pages = self.fetch_many(batch)
+            for num in batch:
+                data = pages.get(num)
+                if not data:
+                    return None
+                payload = data.get("data") or {}
+                items = payload.get("items") or []
+                for item in items:
+                    if item.get("id") in wanted:
+                        found[item["id"]] = item
+                if len(found) == len(wanted):
+                    return found
+                page_size = payload.get("pageSize") or len(items) or 1
+                total = payload.get("total") or 0
+                if not items or num * page_size >= total:
+                    return found
+                last_page = min(max_pages, -(-total // page_size))
+            page_num = batch[-1] + 1
+
+    def wait_for_ids(self, report_ids, timeout_sec=7200, interval=10, sleep=time.sleep):
+        """
+        按 ID 等待报告全部生成，返回 {id: item}（含 fileUrl）；超时返回 None。
+        同一账号后续导出会把这些报告挤到后面的页，所以每轮都按 ID 重新查找而不是盯住页码。
+        有报告生成失败或被挤出读取范围时抛 ReportWaitError，不再等到超时。
+        """
+        deadline = time.time() + timeout_sec
+        while True:
+            found = self.find_items(report_ids)
+            if found is not None:
+                states = {report_id: report_state(found.get(report_id)) for report_id in report_ids}
+                failed = [report_id for report_id, state in states.items() if state == "failed"]
+                if failed:
+                    raise ReportWaitError(f"报告 {failed} 生成失败。", found)
+                unready = [report_id for report_id, state in states.items() if state != "ready"]
+                if not unready:
+                    log.info(f"{len(report_ids)} 个报告已全部生成。")
+                    return found
+                log.info(f"还剩{len(unready)}个文档未生成完毕，接口轮询中，请稍后")
+            if time.time() >= deadline:
+                log.warning(f"等待报告 {report_ids} 生成超时。")
+                return None
+            sleep(interval)
+
+
+class ReportTracker:
+    """
+    在导出前记下报告列表第一页的 ID，导出后从第一页向后读取，
+    位于这些旧报告之前的就是本次导出新建的报告（列表按 payDate 倒序）。
+    """
+
+    def __init__(self, context, fetch_page=None):
+        self.context = context
+        self.client = ReportListClient(context.request, page=fetch_page)
+        self.baseline_ids = set()
+        self.baseline_ok = False
+
+    def snapshot(self, timeout_ms=30000):
+        """后台打开报告页，记录请求模板与当前第一页的报告 ID。"""
+        page = self.context.new_page()
+        try:
+            with page.expect_response(
+                lambda r: REPORT_LIST_TARGET in r.url, timeout=timeout_ms
+            ) as resp_info:
+                rate_limit.goto(page, REPORT_URL, wait_until="domcontentloaded")
+            resp = resp_info.value
+            self.client.learn(resp.request)
+            items = (resp.json().get("data") or {}).get("items") or []
+            self.baseline_ids = {item.get("id") for item in items if item.get("id")}
+            self.baseline_ok = True
+            log.info(f"导出前报告列表快照：第一页 {len(self.baseline_ids)} 个报告。")
+        except Exception as e:
+            log.warning(f"报告列表快照失败，将退回按时间勾选: {e}")
+        finally:
+            try:
+                page.close()
+            except Exception:
+                pass
+        return self.baseline_ok
+
+    @staticmethod
+    def _dimension_of(item):
+        return dimensions.from_name(item.get("reportName") or item.get("reportNameDetail"))
+
+    def _belongs(self, item, taken, per_dimension, window):
+        """
+        新报告是否可能属于本次导出：payDate 落在提交时间窗内，且其维度还有未认领的确认批次。
+        共用账号时，其他 worker 同时导出的报告由此排除。
+        """
+        if window:
+            pay_date = _int(item.get("payDate"))
+            if pay_date is None or not window[0] <= pay_date <= window[1]:
+                return False
+        if per_dimension:
+            key = self._dimension_of(item)
+            if taken.get(key, 0) >= per_dimension.get(key, 0):
+                return False
+            taken[key] = taken.get(key, 0) + 1
+        return True
+
+    def _scan_new_ids(self, expected, known_ids, max_pages, per_dimension=None, window=None):
+        known = set(known_ids)
+        found = list(dict.fromkeys(known_ids))
+        taken = {}
+        skipped = 0
+        for page_num in range(1, max_pages + 1):
+            data = self.client.fetch(page_num)
+            if not data:
+                return found, False, skipped
+            payload = data.get("data") or {}
+            items = payload.get("items") or []
+            for item in items:
+                report_id = item.get("id")
+                if report_id in self.baseline_ids:
+                    break
+                if report_id in known:
+                    # 确认响应带回的报告占用其维度的名额
+                    key = self._dimension_of(item)
+                    taken[key] = taken.get(key, 0) + 1
+                    continue
+                if not report_id or report_id in found:
+                    continue
+                if not self._belongs(item, taken, per_dimension, window):
+                    skipped += 1
+                    continue
+                found.append(report_id)
+                if expected and len(found) >= expected:
+                    break
+            else:
+                page_size = payload.get("pageSize") or len(items) or 1
+                if items and page_num * page_size < (payload.get("total") or 0):
+                    continue
+            break
+        if skipped:
+            log.info(f"跳过 {skipped} 个不属于本次导出的新报告（维度或时间不符）。")
+        return found, True, skipped
+
+    def new_report_ids(
+        self, expected=None, known_ids=(), max_pages=20, attempts=3, per_dimension=None, window=None
+    ):
+        """
+        返回本次新建的报告 ID（列表顺序）；expected 为已确认的导出批次数。
+        per_dimension（{维度: 批次数}）与 window（payDate 毫秒范围）用于排除同一账号上
+        其他 worker 新建的报告；确认响应中带回的 known_ids 总是计入。
+        新报告可能稍晚才出现在列表中，数量不足时短暂等待后重读。
+        """
+        if not self.baseline_ok:
+            return None
+        if expected and len(set(known_ids)) >= expected:
+            return list(dict.fromkeys(known_ids))
+        found, skipped = [], 0
+        for attempt in range(attempts):
+            found, ok, skipped = self._scan_new_ids(
+                expected, known_ids, max_pages, per_dimension, window
+            )
+            if not ok:
+                return None
+            if not expected or len(found) >= expected:
+                break
+            log.info(f"已识别 {len(found)}/{expected} 个新报告，稍后重读列表...")
+            har_session.sleep(2)
+        if expected and len(found) < expected and skipped:
+            # 有新报告被排除而数量仍不足：无法可靠区分本次报告，交给调用方按时间勾选
+            log.warning(
+                f"只认领到 {len(found)}/{expected} 个报告，另有 {skipped} 个新报告维度或时间不符。"
+            )
+            return None
+        log.info(f"本次导出新建报告 {len(found)} 个。")
+        return found
+
+    def items_for(self, report_ids, max_pages=20):
+        """按 ID 读取报告条目（含 fileUrl 等），返回 {id: item}，读不到的 ID 不在结果中。"""
+        wanted = set(report_ids)
+        found = {}
+        for page_num in range(1, max_pages + 1):
+            data = self.client.fetch(page_num)
+            if not data:
+                break
+            payload = data.get("data") or {}
+            items = payload.get("items") or []
+            for item in items:
+                if item.get("id") in wanted:
+                    found[item["id"]] = item
+            if len(found) == len(wanted):
+                break
+            page_size = payload.get("pageSize") or len(items) or 1
+            if not items or page_num * page_size >= (payload.get("total") or 0):
+                break
+        return found
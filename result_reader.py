@@ -0,0 +1,164 @@
+"""
+逐行读取导出结果，不把整个工作簿读入内存。
+
+- iter_records(path) 读取单个 .zip / .xlsx / .csv，zip 内的各个表格依次读取；
+- iter_directory(dest_dir) 读取一次运行下载目录中的全部报告文件；
+- stream_reports(items, cookies, dest_dir) 边直连下载边读取：哪个文件先下载完就先产出它的行。
+
+每行为 CompanyRecord(dimension, source, row, values)，values 为 {表头: 值}。
+xlsx 用 openpyxl 的 read_only 模式按行流式读取，单元格保留其类型（数字、日期）；
+空串与 "-" 记为 None。
+"""
+import csv
+import io
+import os
+import queue
+import threading
+import zipfile
+from collections import namedtuple
+
+import dimensions
+import runlog
+
+try:
+    import openpyxl
+except ImportError:  # 只读 csv 时不需要
+    openpyxl = None
+
+log = runlog.get_logger("results")
+
+CompanyRecord = namedtuple("CompanyRecord", ("dimension", "source", "row", "values"))
+
+TABLE_SUFFIXES = (".xlsx", ".csv")
+_EMPTY = ("", "-", "--")
+
+
+def dimension_for(name, default="basic", config=None):
+    """按报告名 / 文件名中的维度按钮文字识别维度，识别不到时返回 default。"""
+    return dimensions.from_name(name, default, config)
+
+
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return None if value in _EMPTY else value
+    return value
+
+
+def _header(cells):
+    """表头：首个至少有两个非空文字单元格的行（跳过标题行）。重名列加序号。"""
+    names = [_clean(cell) for cell in cells]
+    if sum(1 for name in names if isinstance(name, str)) < 2:
+        return None
+    header, seen = [], {}
+    for idx, name in enumerate(names):
+        name = str(name) if name is not None else f"column_{idx + 1}"
+        seen[name] = seen.get(name, 0) + 1
+        header.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    return header
+
+
+def _records(rows, dimension, source):
+    header = None
+    for row_num, cells in enumerate(rows, start=1):
+        if header is None:
+            header = _header(cells)
+            continue
+        values = [_clean(cell) for cell in cells]
+        if all(value is None for value in values):
+            continue
+        yield CompanyRecord(dimension, source, row_num, dict(zip(header, values)))
+
+
+def _xlsx_sheets(stream):
+    """逐个工作表产出 (表名, 行迭代器)。"""
+    if openpyxl is None:
+        raise ImportError("读取 xlsx 需要安装 openpyxl")
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield sheet.title, sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _csv_rows(stream):
+    yield from csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+
+
+def _table_records(stream, name, dimension, source):
+    if not name.lower().endswith(".xlsx"):
+        yield from _records(_csv_rows(stream), dimension, source)
+        return
+    # 每个工作表各有表头
+    for title, rows in _xlsx_sheets(stream):
+        yield from _records(rows, dimension, f"{source}#{title}")
+
+
+def iter_records(path, dimension=None):
+    """逐行读取一个报告文件；dimension 为 None 时按文件名识别。"""
+    name = os.path.basename(path)
+    if path.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(TABLE_SUFFIXES):
+                    continue
+                member_dim = (
+                    dimension or dimension_for(member.filename, None) or dimension_for(name)
+                )
+                with archive.open(member) as stream:
+                    yield from _table_records(
+                        stream, member.filename, member_dim, f"{name}/{member.filename}"
+                    )
+    elif path.lower().endswith(TABLE_SUFFIXES):
+        with open(path, "rb") as stream:
+            yield from _table_records(stream, name, dimension or dimension_for(name), name)
+    else:
+        log.warning(f"跳过无法识别的结果文件: {path}")
+
+
+def iter_directory(dest_dir):
+    """读取下载目录中的全部报告文件（按文件名顺序）。"""
+    for entry in sorted(os.scandir(dest_dir), key=lambda e: e.name):
+        if entry.is_file() and entry.name.lower().endswith((".zip",) + TABLE_SUFFIXES):
+            yield from iter_records(entry.path)
+
+
+_DONE = object()
+
+
+def stream_reports(items, cookies, dest_dir, workers=4):
+    """
+    后台并发直连下载 items（myReport/list 中已生成的报告），每个文件下载完成后立即逐行产出。
+    下载失败时在已下载文件读完后抛出 DownloadError。
+    """
+    from report_download import download_reports
+
+    ready = queue.Queue()
+    failure = []
+    context = runlog.current_context()
+
+    def _on_file(spec, path):
+        ready.put((spec, path))
+
+    def _download():
+        with runlog.bind(**context):
+            try:
+                download_reports(items, cookies, dest_dir, workers=workers, on_file=_on_file)
+            except Exception as e:
+                failure.append(e)
+            finally:
+                ready.put(_DONE)
+
+    thread = threading.Thread(target=_download, name="result-download", daemon=True)
+    thread.start()
+    while True:
+        entry = ready.get()
+        if entry is _DONE:
+            break
+        spec, path = entry
+        dimension = dimension_for(spec.get("report_name")) if spec.get("report_name") else None
+        yield from iter_records(path, dimension)
+    thread.join()
+    if failure:
+        raise failure[0]
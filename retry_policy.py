@@ -0,0 +1,279 @@
+"""
+按失败类型分类的重试策略与按账号的熔断器。
+
+- 每类失败有独立的重试次数与退避时间；
+- 登录失效、会员过期、导出次数不够（quota warn）不重试，并计入账号熔断器；
+- 同一账号连续出现这类失败达到阈值后熔断，冷却期内的新任务立即失败，不再空耗超时；
+  冷却结束后只放行一个试探任务，其余任务在试探结束前仍立即失败；
+- run 可以嵌套（任务中的某一步自己重试），熔断器只由最外层的 run 记账。
+
+web_config.json 中可用 "retry_policies" 覆盖各类的 attempts / base_delay / max_delay，
+"breaker_threshold"、"breaker_cooldown" 调整熔断阈值与冷却秒数；这些设置在每次 run 时
+从当前作用域的配置（app_config.active()）读取，同一进程中的多个实例互不影响。
+"""
+import contextvars
+import errno
+import random
+import socket
+import ssl
+import threading
+import time
+
+import app_config
+import runlog
+
+log = runlog.get_logger("retry")
+
+AUTH_EXPIRED = "auth_expired"
+MEMBERSHIP_EXPIRED = "membership_expired"
+QUOTA_WARN = "quota_warn"
+SELECTOR_TIMEOUT = "selector_timeout"
+NETWORK = "network"
+SERVER_ERROR = "server_error"
+UNKNOWN = "unknown"
+CIRCUIT_OPEN = "circuit_open"
+
+# attempts 为总尝试次数（含首次）；trips 表示计入账号熔断器
+DEFAULT_POLICIES = {
+    AUTH_EXPIRED: {"attempts": 1, "base_delay": 0, "max_delay": 0, "trips": True},
+    MEMBERSHIP_EXPIRED: {"attempts": 1, "base_delay": 0, "max_delay": 0, "trips": True},
+    QUOTA_WARN: {"attempts": 1, "base_delay": 0, "max_delay": 0, "trips": True},
+    SELECTOR_TIMEOUT: {"attempts": 3, "base_delay": 2, "max_delay": 10, "trips": False},
+    NETWORK: {"attempts": 4, "base_delay": 3, "max_delay": 30, "trips": False},
+    SERVER_ERROR: {"attempts": 3, "base_delay": 10, "max_delay": 60, "trips": False},
+    UNKNOWN: {"attempts": 1, "base_delay": 0, "max_delay": 0, "trips": False},
+}
+
+DEFAULT_BREAKER_THRESHOLD = 2
+DEFAULT_BREAKER_COOLDOWN = 1800
+
+_NETWORK_MARKERS = ("net::ERR_", "ECONNRESET", "ECONNREFUSED", "Connection aborted")
+_SERVER_MARKERS = ("HTTP 500", "HTTP 502", "HTTP 503", "HTTP 504")
+# 只有这些 OSError 算网络失败；磁盘已满、权限不足等按 UNKNOWN 处理，不重试
+_NETWORK_OS_ERRORS = (ConnectionError, TimeoutError, socket.gaierror, socket.herror, ssl.SSLError)
+_NETWORK_ERRNOS = {
+    errno.ECONNABORTED,
+    errno.ECONNREFUSED,
+    errno.ECONNRESET,
+    errno.EHOSTUNREACH,
+    errno.ENETDOWN,
+    errno.ENETUNREACH,
+    errno.ETIMEDOUT,
+}
+
+# 当前是否已在某个 run 之内
+_in_run = contextvars.ContextVar("tyc_retry_in_run", default=False)
+
+
+class TaskFailure(Exception):
+    """带失败类型的异常，kind 为本模块中的常量之一。"""
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+class CircuitOpenError(TaskFailure):
+    def __init__(self, account, until):
+        reopen = time.strftime("%H:%M:%S", time.localtime(until))
+        super().__init__(CIRCUIT_OPEN, f"账号 {account} 已熔断，{reopen} 前不再执行任务")
+        self.account = account
+        self.until = until
+
+
+def classify(exc):
+    """把异常归入失败类型。"""
+    if isinstance(exc, TaskFailure):
+        return exc.kind
+    message = str(exc)
+    if any(marker in message for marker in _NETWORK_MARKERS):
+        return NETWORK
+    if any(marker in message for marker in _SERVER_MARKERS):
+        return SERVER_ERROR
+    # Playwright 的 TimeoutError 不继承内置 TimeoutError，按类名识别，避免在此导入 Playwright
+    if type(exc).__name__ == "TimeoutError" and not isinstance(exc, OSError):
+        return SELECTOR_TIMEOUT
+    try:
+        import requests
+    except ImportError:
+        requests = None
+    if requests is not None and isinstance(exc, requests.HTTPError):
+        status = getattr(exc.response, "status_code", 0) or 0
+        return SERVER_ERROR if status >= 500 else UNKNOWN
+    if requests is not None and isinstance(exc, requests.RequestException):
+        return NETWORK
+    if isinstance(exc, _NETWORK_OS_ERRORS):
+        return NETWORK
+    if isinstance(exc, OSError) and exc.errno in _NETWORK_ERRNOS:
+        return NETWORK
+    return UNKNOWN
+
+
+class CircuitBreaker:
+    """
+    单个账号的熔断器：连续 threshold 次计入失败后打开，cooldown 秒后半开，只放行一个试探；
+    试探成功则关闭，计入失败则重新打开，其他结果（end_probe）让下一个任务再试探。
+    """
+
+    def __init__(self, threshold=DEFAULT_BREAKER_THRESHOLD, cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.last_kind = None
+        self.probing = False
+
+    def allow(self, now=None):
+        if self.opened_at is None:
+            return True
+        now = time.time() if now is None else now
+        if now < self.opened_at + self.cooldown or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def end_probe(self):
+        self.probing = False
+
+    def record_failure(self, kind, now=None):
+        self.failures += 1
+        self.last_kind = kind
+        self.probing = False
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = time.time() if now is None else now
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.last_kind = None
+        self.probing = False
+
+    @property
+    def reopen_at(self):
+        return None if self.opened_at is None else self.opened_at + self.cooldown
+
+
+def merge_policies(overrides=None):
+    """默认策略加上 overrides（{类型: {attempts, base_delay, max_delay, trips}}）。"""
+    policies = {kind: dict(policy) for kind, policy in DEFAULT_POLICIES.items()}
+    for kind, values in (overrides or {}).items():
+        policies.setdefault(kind, dict(DEFAULT_POLICIES[UNKNOWN])).update(values)
+    return policies
+
+
+class RetryEngine:
+    """
+    熔断器按账号在进程内共享；构造时未给出的策略、阈值与冷却秒数取自当前作用域的配置。
+    """
+
+    def __init__(self, policies=None, threshold=None, cooldown=None, sleep=time.sleep):
+        self._policies = policies
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self.sleep = sleep
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def policies(self):
+        overrides = self._policies
+        if overrides is None:
+            overrides = app_config.active().get("retry_policies")
+        return merge_policies(overrides)
+
+    @property
+    def threshold(self):
+        if self._threshold is not None:
+            return self._threshold
+        return app_config.active().get("breaker_threshold") or DEFAULT_BREAKER_THRESHOLD
+
+    @property
+    def cooldown(self):
+        if self._cooldown is not None:
+            return self._cooldown
+        cooldown = app_config.active().get("breaker_cooldown")
+        return DEFAULT_BREAKER_COOLDOWN if cooldown is None else cooldown
+
+    def breaker(self, account):
+        """账号的熔断器，阈值与冷却按当前配置更新。"""
+        threshold, cooldown = self.threshold, self.cooldown
+        with self._lock:
+            breaker = self._breakers.get(account)
+            if breaker is None:
+                breaker = self._breakers[account] = CircuitBreaker(threshold, cooldown)
+            else:
+                breaker.threshold, breaker.cooldown = threshold, cooldown
+            return breaker
+
+    def backoff(self, kind, attempt, policies=None):
+        """第 attempt 次失败后的等待秒数：指数退避，上限 max_delay，带 ±20% 抖动。"""
+        policies = self.policies if policies is None else policies
+        policy = policies.get(kind, policies[UNKNOWN])
+        delay = min(policy["base_delay"] * (2 ** (attempt - 1)), policy["max_delay"])
+        return delay * random.uniform(0.8, 1.2)
+
+    def run(self, func, account=None, label="任务", on_retry=None):
+        """
+        执行 func()，失败按类型重试；on_retry(kind, attempt) 在每次重试前调用（如刷新页面）。
+        超出该类预算或属于不可重试的类型时原样抛出最后一次的异常。
+        嵌套在另一个 run 之内时只重试，不检查也不更新熔断器（由外层 run 负责）。
+        """
+        if _in_run.get():
+            return self._attempt(func, None, label, on_retry)
+        if account is None:
+            account = runlog.current_context().get("account") or runlog.DEFAULT_ACCOUNT
+        breaker = self.breaker(account)
+        with self._lock:
+            allowed = breaker.allow()
+            probe = breaker.probing
+        if not allowed:
+            raise CircuitOpenError(account, breaker.reopen_at)
+        token = _in_run.set(True)
+        try:
+            return self._attempt(func, breaker, label, on_retry)
+        finally:
+            _in_run.reset(token)
+            if probe:
+                with self._lock:
+                    breaker.end_probe()
+
+    def _attempt(self, func, breaker, label, on_retry):
+        policies = self.policies
+        attempts = {}
+        while True:
+            try:
+                result = func()
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                kind = classify(e)
+                policy = policies.get(kind, policies[UNKNOWN])
+                attempts[kind] = attempts.get(kind, 0) + 1
+                if policy["trips"] and breaker is not None:
+                    with self._lock:
+                        breaker.record_failure(kind)
+                if attempts[kind] >= policy["attempts"]:
+                    log.warning(f"{label}失败（{kind}），不再重试: {e}")
+                    raise
+                delay = self.backoff(kind, attempts[kind], policies)
+                log.warning(
+                    f"{label}失败（{kind}），{delay:.1f} 秒后第 {attempts[kind] + 1} 次尝试: {e}"
+                )
+                self.sleep(delay)
+                if on_retry:
+                    try:
+                        on_retry(kind, attempts[kind])
+                    except Exception as retry_error:
+                        log.warning(f"{label}重试前的恢复操作失败: {retry_error}")
+                continue
+            if breaker is not None:
+                with self._lock:
+                    breaker.record_success()
+            return result
+
+
+engine = RetryEngine()
+
+
+def run(func, account=None, label="任务", on_retry=None):
+    return engine.run(func, account=account, label=label, on_retry=on_retry)
@@ -0,0 +1,238 @@
+"""
+统一日志层：automation.py / exportfile.py / test_webcall.py 共用。
+
+- 记录在调用线程里只做格式化并入队，由唯一的后台线程（QueueListener）落盘，
+  多账号并发时依然廉价且保持入队顺序。
+- 每个账号一个 JSON Lines 日志流（logs/<account>.log），按大小轮转。
+- 通过 bind(account=..., job=...) 绑定上下文，其下所有记录自动带上账号/任务。
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+from contextlib import contextmanager
+
+LOG_ROOT = "tyc"
+DEFAULT_ACCOUNT = "main"
+
+_context = contextvars.ContextVar("tyc_log_context", default={})
+_lock = threading.Lock()
+_state = {"listener": None, "queue": None, "settings": None}
+_streams = {}
+
+
+def _default_settings():
+    return {
+        "log_dir": os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"),
+        "max_bytes": 5 * 1024 * 1024,
+        "backup_count": 5,
+        "console": True,
+        "level": logging.INFO,
+    }
+
+
+class _ContextFilter(logging.Filter):
+    """在生产者线程里把 bind() 的上下文写进 record（入队后线程信息就丢了）。"""
+
+    def filter(self, record):
+        ctx = _context.get()
+        for key in ("account", "job"):
+            if getattr(record, key, None) is None:
+                setattr(record, key, ctx.get(key))
+        if record.account is None:
+            record.account = DEFAULT_ACCOUNT
+        if not hasattr(record, "fields"):
+            record.fields = None
+        if not hasattr(record, "stream"):
+            record.stream = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "account": record.account,
+            "job": record.job,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.fields:
+            payload.update(record.fields)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """首条记录到来时才启动后台写线程，import 本模块没有副作用。"""
+
+    def emit(self, record):
+        if _state["listener"] is None:
+            setup()
+        super().emit(record)
+
+
+class _StreamRouter(logging.Handler):
+    """
+    仅在后台写线程中被调用：按 record.stream / record.account 分发到各自的轮转文件。
+    """
+
+    def __init__(self, settings):
+        super().__init__()
+        self.settings = settings
+        self._handlers = {}
+
+    def _open(self, key):
+        spec = _streams.get(key)
+        if spec:
+            path, structured = spec["path"], spec["structured"]
+        else:
+            safe = re.sub(r"[^\w.-]", "_", key) or DEFAULT_ACCOUNT
+            path = os.path.join(self.settings["log_dir"], f"{safe}.log")
+            structured = True
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=self.settings["max_bytes"],
+            backupCount=self.settings["backup_count"],
+            encoding="utf-8",
+        )
+        if structured:
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            handler.terminator = ""
+        self._handlers[key] = handler
+        return handler
+
+    def emit(self, record):
+        key = record.stream or record.account or DEFAULT_ACCOUNT
+        handler = self._handlers.get(key) or self._open(key)
+        handler.handle(record)
+
+    def close(self):
+        for handler in self._handlers.values():
+            handler.close()
+        self._handlers.clear()
+        super().close()
+
+
+class _ConsoleFilter(logging.Filter):
+    def filter(self, record):
+        return record.stream is None
+
+
+def setup(log_dir=None, max_bytes=None, backup_count=None, console=None, level=None):
+    """
+    配置并启动后台写线程；重复调用无副作用（以首次为准）。
+    """
+    with _lock:
+        if _state["listener"] is not None:
+            return
+        settings = _default_settings()
+        for key, value in (
+            ("log_dir", log_dir),
+            ("max_bytes", max_bytes),
+            ("backup_count", backup_count),
+            ("console", console),
+            ("level", level),
+        ):
+            if value is not None:
+                settings[key] = value
+
+        handlers = [_StreamRouter(settings)]
+        if settings["console"]:
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(
+                logging.Formatter("%(asctime)s [%(account)s] %(message)s")
+            )
+            console_handler.addFilter(_ConsoleFilter())
+            handlers.append(console_handler)
+
+        q = _state["queue"]
+        listener = logging.handlers.QueueListener(
+            q, *handlers, respect_handler_level=True
+        )
+        listener.start()
+        _state["listener"] = listener
+        _state["settings"] = settings
+        logging.getLogger(LOG_ROOT).setLevel(settings["level"])
+    atexit.register(shutdown)
+
+
+def setup_from_config(config):
+    """从 web_config.json 的 log_* 字段配置日志层。"""
+    config = config or {}
+    setup(
+        log_dir=config.get("log_dir"),
+        max_bytes=config.get("log_max_bytes"),
+        backup_count=config.get("log_backup_count"),
+        console=config.get("log_console"),
+    )
+
+
+def shutdown():
+    """刷新队列并停止后台写线程。"""
+    with _lock:
+        listener = _state["listener"]
+        if listener is None:
+            return
+        _state["listener"] = None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def add_stream(name, path, structured=False):
+    """
+    注册一个命名日志流（例如汇总文件 file_cookie_log.txt），返回写入该流的 logger。
+    非结构化流按原样写入消息文本，不追加换行。
+    """
+    _streams[name] = {"path": path, "structured": structured}
+    return logging.LoggerAdapter(get_logger(name), {"stream": name})
+
+
+def get_logger(name=None):
+    return logging.getLogger(f"{LOG_ROOT}.{name}" if name else LOG_ROOT)
+
+
+def current_context():
+    """当前绑定的上下文（传给工作线程后再 bind，线程不会继承 contextvars）。"""
+    return dict(_context.get())
+
+
+@contextmanager
+def bind(**fields):
+    """
+    绑定账号/任务等上下文，作用域内所有记录自动携带这些字段。
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def _install():
+    root = logging.getLogger(LOG_ROOT)
+    root.propagate = False
+    root.setLevel(logging.INFO)
+    q = queue.SimpleQueue()
+    _state["queue"] = q
+    handler = _QueueHandler(q)
+    handler.addFilter(_ContextFilter())
+    root.addHandler(handler)
+
+
+_install()
@@ -0,0 +1,310 @@
+"""
+页面元素选择器注册表。
+
+每个 UI 元素有一个廉价的主选择器（CSS class 组合）和若干后备选择器（原先的 XPath），
+可通过 web_config.json 的 "selectors" 覆盖（按当前作用域的配置读取），例如：
+
+    "selectors": {"export_count": ["span._b4a3e._ab8c7", "//span[contains(@class, '_ab8c7')]"]}
+
+解析结果按页面缓存复用，并按选择器名记录解析耗时。
+
+翻页与勾选行先用一次 evaluate 找出要点的元素，再用 click()（真实鼠标事件，含可操作性检查）
+点击；配置 "synthetic_clicks": true 时改为在同一次 evaluate 中派发 click 事件，往返更少，
+但站点若校验 isTrusted 或依赖 mousedown/mouseup 会失效。
+"""
+import threading
+import time
+import weakref
+
+import app_config
+import runlog
+
+log = runlog.get_logger("selectors")
+
+DEFAULT_SELECTORS = {
+    "export_button": [
+        "span._c7f86._63015:has-text('基础工商信息导出')",
+        "//span[contains(@class, '_c7f86') and contains(@class, '_63015') and contains(text(), '基础工商信息导出')]",
+    ],
+    "export_modal": [
+        "span._6e216._cdd93:has-text('基础工商信息导出')",
+        "//span[contains(@class, '_6e216') and contains(@class, '_cdd93') and contains(., '基础工商信息导出')]",
+    ],
+    "select_all_checkbox": [
+        "i._f4eb7._f6a60._53505._c9c1f",
+        "//i[contains(@class, '_f4eb7') and contains(@class, '_f6a60') and contains(@class, '_53505') and contains(@class, '_c9c1f')]",
+    ],
+    "export_field_checkbox": [
+        "label:has(span:text-is('{text}')) i.tic",
+        "//span[normalize-space(text())='{text}']/ancestor::*[.//i[contains(@class, 'tic')]][1]//i[contains(@class, 'tic')]",
+    ],
+    # 弹窗中的单批上限提示（可选，找不到时不等待）
+    "export_limit_hint": [
+        "span:has-text('最多导出')",
+        "//*[contains(text(), '最多') and contains(text(), '条')]",
+    ],
+    "export_count": [
+        "span._b4a3e._ab8c7",
+        "//span[contains(@class, '_b4a3e') and contains(@class, '_ab8c7')]",
+    ],
+    "basic_export_confirm": [
+        "button._f64c8.tyc-btn-v2._53199._c26a6._d025c",
+        "//button[contains(@class, '_f64c8') and contains(@class, 'tyc-btn-v2') and contains(@class, '_53199') and contains(@class, '_c26a6') and contains(@class, '_d025c')]",
+    ],
+    "custom_range": [
+        "span._576dc:has-text('自定义范围：')",
+        "//span[contains(@class, '_576dc') and contains(text(), '自定义范围：')]",
+    ],
+    "range_inputs": [
+        "input._90acb",
+        "//input[contains(@class, '_90acb')]",
+    ],
+    "more_dimensions_button": [
+        "span._c7f86._63015:has-text('更多维度导出')",
+        "//span[contains(@class, '_c7f86') and contains(@class, '_63015') and contains(text(), '更多维度导出')]",
+    ],
+    "dimension_button": [
+        "button._50ab4._58c27._6c649:has(span:has-text('{text}'))",
+        "//button[contains(@class, '_50ab4') and contains(@class, '_58c27') and contains(@class, '_6c649')][.//span[contains(text(), '{text}')]]",
+    ],
+    "dimension_export_confirm": [
+        "button._50ab4.index_exportButton__9Jnq2._52bf6:has(span:has-text('导出数据'))",
+        "//button[contains(@class, '_50ab4') and contains(@class, 'index_exportButton__9Jnq2') and contains(@class, '_52bf6')][.//span[contains(text(), '导出数据')]]",
+    ],
+    "report_rows": ["tbody tr"],
+    "header_checkbox": ["thead svg"],
+    "next_page": ["i.tic.tic-laydate-next-m"],
+    "prev_page": [
+        "i.tic.tic-laydate-prev-m",
+        "i.tic.tic-laydate-prev",
+        "i.tic.tic-laydate-pre-m",
+        "i.tic.tic-laydate-pre",
+    ],
+    "page_num": [
+        "//div[contains(@class,'pageWrap')]//div[contains(@class,'num') and normalize-space(text())='{text}']",
+        "div.pageWrap div.num:text-is('{text}')",
+    ],
+    "batch_download": [
+        "button._50ab4._52bf6._9e3b9:has(span:has-text('批量下载'))",
+    ],
+}
+
+# 真实点击的超时（毫秒）；目标已判定可见，等待只为可操作性检查
+CLICK_TIMEOUT = 5000
+
+_VISIBLE_JS = """
+const visible = (el) => {
+    const style = window.getComputedStyle(el);
+    return el.getClientRects().length > 0
+        && style.visibility !== 'hidden' && style.display !== 'none';
+};
+const dispatchClick = (el) => el.dispatchEvent(
+    new MouseEvent('click', {bubbles: true, cancelable: true, view: window}));
+"""
+
+# 一次 evaluate_all 找出第一个可见元素的序号（没有为 -1）；dispatch 时顺便派发 click
+_FIRST_VISIBLE_JS = """
+(els, dispatch) => {%s
+    const index = els.findIndex(visible);
+    if (index >= 0 && dispatch) dispatchClick(els[index]);
+    return index;
+}
+""" % _VISIBLE_JS
+
+# 一次 evaluate 找出各行首列中第一个可见的 svg（缺失为 null）；dispatch 时派发 click 并返回是否点击
+_ROW_CHECKBOXES_JS = """
+([rowSelector, indices, dispatch]) => {%s
+    const rows = [...document.querySelectorAll(rowSelector)];
+    const targets = (indices === null ? rows.map((_, i) => i) : indices)
+        .filter((i) => i < rows.length)
+        .map((i) => {
+            const cell = rows[i].querySelector('td');
+            if (!cell) return null;
+            const candidates = [
+                ...cell.querySelectorAll('div div svg'), ...cell.querySelectorAll('svg'),
+            ];
+            return candidates.find(visible) || null;
+        });
+    if (!dispatch) return targets;
+    return targets.map((el) => {
+        if (el) dispatchClick(el);
+        return el !== null;
+    });
+}
+""" % _VISIBLE_JS
+
+
+class SelectorStats:
+    """按选择器名累计解析次数、耗时以及命中的候选序号。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def record(self, name, elapsed_ms, candidate_index):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                entry = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "hits": {}}
+                self._data[name] = entry
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["hits"][candidate_index] = entry["hits"].get(candidate_index, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for name, entry in self._data.items():
+                result[name] = {
+                    "count": entry["count"],
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                    "hits": dict(entry["hits"]),
+                }
+            return result
+
+
+class SelectorRegistry:
+    def __init__(self, overrides=None):
+        self._selectors = dict(DEFAULT_SELECTORS)
+        self._cache = weakref.WeakKeyDictionary()
+        self.stats = SelectorStats()
+        if overrides:
+            self.configure(overrides)
+
+    def configure(self, overrides):
+        """用配置覆盖选择器；值可以是字符串或字符串列表（第一个为主选择器）。"""
+        for name, value in (overrides or {}).items():
+            self._selectors[name] = [value] if isinstance(value, str) else list(value)
+        self._cache = weakref.WeakKeyDictionary()
+
+    def candidates(self, name, **params):
+        """name 的候选选择器：当前作用域配置中的 "selectors" 优先，其次为 configure 的覆盖。"""
+        override = (app_config.active().get("selectors") or {}).get(name)
+        try:
+            if override:
+                templates = [override] if isinstance(override, str) else list(override)
+            else:
+                templates = self._selectors[name]
+        except KeyError:
+            raise KeyError(f"未注册的选择器: {name}")
+        if not params:
+            return list(templates)
+        return [t.replace("{text}", str(params.get("text", ""))) for t in templates]
+
+    def _page_cache(self, page):
+        cache = self._cache.get(page)
+        if cache is None:
+            cache = {}
+            self._cache[page] = cache
+        return cache
+
+    def locator(self, page, name, state="visible", timeout=None, **params):
+        """
+        返回已解析的 locator 并等待其达到 state。
+        首次解析时所有候选合并成一个等待，命中后缓存该页面上的具体候选，
+        之后同一页面只需一次 wait_for 往返。
+        """
+        selectors = self.candidates(name, **params)
+        key = (name, tuple(selectors))
+        cache = self._page_cache(page)
+        started = time.perf_counter()
+        cached = cache.get(key)
+        if cached is not None:
+            index, loc = cached
+            loc.first.wait_for(state=state, timeout=timeout)
+            self.stats.record(name, (time.perf_counter() - started) * 1000, index)
+            return loc
+
+        combined = page.locator(selectors[0])
+        for sel in selectors[1:]:
+            combined = combined.or_(page.locator(sel))
+        combined.first.wait_for(state=state, timeout=timeout)
+
+        index, loc = 0, page.locator(selectors[0])
+        if len(selectors) > 1:
+            for idx, sel in enumerate(selectors):
+                cand = page.locator(sel)
+                if cand.count() > 0:
+                    index, loc = idx, cand
+                    break
+        if index > 0:
+            log.info(f"选择器 {name} 主选择器未命中，使用后备 #{index}: {selectors[index]}")
+        cache[key] = (index, loc)
+        self.stats.record(name, (time.perf_counter() - started) * 1000, index)
+        return loc
+
+    def click_first_visible(self, page, name, **params):
+        """
+        依次尝试各候选：一次 evaluate_all 找出第一个可见元素，再用 locator.click() 点击它；
+        synthetic_clicks 时直接在页面内派发 click。
+        """
+        synthetic = _synthetic_clicks()
+        started = time.perf_counter()
+        for idx, sel in enumerate(self.candidates(name, **params)):
+            try:
+                loc = page.locator(sel)
+                index = loc.evaluate_all(_FIRST_VISIBLE_JS, synthetic)
+                if index < 0:
+                    continue
+                if not synthetic:
+                    loc.nth(index).click(timeout=CLICK_TIMEOUT)
+                self.stats.record(name, (time.perf_counter() - started) * 1000, idx)
+                return True
+            except Exception:
+                continue
+        self.stats.record(name, (time.perf_counter() - started) * 1000, -1)
+        return False
+
+    def click_row_checkboxes(self, page, indices=None):
+        """
+        勾选 indices 指定的表格行（None 表示当前页全部行），返回实际存在的各行是否点击成功。
+        一次 evaluate 找出全部勾选框，再逐个 click()；synthetic_clicks 时在同一次 evaluate 中派发。
+        """
+        if indices is not None:
+            indices = list(indices)
+            if not indices:
+                return []
+        started = time.perf_counter()
+        row_selector = self.candidates("report_rows")[0]
+        if _synthetic_clicks():
+            result = page.evaluate(_ROW_CHECKBOXES_JS, [row_selector, indices, True])
+        else:
+            handle = page.evaluate_handle(_ROW_CHECKBOXES_JS, [row_selector, indices, False])
+            try:
+                targets = handle.get_properties()
+                result = [
+                    _click_handle(targets[key].as_element())
+                    for key in sorted(targets, key=int)
+                ]
+            finally:
+                handle.dispose()
+        self.stats.record("row_checkboxes", (time.perf_counter() - started) * 1000, 0)
+        return result
+
+    def log_stats(self):
+        for name, entry in sorted(self.stats.snapshot().items()):
+            log.info(
+                f"选择器 {name}: {entry['count']} 次, 平均 {entry['avg_ms']}ms, "
+                f"最大 {entry['max_ms']}ms, 命中 {entry['hits']}",
+                extra={"fields": {"selector": name, **entry}},
+            )
+
+
+def _synthetic_clicks():
+    return bool(app_config.active().get("synthetic_clicks"))
+
+
+def _click_handle(element):
+    if element is None:
+        return False
+    try:
+        element.click(timeout=CLICK_TIMEOUT)
+        return True
+    except Exception as e:
+        log.warning(f"点击勾选框失败: {e}")
+        return False
+
+
+registry = SelectorRegistry()
@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+import batch_limits
+from batch_limits import BatchLimitStore
+
+
+@pytest.mark.parametrize(
+    "text, limit",
+    [
+        ("单次最多导出 10000 条", 10000),
+        ("单次最多可导出2,000条，请分批导出", 2000),
+        ("单次导出不能超过5000条", 5000),
+        ("导出数量不得大于 3000 条。", 3000),
+        ("每批上限为 1000 条", 1000),
+        ("当前选择 8000 条，单次导出不能超过5000条！", 5000),
+        ("今日最多导出 50 条", None),
+        ("您今日剩余导出次数不足，上限 100 条", None),
+        ("导出额度上限 2000 条", None),
+        ("上限 2000 条", None),
+        ("导出成功", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_limit_from_text(text, limit):
+    assert batch_limits.limit_from_text(text) == limit
+
+
+def test_quota_clause_does_not_hide_a_batch_limit_in_another_clause():
+    text = "今日剩余次数 3 次；单次最多导出 5000 条"
+    assert batch_limits.limit_from_text(text) == 5000
+
+
+def test_batch_size_prefers_the_learned_limit(tmp_path):
+    store = BatchLimitStore(str(tmp_path / "limits.json"))
+    assert store.batch_size("a", "basic", 2000) == 2000
+    store.record_accepted("a", "basic", 3000)
+    assert store.batch_size("a", "basic", 2000) == 3000
+    store.record_accepted("a", "basic", 1000)
+    assert store.get("a", "basic")["accepted"] == 3000
+    store.record_limit("a", "basic", 2500, "server")
+    assert store.batch_size("a", "basic", 2000) == 2500
+    assert store.batch_size("b", "basic", 2000) == 2000
+
+
+def test_stores_share_the_file(tmp_path):
+    path = str(tmp_path / "limits.json")
+    first, second = BatchLimitStore(path), BatchLimitStore(path)
+    first.record_limit("a", "basic", 5000, "modal")
+    second.record_limit("a", "shareholder", 1000, "server")
+    # 第二个实例写入前重新读入，不会覆盖第一个实例的结果
+    assert first.get("a", "shareholder")["limit"] == 1000
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["a"]["basic"]["limit"] == 5000
+    assert saved["a"]["shareholder"]["limit"] == 1000
+    assert os.path.exists(path + ".lock")
@@ -0,0 +1,124 @@
+import gzip
+import json
+import sqlite3
+
+import change_feed
+from result_reader import CompanyRecord
+
+
+def _basic(code, capital, **extra):
+    return CompanyRecord(
+        "basic", "a.xlsx", 0, {"统一社会信用代码": code, "注册资本": capital, **extra}
+    )
+
+
+def _holder(code, name, amount):
+    values = {"统一社会信用代码": code, "股东名称": name, "出资额": amount}
+    return CompanyRecord("shareholder", "a.xlsx", 0, values)
+
+
+def _diff(tmp_path, old, new, config=None):
+    config = {} if config is None else config
+    old_path, new_path = str(tmp_path / "old.sqlite"), str(tmp_path / "new.sqlite")
+    change_feed.snapshot(old, old_path, config)
+    change_feed.snapshot(new, new_path, config)
+    return list(change_feed.iter_changes(old_path, new_path))
+
+
+def test_added_removed_and_changed_rows(tmp_path):
+    old = [_basic("911", "100万"), _basic("912", "50万")]
+    new = [_basic("911", "200万"), _basic("913", "10万")]
+    changes = _diff(tmp_path, old, new)
+    assert changes == [
+        {
+            "op": "changed",
+            "dimension": "basic",
+            "key": ["911"],
+            "columns": {"注册资本": ["100万", "200万"]},
+        },
+        {
+            "op": "removed",
+            "dimension": "basic",
+            "key": ["912"],
+            "values": {"统一社会信用代码": "912", "注册资本": "50万"},
+        },
+        {
+            "op": "added",
+            "dimension": "basic",
+            "key": ["913"],
+            "values": {"统一社会信用代码": "913", "注册资本": "10万"},
+        },
+    ]
+
+
+def test_unchanged_results_have_no_changes(tmp_path):
+    rows = [_basic("911", "100万"), _holder("911", "张三", "10")]
+    assert _diff(tmp_path, rows, list(reversed(rows))) == []
+
+
+def test_ignored_columns_are_not_compared(tmp_path):
+    old = [_basic("911", "100万", 序号=1)]
+    new = [_basic("911", "100万", 序号=7)]
+    assert _diff(tmp_path, old, new) == []
+    changes = _diff(tmp_path, old, new, {"change_ignore_columns": ["注册资本"]})
+    assert changes[0]["columns"] == {"序号": [1, 7]}
+
+
+def test_duplicate_keys_reordered_are_not_changes(tmp_path):
+    old = [_holder("911", "张三", "10"), _holder("911", "张三", "20"), _holder("911", "李四", "5")]
+    new = [_holder("911", "李四", "5"), _holder("911", "张三", "20"), _holder("911", "张三", "10")]
+    assert _diff(tmp_path, old, new) == []
+
+
+def test_one_changed_row_under_a_duplicate_key(tmp_path):
+    old = [_holder("911", "张三", "10"), _holder("911", "张三", "20")]
+    new = [_holder("911", "张三", "20"), _holder("911", "张三", "30")]
+    assert _diff(tmp_path, old, new) == [
+        {
+            "op": "changed",
+            "dimension": "shareholder",
+            "key": ["911", "张三"],
+            "columns": {"出资额": ["10", "30"]},
+        }
+    ]
+
+
+def test_duplicate_key_gaining_a_row_is_an_addition(tmp_path):
+    old = [_holder("911", "张三", "10")]
+    new = [_holder("911", "张三", "10"), _holder("911", "张三", "20")]
+    changes = _diff(tmp_path, old, new)
+    assert [(c["op"], c["values"]["出资额"]) for c in changes] == [("added", "20")]
+
+
+def test_exact_duplicate_rows_are_stored_once(tmp_path):
+    rows = [_basic("911", "100万"), _basic("911", "100万")]
+    assert change_feed.snapshot(rows, str(tmp_path / "s.sqlite"), {}) == 1
+
+
+def test_change_keys_override_the_key_columns(tmp_path):
+    config = {"change_keys": {"basic": ["统一社会信用代码", "注册资本"]}}
+    changes = _diff(tmp_path, [_basic("911", "100万")], [_basic("911", "200万")], config)
+    assert [(c["op"], c["key"]) for c in changes] == [
+        ("removed", ["911", "100万"]),
+        ("added", ["911", "200万"]),
+    ]
+
+
+def test_write_changes_gzip_and_summary(tmp_path):
+    changes = _diff(tmp_path, [_basic("911", "100万")], [_basic("911", "200万")])
+    out = str(tmp_path / "changes.jsonl.gz")
+    summary = change_feed.write_changes(iter(changes), out)
+    assert summary == {("basic", "changed"): 1}
+    with gzip.open(out, "rt", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == changes
+
+
+def test_snapshot_from_an_older_format_is_rebuilt(tmp_path):
+    path = change_feed.snapshot_for(str(tmp_path), {})
+    assert change_feed.snapshot_for(str(tmp_path), {}) == path
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+    change_feed.snapshot_for(str(tmp_path), {})
+    assert change_feed._snapshot_version(path) == change_feed.SNAPSHOT_VERSION
@@ -0,0 +1,57 @@
+import json
+
+import collector
+
+
+def test_split_headers_keeps_only_public_headers():
+    headers = {
+        "accept": "application/json",
+        "content-type": "application/json",
+        "X-AUTH-TOKEN": "secret",
+        "authorization": "Bearer secret",
+        "version": "TYC-Web",
+    }
+    public, secret = collector.split_headers(headers)
+    assert public == {
+        "accept": "application/json",
+        "content-type": "application/json",
+        "version": "TYC-Web",
+    }
+    assert secret == ["X-AUTH-TOKEN", "authorization"]
+
+
+def test_request_headers_fill_auth_headers_from_cookies():
+    template = {
+        "headers": {"accept": "application/json", "version": "TYC-Web"},
+        "auth_headers": ["X-AUTH-TOKEN", "authorization"],
+    }
+    headers = collector.request_headers(template, "TYCID=1; auth_token=abc.def.ghi")
+    assert headers == {
+        "accept": "application/json",
+        "version": "TYC-Web",
+        "X-AUTH-TOKEN": "abc.def.ghi",
+    }
+    # 保存的模板不被修改
+    assert "X-AUTH-TOKEN" not in template["headers"]
+
+
+def test_cookie_domain_falls_back_to_import_page_url():
+    assert collector.cookie_domain({"cookie_domain": ".tianyancha.com"}) == ".tianyancha.com"
+    config = {"import_page_url": "https://www.tianyancha.com/batch/search"}
+    assert collector.cookie_domain(config) == "www.tianyancha.com"
+    assert collector.cookie_domain({}) is None
+
+
+def test_legacy_jobs_drop_saved_auth_headers(tmp_path):
+    path = tmp_path / "jobs.json"
+    legacy = {
+        "id": "a",
+        "status": collector.SUBMITTED,
+        "template": {"url": "u", "headers": {"accept": "*/*", "x-auth-token": "secret"}},
+    }
+    path.write_text(json.dumps([legacy]), encoding="utf-8")
+    store = collector.JobStore(str(path))
+    store.update("a", error=None)
+    saved = json.loads(path.read_text(encoding="utf-8"))[0]["template"]
+    assert saved["headers"] == {"accept": "*/*"}
+    assert saved["auth_headers"] == ["x-auth-token"]
@@ -0,0 +1,95 @@
+import pytest
+
+from report_boundary import find_boundary, find_boundary_linear, newer_entries
+
+START_MS = 1_000_000
+
+
+def _pages(total, newer, page_size=10):
+    """total 个报告按 payDate 倒序，前 newer 个晚于 START_MS；返回 fetch 与请求记录。"""
+    items = [
+        {
+            "id": f"W{i:05d}",
+            "payDate": START_MS + (newer - i) * 1000 if i < newer else START_MS - i * 1000,
+            "reportStatus": 1 if i % 3 == 0 else 2,
+        }
+        for i in range(total)
+    ]
+    calls = []
+
+    def fetch(page_num):
+        calls.append(page_num)
+        start = (page_num - 1) * page_size
+        return {
+            "data": {
+                "items": items[start:start + page_size],
+                "pageNum": page_num,
+                "pageSize": page_size,
+                "total": total,
+            }
+        }
+
+    def fetch_many(page_nums):
+        return {page_num: fetch(page_num) for page_num in page_nums}
+
+    return fetch, fetch_many, calls
+
+
+CASES = [
+    (0, 0), (5, 0), (5, 5), (100, 0), (100, 1), (100, 10), (100, 11), (100, 55), (100, 100),
+    (1000, 30), (1000, 999),
+]
+
+
+@pytest.mark.parametrize("total, newer", CASES)
+def test_find_boundary_matches_the_linear_scan(total, newer):
+    fetch, _, _ = _pages(total, newer)
+    expected = find_boundary_linear(fetch, START_MS)
+    found = find_boundary(fetch, START_MS)
+    assert (found.last_page, found.newer) == (expected.last_page, expected.newer)
+    assert found.newer == newer
+
+
+def test_find_boundary_needs_log_pages_requests():
+    fetch, _, calls = _pages(10_000, 5_000)
+    found = find_boundary(fetch, START_MS)
+    assert found.newer == 5_000
+    assert len(calls) <= 12
+
+
+@pytest.mark.parametrize("total, newer", CASES)
+@pytest.mark.parametrize("batch", [1, 4])
+def test_newer_entries_returns_every_newer_report(total, newer, batch):
+    fetch, fetch_many, calls = _pages(total, newer)
+    boundary, entries = newer_entries(fetch, START_MS, fetch_many=fetch_many, batch=batch)
+    assert [entry.id for entry in entries] == [f"W{i:05d}" for i in range(newer)]
+    assert boundary.newer == newer
+    # 最多多读 batch - 1 页
+    assert len(set(calls)) <= boundary.last_page + batch - 1
+    assert len(calls) == len(set(calls))
+
+
+def test_newer_entries_reuse_the_first_page():
+    fetch, fetch_many, calls = _pages(100, 5)
+    first = fetch(1)
+    calls.clear()
+    boundary, entries = newer_entries(fetch, START_MS, first=first, fetch_many=fetch_many)
+    assert len(entries) == 5
+    assert calls == []
+    assert boundary.requests == 0
+
+
+@pytest.mark.parametrize("failing_page", [1, 3, 6])
+def test_failed_requests_return_none(failing_page):
+    fetch, fetch_many, _ = _pages(100, 55)
+
+    def flaky(page_num):
+        return None if page_num == failing_page else fetch(page_num)
+
+    def flaky_many(page_nums):
+        return {page_num: flaky(page_num) for page_num in page_nums}
+
+    assert newer_entries(flaky, START_MS, fetch_many=flaky_many) is None
+    if failing_page != 3:
+        # 二分查找读第 1 页和第 6 页，不读第 3 页
+        assert find_boundary(flaky, START_MS) is None
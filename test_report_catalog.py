@@ -0,0 +1,104 @@
+import os
+import sqlite3
+
+import pytest
+
+import report_catalog
+
+
+def _item(report_id, *names):
+    return {
+        "id": report_id,
+        "payDate": "1700000000000",
+        "reportStatus": 2,
+        "fileUrl": [{"name": name, "url": f"https://example.com/{name}"} for name in names],
+    }
+
+
+def _write(path, content=b"data"):
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = report_catalog.ReportCatalog(str(tmp_path / "catalog.sqlite"))
+    yield catalog
+    catalog.close()
+
+
+def test_sync_stores_reports_and_file_counts(catalog):
+    data = {"data": {"items": [_item("r1", "a.xlsx", "b.xlsx"), {"payDate": 1}]}}
+    assert catalog.sync(data) == 1
+    assert catalog.report("r1")["pay_date"] == 1700000000000
+    assert catalog.report("missing") is None
+
+
+def test_report_is_downloaded_only_when_every_file_is_present(catalog, tmp_path):
+    catalog.sync({"data": {"items": [_item("r1", "a.xlsx", "b.xlsx")]}})
+    catalog.record_file("r1", "a.xlsx", _write(tmp_path / "a.xlsx"), "x")
+    assert catalog.downloaded_ids() == set()
+    b = _write(tmp_path / "b.xlsx")
+    catalog.record_file("r1", "b.xlsx", b, "y")
+    assert catalog.downloaded_ids() == {"r1"}
+    os.remove(b)
+    assert catalog.downloaded_ids() == set()
+
+
+def test_report_without_synced_file_count_is_not_downloaded(catalog, tmp_path):
+    catalog.record_file("r1", "a.xlsx", _write(tmp_path / "a.xlsx"), "x")
+    assert catalog.downloaded_ids() == set()
+
+
+def test_archive_counts_as_whole_report(catalog, tmp_path, monkeypatch):
+    monkeypatch.setattr(report_catalog, "for_account", lambda *a, **k: catalog)
+    catalog.sync({"data": {"items": [_item("r1", "a.xlsx", "b.xlsx"), _item("r2", "c.xlsx")]}})
+    archive = _write(tmp_path / "batch.zip")
+    report_catalog.record_archive(["r1", "r2"], archive)
+    assert catalog.downloaded_ids() == {"r1", "r2"}
+    assert catalog.location(["r1", "r2"]) == [os.path.abspath(archive)]
+
+
+def test_location_lists_existing_files_only(catalog, tmp_path):
+    a = _write(tmp_path / "a.xlsx")
+    b = _write(tmp_path / "b.xlsx")
+    catalog.record_file("r1", "a.xlsx", a, "x")
+    catalog.record_file("r2", "b.xlsx", b, "y")
+    os.remove(b)
+    assert catalog.location(["r1", "r2"]) == [os.path.abspath(a)]
+    assert catalog.location([]) == []
+
+
+def test_reuse_links_a_recorded_file_of_the_same_size(catalog, tmp_path):
+    source = _write(tmp_path / "a.xlsx")
+    catalog.record_file("r1", "a.xlsx", source, "x")
+    dest = tmp_path / "out"
+    dest.mkdir()
+    target = catalog.reuse({"id": "r1", "name": "a.xlsx"}, str(dest))
+    assert open(target, "rb").read() == b"data"
+    _write(source, b"changed")
+    assert catalog.reuse({"id": "r1", "name": "a.xlsx"}, str(dest)) is None
+
+
+def test_old_catalog_is_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE reports (id TEXT PRIMARY KEY, pay_date INTEGER, status INTEGER, "
+                 "type INTEGER, name_detail TEXT, file_size INTEGER, synced_at REAL)")
+    conn.execute("CREATE TABLE files (report_id TEXT NOT NULL, name TEXT NOT NULL, "
+                 "path TEXT NOT NULL, size INTEGER, sha256 TEXT, downloaded_at REAL, "
+                 "PRIMARY KEY (report_id, name))")
+    conn.commit()
+    conn.close()
+    catalog = report_catalog.ReportCatalog(path)
+    try:
+        catalog.sync({"data": {"items": [_item("r1", "a.xlsx")]}})
+        catalog.record_file("r1", "a.xlsx", _write(tmp_path / "a.xlsx"), "x")
+        assert catalog.downloaded_ids() == {"r1"}
+    finally:
+        catalog.close()
+
+
+def test_catalog_can_be_disabled():
+    assert report_catalog.for_account("acct", {"report_catalog": False}) is None
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+import report_list
+from report_list import ReportPageWatcher, ReportTracker, ReportWaitError
+
+
+def _item(report_id, pay_date=0, status=2, name="基础工商信息"):
+    return {"id": report_id, "payDate": pay_date, "reportStatus": status, "reportName": name}
+
+
+class _Client:
+    """按页返回固定列表的 myReport/list 客户端。"""
+
+    def __init__(self, items, page_size=10):
+        self.items = items
+        self.page_size = page_size
+        self.pages = []
+
+    def _page(self, page_num):
+        self.pages.append(page_num)
+        start = (page_num - 1) * self.page_size
+        return {
+            "data": {
+                "items": self.items[start:start + self.page_size],
+                "pageNum": page_num,
+                "pageSize": self.page_size,
+                "total": len(self.items),
+            }
+        }
+
+    def fetch(self, page_num):
+        return self._page(page_num)
+
+    def fetch_with(self, session, page_num):
+        return self._page(page_num)
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(report_list.report_catalog, "sync", lambda data: None)
+    monkeypatch.setattr(report_list.har_session, "sleep", lambda sec: None)
+
+
+def _tracker(items, baseline):
+    tracker = ReportTracker.__new__(ReportTracker)
+    tracker.client = _Client(items)
+    tracker.baseline_ids = set(baseline)
+    tracker.baseline_ok = True
+    return tracker
+
+
+def test_report_ids_from_response():
+    assert report_list.report_ids_from_response({"data": "success"}) == []
+    data = {"data": [{"id": "W83010948091767956721541"}, "W1234567890123", "abc"]}
+    assert report_list.report_ids_from_response(data) == [
+        "W83010948091767956721541",
+        "W1234567890123",
+    ]
+
+
+def test_new_report_ids_stop_at_the_baseline():
+    items = [_item("W3"), _item("W2"), _item("W1"), _item("W0")]
+    tracker = _tracker(items, baseline={"W1", "W0"})
+    assert tracker.new_report_ids(expected=2) == ["W3", "W2"]
+
+
+def test_new_report_ids_skip_other_dimensions_and_times():
+    items = [
+        _item("W5", pay_date=500, name="股东信息"),
+        _item("W4", pay_date=50),
+        _item("W3", pay_date=400),
+        _item("W2", pay_date=300),
+        _item("W1", pay_date=100),
+    ]
+    tracker = _tracker(items, baseline={"W1"})
+    found = tracker.new_report_ids(
+        expected=2, per_dimension={"basic": 2}, window=(200, 600), attempts=1
+    )
+    assert found == ["W3", "W2"]
+
+
+def test_new_report_ids_give_up_when_foreign_reports_hide_ours():
+    items = [_item("W3", pay_date=500, name="股东信息"), _item("W1")]
+    tracker = _tracker(items, baseline={"W1"})
+    found = tracker.new_report_ids(expected=1, per_dimension={"basic": 1}, attempts=1)
+    assert found is None
+
+
+def test_find_items_reads_pages_in_batches():
+    items = [_item(f"W{i:03d}") for i in range(100)]
+    client = _Client(items)
+    watcher = ReportPageWatcher(client, session=None, workers=4)
+    found = watcher.find_items(["W055"])
+    assert list(found) == ["W055"]
+    assert sorted(client.pages) == list(range(1, 9))
+
+
+def test_find_items_raise_when_pushed_past_max_pages():
+    client = _Client([_item(f"W{i:04d}") for i in range(1000)])
+    watcher = ReportPageWatcher(client, session=None, workers=4)
+    with pytest.raises(ReportWaitError):
+        watcher.find_items(["W0900"], max_pages=20)
+    assert len(client.pages) == 20
+
+
+def test_wait_for_ids_fails_fast_on_a_failed_report():
+    watcher = ReportPageWatcher(_Client([_item("W1", status=3)]), session=None)
+    with pytest.raises(ReportWaitError):
+        watcher.wait_for_ids(["W1"], sleep=lambda sec: pytest.fail("should not wait"))
+
+
+def test_wait_for_ids_polls_until_ready():
+    items = [_item("W1", status=1)]
+    watcher = ReportPageWatcher(_Client(items), session=None)
+
+    def _sleep(sec):
+        items[0]["reportStatus"] = 2
+
+    assert list(watcher.wait_for_ids(["W1"], sleep=_sleep)) == ["W1"]
+
+
+def test_client_build_rewrites_page_number_in_body_or_query():
+    client = report_list.ReportListClient(None)
+    client.template = {
+        "url": "https://x/list",
+        "method": "POST",
+        "headers": {},
+        "post_data": json.dumps({"pageNum": 1, "pageSize": 10}),
+    }
+    url, body = client.build(3, 50)
+    assert json.loads(body) == {"pageNum": 3, "pageSize": 50}
+    client.template = {
+        "url": "https://x/list?pageNum=1&a=b",
+        "method": "GET",
+        "headers": {},
+        "post_data": None,
+    }
+    url, body = client.build(2)
+    assert url == "https://x/list?pageNum=2&a=b"
+    assert body is None
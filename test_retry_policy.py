@@ -0,0 +1,120 @@
+import errno
+
+import pytest
+
+import retry_policy
+from retry_policy import CircuitBreaker, CircuitOpenError, RetryEngine, TaskFailure
+
+
+def _engine(**kwargs):
+    delays = []
+    engine = RetryEngine(sleep=delays.append, **kwargs)
+    return engine, delays
+
+
+def _failing(*errors, result="ok"):
+    errors = list(errors)
+    calls = []
+
+    def _func():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return _func, calls
+
+
+class TimeoutError(Exception):
+    """与 Playwright 的 TimeoutError 同名，不继承内置 TimeoutError。"""
+
+
+@pytest.mark.parametrize(
+    "exc, kind",
+    [
+        (TaskFailure(retry_policy.AUTH_EXPIRED, "登录失效"), retry_policy.AUTH_EXPIRED),
+        (Exception("net::ERR_CONNECTION_RESET"), retry_policy.NETWORK),
+        (Exception("HTTP 503"), retry_policy.SERVER_ERROR),
+        (TimeoutError("waiting for selector"), retry_policy.SELECTOR_TIMEOUT),
+        (ConnectionResetError(), retry_policy.NETWORK),
+        (OSError(errno.ENETUNREACH, "unreachable"), retry_policy.NETWORK),
+        (OSError(errno.ENOSPC, "disk full"), retry_policy.UNKNOWN),
+        (PermissionError(), retry_policy.UNKNOWN),
+        (ValueError("bad"), retry_policy.UNKNOWN),
+    ],
+)
+def test_classify(exc, kind):
+    assert retry_policy.classify(exc) == kind
+
+
+def test_backoff_grows_exponentially_up_to_max_delay():
+    engine, _ = _engine(policies={"network": {"base_delay": 2, "max_delay": 10}})
+    for attempt, expected in [(1, 2), (2, 4), (3, 8), (4, 10), (8, 10)]:
+        delay = engine.backoff(retry_policy.NETWORK, attempt)
+        assert expected * 0.8 <= delay <= expected * 1.2
+
+
+def test_retries_within_the_budget_of_each_kind():
+    engine, delays = _engine(policies={"network": {"attempts": 3}})
+    func, calls = _failing(ConnectionResetError(), ConnectionResetError())
+    assert engine.run(func, account="a") == "ok"
+    assert len(calls) == 3
+    assert len(delays) == 2
+
+    func, calls = _failing(*[ConnectionResetError()] * 3)
+    with pytest.raises(ConnectionResetError):
+        engine.run(func, account="a")
+    assert len(calls) == 3
+
+
+def test_non_retryable_failures_open_the_breaker():
+    engine, _ = _engine(threshold=2, cooldown=1800)
+    for _ in range(2):
+        func, calls = _failing(TaskFailure(retry_policy.AUTH_EXPIRED, "登录失效"))
+        with pytest.raises(TaskFailure):
+            engine.run(func, account="a")
+        assert len(calls) == 1
+    func, calls = _failing()
+    with pytest.raises(CircuitOpenError):
+        engine.run(func, account="a")
+    assert calls == []
+    # 其他账号不受影响
+    assert engine.run(func, account="b") == "ok"
+
+
+def test_nested_runs_do_not_touch_the_breaker():
+    engine, _ = _engine(threshold=1)
+    inner, _ = _failing(TaskFailure(retry_policy.QUOTA_WARN, "次数不足"))
+
+    def _outer():
+        try:
+            engine.run(inner, account="a")
+        except TaskFailure:
+            pass
+        return "ok"
+
+    assert engine.run(_outer, account="a") == "ok"
+    assert engine.breaker("a").opened_at is None
+
+
+def test_half_open_breaker_lets_a_single_probe_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record_failure(retry_policy.AUTH_EXPIRED, now=1000)
+    assert not breaker.allow(now=1030)
+    assert breaker.allow(now=1061)
+    assert not breaker.allow(now=1062)
+    breaker.end_probe()
+    assert breaker.allow(now=1063)
+    breaker.record_success()
+    assert breaker.allow(now=1064)
+    assert breaker.allow(now=1064)
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record_failure(retry_policy.AUTH_EXPIRED, now=0)
+    breaker.record_failure(retry_policy.AUTH_EXPIRED, now=0)
+    assert breaker.allow(now=61)
+    breaker.record_failure(retry_policy.AUTH_EXPIRED, now=61)
+    assert not breaker.allow(now=100)
+    assert breaker.reopen_at == 121
@@ -0,0 +1,79 @@
+import json
+import threading
+
+import pytest
+
+import runlog
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    runlog.shutdown()
+    runlog.setup(log_dir=str(tmp_path), console=False)
+    yield tmp_path
+    runlog.shutdown()
+
+
+def _records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_json_lines_per_account(log_dir):
+    log = runlog.get_logger("export")
+    with runlog.bind(account="cookie1", job="file1.xls"):
+        log.info("开始导出", extra={"fields": {"batch": 1}})
+        log.warning("第二条")
+    with runlog.bind(account="cookie2"):
+        log.info("另一个账号")
+    runlog.shutdown()
+
+    first = _records(log_dir / "cookie1.log")
+    assert [r["msg"] for r in first] == ["开始导出", "第二条"]
+    assert first[0]["account"] == "cookie1"
+    assert first[0]["job"] == "file1.xls"
+    assert first[0]["logger"] == "tyc.export"
+    assert first[0]["batch"] == 1
+    assert first[1]["level"] == "WARNING"
+    assert [r["msg"] for r in _records(log_dir / "cookie2.log")] == ["另一个账号"]
+
+
+def test_unbound_records_go_to_the_default_account(log_dir):
+    runlog.get_logger("export").info("未绑定")
+    runlog.shutdown()
+    (record,) = _records(log_dir / f"{runlog.DEFAULT_ACCOUNT}.log")
+    assert record["account"] == runlog.DEFAULT_ACCOUNT
+    assert record["job"] is None
+
+
+def test_worker_threads_rebind_the_context(log_dir):
+    log = runlog.get_logger("download")
+    with runlog.bind(account="cookie1", job="file1.xls"):
+        context = runlog.current_context()
+
+    def _work():
+        with runlog.bind(**context):
+            log.info("线程中")
+
+    thread = threading.Thread(target=_work)
+    thread.start()
+    thread.join()
+    runlog.shutdown()
+    (record,) = _records(log_dir / "cookie1.log")
+    assert record["job"] == "file1.xls"
+
+
+def test_bind_is_restored_on_exit():
+    with runlog.bind(account="a", job="j"):
+        with runlog.bind(job="k"):
+            assert runlog.current_context() == {"account": "a", "job": "k"}
+        assert runlog.current_context() == {"account": "a", "job": "j"}
+    assert runlog.current_context() == {}
+
+
+def test_named_streams_are_written_verbatim(log_dir):
+    summary = runlog.add_stream("summary", str(log_dir / "summary.txt"))
+    summary.info("第一行\n")
+    summary.info("第二行\n")
+    runlog.shutdown()
+    assert (log_dir / "summary.txt").read_text(encoding="utf-8") == "第一行\n第二行\n"
@@ -1,7 +1,13 @@
+import logging
 import os
 import traceback
 
+import runlog
 from automation import WebAutomation
+from governor import ResourceGovernor
+
+# 汇总日志：经统一日志层的后台线程写入，不再每行打开/关闭一次文件
+_summary = runlog.add_stream("summary", "file_cookie_log.txt")
 
 
 def _read_text(path):
@@ -10,8 +16,7 @@ def _read_text(path):
 
 
 def _append_log(text):
-    with open("file_cookie_log.txt", "a", encoding="utf-8") as f:
-        f.write(text)
+    _summary.info(text)
 
 
 SEPARATOR = "-" * 70 + "\n"
@@ -40,7 +45,12 @@ def run_sequential(cookie_dir="cookie", file_dir="file"):
             continue
 
         log_lines = []
-        automation = WebAutomation(logger=lambda m: log_lines.append(str(m)))
+        automation = WebAutomation(
+            logger=lambda m: log_lines.append(str(m)),
+            account=os.path.splitext(cookie_name)[0],
+        )
+        # 本机内存紧张时先等待，再启动下一个浏览器
+        ResourceGovernor.from_config(automation.config).wait_for_headroom()
 
         try:
             downloaded_file_path = automation.run_task(
@@ -49,13 +59,14 @@ def run_sequential(cookie_dir="cookie", file_dir="file"):
             )
             _append_log(f"{i} {cookie_name}-{file_name}-成功\n")
             if downloaded_file_path:
-                print(f"文件已下载至: {downloaded_file_path}")
+                automation.log(f"文件已下载至: {downloaded_file_path}")
             else:
-                print("执行完成，但未返回下载路径")
+                automation.log("执行完成，但未返回下载路径")
         except Exception:
             _append_log(f"{i} {cookie_name}-{file_name}-失败\n")
             _append_log("\n".join(log_lines) + "\n")
             _append_log(traceback.format_exc() + "\n")
+            automation.log(traceback.format_exc(), logging.ERROR)
 
         _append_log("\n")
         _append_log(SEPARATOR)
@@ -0,0 +1,289 @@
+"""
+监视 import_folder，新放入的导入文件只入队一次。
+
+- 有 watchdog 时用系统通知（Linux inotify / Windows ReadDirectoryChangesW），
+  没有时退回轮询：只 stat 目录本身，目录 mtime 变化才重新列目录；
+- 新文件在大小与 mtime 持续 settle_sec 秒不变后才算写完（防止读到半个文件）；
+- 已入队的文件按 路径 + 大小 + sha256 记入索引文件，重启后不会重复处理；
+  索引默认放在 watch_index/ 下而不是被监视目录中，保存索引不会改变目录 mtime 触发重新扫描。
+
+    python cli.py watch --cookie cookie/cookie1.txt [--folder D:\\drops]
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+import runlog
+from fileutil import file_sha256
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog 为可选依赖
+    Observer = None
+    FileSystemEventHandler = object
+
+log = runlog.get_logger("watch")
+
+DEFAULT_PATTERNS = ("*.xlsx", "*.xls", "*.csv")
+# 浏览器下载中、Office 锁文件等临时文件
+IGNORED_PATTERNS = ("~$*", ".*", "*.part", "*.tmp", "*.crdownload")
+INDEX_DIR = "watch_index"
+# 旧版本放在被监视目录中的索引，首次启动时读入
+LEGACY_INDEX_NAME = ".tyc_watch_index.json"
+
+
+def default_index_path(folder):
+    """被监视目录之外的索引路径：watch_index/<目录名>_<路径哈希>.json。"""
+    folder = os.path.abspath(folder)
+    digest = hashlib.sha1(folder.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(INDEX_DIR, f"{os.path.basename(folder) or 'root'}_{digest}.json")
+
+
+class FileIndex:
+    """
+    已入队文件的索引：{路径: {size, mtime_ns, sha256, queued_at}}，保存为 JSON。
+    监视线程与 run_daemon（forget）会同时读写，全部操作由锁串行化。
+    """
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        source = path if os.path.exists(path) else legacy_path
+        if source and os.path.exists(source):
+            try:
+                with open(source, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning(f"监视索引无法读取，重新建立: {e}")
+
+    def unchanged(self, path, size, mtime_ns):
+        with self._lock:
+            entry = self.entries.get(path)
+        return bool(entry) and entry["size"] == size and entry["mtime_ns"] == mtime_ns
+
+    def seen(self, path, sha256):
+        with self._lock:
+            entry = self.entries.get(path)
+        return bool(entry) and entry["sha256"] == sha256
+
+    def add(self, path, size, mtime_ns, sha256):
+        with self._lock:
+            self.entries[path] = {
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "sha256": sha256,
+                "queued_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self._save()
+
+    def forget(self, path):
+        with self._lock:
+            if self.entries.pop(path, None) is not None:
+                self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.dest_path)
+
+
+class FolderWatcher:
+    """
+    新文件写完后把其绝对路径放入 self.queue。start() 启动后台线程，stop() 停止。
+    """
+
+    def __init__(
+        self,
+        folder,
+        patterns=DEFAULT_PATTERNS,
+        settle_sec=2.0,
+        poll_interval=1.0,
+        index_path=None,
+        use_watchdog=True,
+    ):
+        self.folder = os.path.abspath(folder)
+        self.patterns = tuple(patterns)
+        self.settle_sec = settle_sec
+        self.poll_interval = poll_interval
+        self.index = FileIndex(
+            index_path or default_index_path(self.folder),
+            legacy_path=os.path.join(self.folder, LEGACY_INDEX_NAME),
+        )
+        self.queue = queue.Queue()
+        self.use_watchdog = use_watchdog and Observer is not None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+        self._dir_mtime = None
+
+    def wanted(self, path):
+        name = os.path.basename(path)
+        if any(fnmatch.fnmatch(name, pattern) for pattern in IGNORED_PATTERNS):
+            return False
+        return any(fnmatch.fnmatch(name.lower(), pattern) for pattern in self.patterns)
+
+    def touch(self, path):
+        """记下一个可能的新文件（或其又被写入了一次），等其稳定后再处理。"""
+        path = os.path.abspath(path)
+        if os.path.dirname(path) != self.folder or not self.wanted(path):
+            return
+        with self._lock:
+            self._pending[path] = None
+
+    def scan(self):
+        """列一次目录，只把索引中没有或大小 / mtime 变了的文件交给去抖。"""
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError as e:
+            log.warning(f"无法读取监视目录 {self.folder}: {e}")
+            return
+        for entry in entries:
+            if not entry.is_file() or not self.wanted(entry.path):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if not self.index.unchanged(os.path.abspath(entry.path), stat.st_size, stat.st_mtime_ns):
+                self.touch(entry.path)
+
+    def _poll_dir(self):
+        """轮询模式：目录 mtime 变化（新建、改名、删除）时才列目录。"""
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._dir_mtime:
+            self._dir_mtime = mtime
+            self.scan()
+
+    def _settle(self):
+        """检查待定文件：大小与 mtime 保持 settle_sec 不变才计算哈希并入队。"""
+        now = time.monotonic()
+        with self._lock:
+            pending = list(self._pending.items())
+        for path, last in pending:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                with self._lock:
+                    self._pending.pop(path, None)
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if last is None or last[0] != signature:
+                with self._lock:
+                    self._pending[path] = (signature, now)
+                continue
+            if now - last[1] < self.settle_sec:
+                continue
+            with self._lock:
+                # 等待期间如又有写入事件，留到下一轮
+                if self._pending.get(path) != last:
+                    continue
+                del self._pending[path]
+            self._enqueue(path, stat)
+
+    def _enqueue(self, path, stat):
+        try:
+            sha256 = file_sha256(path)
+        except OSError as e:
+            log.warning(f"无法读取 {path}，稍后重试: {e}")
+            self.touch(path)
+            return
+        if self.index.seen(path, sha256):
+            # 内容没变（例如只是被复制覆盖），只更新索引中的 mtime
+            self.index.add(path, stat.st_size, stat.st_mtime_ns, sha256)
+            return
+        self.index.add(path, stat.st_size, stat.st_mtime_ns, sha256)
+        log.info(f"发现新导入文件: {path}")
+        self.queue.put(path)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._observer is None:
+                self._poll_dir()
+            self._settle()
+            self._stop.wait(min(self.poll_interval, self.settle_sec / 2 or self.poll_interval))
+
+    def start(self):
+        os.makedirs(self.folder, exist_ok=True)
+        if self.use_watchdog:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.folder, recursive=False)
+            self._observer.start()
+            # 启动前已放入的文件
+            self.scan()
+            log.info(f"开始监视（watchdog）: {self.folder}")
+        else:
+            log.info(f"开始监视（轮询目录 mtime，每 {self.poll_interval} 秒）: {self.folder}")
+        thread = threading.Thread(target=self._run, name="watch-folder", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join()
+
+    def __iter__(self):
+        """阻塞地逐个取出新文件，stop() 后结束。"""
+        while not self._stop.is_set():
+            try:
+                yield self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+
+def run_daemon(automation, cookie_string, folder, **watcher_options):
+    """
+    逐个处理新文件：每个文件执行一次 automation.run_task。
+    失败的文件从索引中移除，下次启动时会重新入队。
+    """
+    from governor import ResourceGovernor
+
+    limits = ResourceGovernor.from_config(automation.config)
+    watcher = FolderWatcher(folder, **watcher_options).start()
+    try:
+        for path in watcher:
+            limits.wait_for_headroom()
+            try:
+                result = automation.run_task(import_file=path, cookie_string=cookie_string)
+                log.info(f"{os.path.basename(path)} 处理完成: {result}")
+            except Exception as e:
+                log.warning(f"{os.path.basename(path)} 处理失败: {e}")
+                watcher.index.forget(path)
+    except KeyboardInterrupt:
+        log.info("停止监视。")
+    finally:
+        watcher.stop()